@@ -0,0 +1,106 @@
+"""Compares installing the Python packages of a snova's apps one pip run per app with
+a single batched pip run (`snova setup requirements --python [--batch]`).
+
+Usage:
+	python benchmarks/setup_requirements.py [--apps 6] [--snova-path PATH]
+
+Without --snova-path, a throwaway snova with sparrow and `--apps` small apps is created
+in a temporary directory. Passing an existing snova benchmarks its installed apps
+instead; its env is upgraded in place, as with `snova setup requirements`.
+"""
+
+# imports - standard imports
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PYPROJECT = """[project]
+name = "{name}"
+version = "0.0.1"
+dependencies = {dependencies}
+
+[build-system]
+requires = ["setuptools"]
+build-backend = "setuptools.build_meta"
+"""
+
+# a few small packages shared by the apps, like sparrow apps share sparrow's dependencies
+DEPENDENCIES = [
+	"babel",
+	"click",
+	"cryptography",
+	"jinja2",
+	"markdown",
+	"packaging",
+	"python-dateutil",
+	"pytz",
+	"requests",
+	"rq",
+	"semantic-version",
+	"werkzeug",
+]
+
+
+def make_snova(path, apps):
+	for folder in ("apps", "sites", "config/pids", "logs"):
+		os.makedirs(os.path.join(path, folder), exist_ok=True)
+
+	for app in apps:
+		app_path = os.path.join(path, "apps", app)
+		os.makedirs(os.path.join(app_path, app))
+
+		for app_file in ("__init__.py", "hooks.py", "modules.txt", "patches.txt"):
+			open(os.path.join(app_path, app, app_file), "w").close()
+
+		with open(os.path.join(app_path, "pyproject.toml"), "w") as f:
+			f.write(PYPROJECT.format(name=app, dependencies=DEPENDENCIES))
+
+	with open(os.path.join(path, "sites", "apps.txt"), "w") as f:
+		f.write("\n".join(apps))
+
+	subprocess.check_call([sys.executable, "-m", "venv", os.path.join(path, "env")])
+
+
+def measure(snova_path, batch):
+	from snova.snova import Snova
+
+	snova = Snova(snova_path)
+	start = time.monotonic()
+	snova.setup.python(apps=list(snova.apps), batch=batch)
+	return time.monotonic() - start
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+	parser.add_argument("--apps", type=int, default=6, help="apps in the throwaway snova")
+	parser.add_argument("--snova-path", help="benchmark an existing snova instead")
+	args = parser.parse_args()
+
+	snova_path = args.snova_path
+	tmp_dir = None
+
+	if not snova_path:
+		tmp_dir = tempfile.mkdtemp(prefix="snova-benchmark-")
+		snova_path = os.path.join(tmp_dir, "snova")
+		make_snova(snova_path, ["sparrow"] + [f"app_{i}" for i in range(args.apps)])
+
+	try:
+		# the first run installs the apps' dependencies, later runs only upgrade them
+		measure(snova_path, batch=True)
+		results = {"per app": measure(snova_path, False), "batched": measure(snova_path, True)}
+	finally:
+		if tmp_dir:
+			shutil.rmtree(tmp_dir)
+
+	print()
+	for mode, duration in results.items():
+		print(f"{mode:<8} {duration:6.1f}s")
+	print(f"speedup  {results['per app'] / results['batched']:6.1f}x")
+
+
+if __name__ == "__main__":
+	main()
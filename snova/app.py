@@ -18,7 +18,7 @@ import git
 
 # imports - module imports
 import snova
-from snova.exceptions import NotInSnovaDirectoryError
+from snova.exceptions import CommandFailedError, NotInSnovaDirectoryError
 from snova.utils import (
 	UNSET_ARG,
 	fetch_details_from_tag,
@@ -38,6 +38,9 @@ if typing.TYPE_CHECKING:
 
 logger = logging.getLogger(snova.PROJECT_NAME)
 
+# maximum number of apps resolved or cloned at once by `get-app --resolve-deps`
+RESOLUTION_WORKERS = 8
+
 
 class AppMeta:
 	def __init__(self, name: str, branch: str = None, to_clone: bool = True):
@@ -177,6 +180,9 @@ class App(AppMeta):
 
 	@step(title="Fetching App {repo}", success="App {repo} Fetched")
 	def get(self):
+		self.clone()
+
+	def clone(self, prefix=None):
 		branch = f"--branch {self.tag}" if self.tag else ""
 		shallow = "--depth 1" if self.snova.shallow_clone else ""
 
@@ -194,6 +200,7 @@ class App(AppMeta):
 		self.snova.run(
 			f"{cmd} {args}",
 			cwd=os.path.join(self.snova.name, "apps"),
+			prefix=prefix,
 		)
 
 	@step(title="Archiving App {repo}", success="App {repo} Archived")
@@ -227,6 +234,8 @@ class App(AppMeta):
 		resolved=False,
 		restart_snova=True,
 		ignore_resolution=False,
+		skip_python=False,
+		skip_node=False,
 	):
 		import snova.cli
 		from snova.utils.app import get_app_name
@@ -247,13 +256,10 @@ class App(AppMeta):
 			skip_assets=skip_assets,
 			restart_snova=restart_snova,
 			resolution=self.local_resolution,
+			skip_python=skip_python,
+			skip_node=skip_node,
 		)
 
-	@step(title="Cloning and installing {repo}", success="App {repo} Installed")
-	def install_resolved_apps(self, *args, **kwargs):
-		self.get()
-		self.install(*args, **kwargs, resolved=True)
-
 	@step(title="Uninstalling App {repo}", success="App {repo} Uninstalled")
 	def uninstall(self):
 		self.snova.run(f"{self.snova.python} -m pip uninstall -y {self.name}")
@@ -288,21 +294,68 @@ class App(AppMeta):
 def make_resolution_plan(app: App, snova: "Snova"):
 	"""
 	decide what apps and versions to install and in what order
+
+	The dependency graph is walked one level at a time, fetching the dependencies of
+	all apps of a level concurrently. Every app is placed before the apps it depends
+	on, i.e. apps are to be installed in the reverse order.
 	"""
-	resolution = OrderedDict()
-	resolution[app.app_name] = app
+	from concurrent.futures import ThreadPoolExecutor
 
-	for app_name in app._get_dependencies():
+	apps = {app.app_name: app}
+	dependencies = {}
+	level = [app]
+
+	def resolve_dependency(app_name):
 		dep_app = App(app_name, snova=snova)
 		is_valid_sparrow_branch(dep_app.url, dep_app.branch)
-		dep_app.required_by = app.name
-		if dep_app.app_name in resolution:
-			click.secho(f"{dep_app.app_name} is already resolved skipping", fg="yellow")
-			continue
-		resolution[dep_app.app_name] = dep_app
-		resolution.update(make_resolution_plan(dep_app, snova))
-		app.local_resolution = [repo_name for repo_name, _ in reversed(resolution.items())]
-	return resolution
+		return dep_app
+
+	with ThreadPoolExecutor(max_workers=RESOLUTION_WORKERS) as executor:
+		while level:
+			required_apps = list(executor.map(lambda _app: _app._get_dependencies(), level))
+			names = list(OrderedDict.fromkeys(name for names in required_apps for name in names))
+			resolved = dict(zip(names, executor.map(resolve_dependency, names)))
+			next_level = []
+
+			for parent, names in zip(level, required_apps):
+				dependencies[parent.app_name] = []
+				for dep_app in (resolved[name] for name in names):
+					dependencies[parent.app_name].append(dep_app.app_name)
+					if dep_app.app_name in apps:
+						click.secho(f"{dep_app.app_name} is already resolved skipping", fg="yellow")
+						continue
+					dep_app.required_by = parent.name
+					apps[dep_app.app_name] = dep_app
+					next_level.append(dep_app)
+
+			level = next_level
+
+	for app_name, dep_app in apps.items():
+		if dependencies[app_name]:
+			dep_app.local_resolution = get_install_order(app_name, dependencies)
+
+	install_order = get_install_order(app.app_name, dependencies)
+	return OrderedDict((app_name, apps[app_name]) for app_name in reversed(install_order))
+
+
+def get_install_order(app_name, dependencies):
+	"""Returns `app_name` and the apps it depends on, every app after its dependencies"""
+	order, visiting = [], set()
+
+	def visit(name):
+		if name in order:
+			return
+		if name in visiting:
+			# circular dependency, the app is already being installed
+			return
+		visiting.add(name)
+		for dependency in dependencies.get(name, []):
+			visit(dependency)
+		visiting.discard(name)
+		order.append(name)
+
+	visit(app_name)
+	return order
 
 
 def get_excluded_apps(snova_path="."):
@@ -346,10 +399,12 @@ def get_app(
 	soft_link=False,
 	init_snova=False,
 	resolve_deps=False,
+	refresh_deps_cache=False,
 ):
 	"""snova get-app clones a Sparrow App from remote (GitHub or any other git server),
 	and installs it on the current snova. This also resolves dependencies based on the
-	apps' required_apps defined in the hooks.py file.
+	apps' required_apps defined in the hooks.py file. The hooks.py files are cached on
+	disk, pass refresh_deps_cache to fetch them again.
 
 	If the snova_path is not a snova directory, a new snova is created named using the
 	git_url parameter.
@@ -369,6 +424,11 @@ def get_app(
 	sparrow_path, sparrow_branch = None, None
 
 	if resolve_deps:
+		if refresh_deps_cache:
+			from snova.utils.app import clear_deps_cache
+
+			clear_deps_cache()
+
 		resolution = make_resolution_plan(app, snova)
 		click.secho("Following apps will be installed", fg="bright_blue")
 		for idx, app in enumerate(reversed(resolution.values()), start=1):
@@ -457,6 +517,8 @@ def install_resolved_deps(
 		# Terminal dependency
 		del resolution["sparrow"]
 
+	to_install = []
+
 	for repo_name, app in reversed(resolution.items()):
 		existing_dir, path_to_app = check_existing_dir(snova_path, repo_name)
 		if existing_dir:
@@ -511,7 +573,35 @@ def install_resolved_deps(
 				shutil.rmtree(path_to_app)
 			else:
 				continue
-		app.install_resolved_apps(skip_assets=skip_assets, verbose=verbose)
+		to_install.append(app)
+
+	clone_resolved_apps(to_install)
+
+	for app in to_install:
+		app.install(skip_assets=skip_assets, verbose=verbose, resolved=True)
+
+
+@step(title="Cloning resolved apps", success="Resolved apps cloned")
+def clone_resolved_apps(apps):
+	"""Clones `apps` concurrently, raises CommandFailedError once all clones are done
+	if any of them failed"""
+	from concurrent.futures import ThreadPoolExecutor
+
+	if len(apps) == 1:
+		return apps[0].clone()
+
+	def clone(app):
+		try:
+			app.clone(prefix=f"[{app.repo}]")
+		except Exception as e:
+			return e
+
+	with ThreadPoolExecutor(max_workers=RESOLUTION_WORKERS) as executor:
+		errors = dict(zip((app.repo for app in apps), executor.map(clone, apps)))
+
+	failed_apps = [repo for repo, error in errors.items() if error]
+	if failed_apps:
+		raise CommandFailedError(f"Failed to clone apps: {', '.join(failed_apps)}")
 
 
 def new_app(app, no_git=None, snova_path="."):
@@ -550,7 +640,11 @@ def install_app(
 	restart_snova=True,
 	skip_assets=False,
 	resolution=UNSET_ARG,
+	skip_python=False,
+	skip_node=False,
 ):
+	"""Installs the app's Python and Node packages and adds it to the snova. Pass
+	`skip_python` or `skip_node` if the app's packages are installed already"""
 	import snova.cli as snova_cli
 	from snova.snova import Snova
 
@@ -570,17 +664,22 @@ def install_app(
 
 	app_path = os.path.realpath(os.path.join(snova_path, "apps", app))
 
-	snova.run(
-		f"{snova.python} -m pip install {quiet_flag} --upgrade -e {app_path} {cache_flag}"
-	)
+	if not skip_python:
+		snova.run(
+			f"{snova.python} -m pip install {quiet_flag} --upgrade -e {app_path} {cache_flag}"
+		)
 
-	if conf.get("developer_mode"):
-		install_python_dev_dependencies(apps=app, snova_path=snova_path, verbose=verbose)
+		if conf.get("developer_mode"):
+			install_python_dev_dependencies(apps=app, snova_path=snova_path, verbose=verbose)
 
-	if os.path.exists(os.path.join(app_path, "package.json")):
+	if not skip_node and os.path.exists(os.path.join(app_path, "package.json")):
 		snova.run("yarn install", cwd=app_path)
 
 	snova.apps.sync(app_name=app, required=resolution, branch=tag, app_dir=app_path)
+	snova.apps.update_requirements_fingerprint(
+		app,
+		kinds=[kind for kind, skip in (("python", skip_python), ("node", skip_node)) if not skip],
+	)
 
 	if not skip_assets:
 		build_assets(snova_path=snova_path, app=app)
@@ -591,13 +690,26 @@ def install_app(
 		snova.reload(_raise=False)
 
 
-def pull_apps(apps=None, snova_path=".", reset=False):
-	"""Check all apps if there no local changes, pull"""
+def pull_apps(apps=None, snova_path=".", reset=False, on_app_done=None):
+	"""Check all apps if there no local changes, pull. `on_app_done(app, duration)` is
+	called for each app pulled
+
+	Apps are pulled one at a time unless `pull_concurrency` is set in the snova's
+	common_site_config.json, in which case up to as many apps are pulled at once and
+	a summary of the results is printed at the end.
+
+	Apps prefetched by `snova update --prefetch` are checked out at the prefetched
+	commits without contacting their remotes.
+	"""
 	from snova.snova import Snova
-	from snova.utils.app import get_current_branch, get_remote
+	from snova.utils.app import get_remote
+	from snova.utils.prefetch import (
+		clear_prefetched_apps,
+		get_prefetched_commits,
+		print_prefetched_commits,
+	)
 
 	snova = Snova(snova_path)
-	rebase = "--rebase" if snova.conf.get("rebase_on_pull") else ""
 	apps = apps or snova.apps
 	excluded_apps = snova.excluded_apps
 
@@ -627,13 +739,14 @@ Here are your choices:
 					)
 					sys.exit(1)
 
+	remotes = {}
 	for app in apps:
 		if app in excluded_apps:
 			print(f"Skipping pull for app {app}")
 			continue
 		app_dir = get_repo_dir(app, snova_path=snova_path)
 		if os.path.exists(os.path.join(app_dir, ".git")):
-			remote = get_remote(app)
+			remote = get_remote(app, snova_path=snova_path)
 			if not remote:
 				# remote is False, i.e. remote doesn't exist, add the app to excluded_apps.txt
 				add_to_excluded_apps_txt(app, snova_path=snova_path)
@@ -642,29 +755,113 @@ Here are your choices:
 					" adding it to excluded apps"
 				)
 				continue
+			remotes[app] = remote
+
+	commits = {
+		app: commit
+		for app, commit in get_prefetched_commits(snova_path=snova_path).items()
+		if app in remotes
+	}
+	print_prefetched_commits(commits)
+
+	concurrency = min(int(snova.conf.get("pull_concurrency") or 1), len(remotes))
+
+	from time import monotonic
+
+	if concurrency <= 1:
+		for app, remote in remotes.items():
+			start = monotonic()
+			pull_app(app, remote, snova, reset=reset, commit=commits.get(app))
+			clear_prefetched_apps([app], snova_path=snova_path)
+			if on_app_done:
+				on_app_done(app, monotonic() - start)
+		return
 
-			if not snova.conf.get("shallow_clone") or not reset:
-				is_shallow = os.path.exists(os.path.join(app_dir, ".git", "shallow"))
-				if is_shallow:
-					s = " to safely pull remote changes." if not reset else ""
-					print(f"Unshallowing {app}{s}")
-					snova.run(f"git fetch {remote} --unshallow", cwd=app_dir)
-
-			branch = get_current_branch(app, snova_path=snova_path)
-			logger.log(f"pulling {app}")
-			if reset:
-				reset_cmd = f"git reset --hard {remote}/{branch}"
-				if snova.conf.get("shallow_clone"):
-					snova.run(f"git fetch --depth=1 --no-tags {remote} {branch}", cwd=app_dir)
-					snova.run(reset_cmd, cwd=app_dir)
-					snova.run("git reflog expire --all", cwd=app_dir)
-					snova.run("git gc --prune=all", cwd=app_dir)
-				else:
-					snova.run("git fetch --all", cwd=app_dir)
-					snova.run(reset_cmd, cwd=app_dir)
-			else:
-				snova.run(f"git pull {rebase} {remote} {branch}", cwd=app_dir)
-			snova.run('find . -name "*.pyc" -delete', cwd=app_dir)
+	from concurrent.futures import ThreadPoolExecutor
+
+	def _pull_app(app):
+		start = monotonic()
+		try:
+			pull_app(
+				app, remotes[app], snova, reset=reset, prefix=f"[{app}]", commit=commits.get(app)
+			)
+			if on_app_done:
+				on_app_done(app, monotonic() - start)
+		except Exception as e:
+			return e, monotonic() - start
+		return None, monotonic() - start
+
+	with ThreadPoolExecutor(max_workers=concurrency) as executor:
+		results = dict(zip(remotes, executor.map(_pull_app, remotes)))
+
+	print_pull_summary(results)
+
+	failed_apps = [app for app, (error, _) in results.items() if error]
+	clear_prefetched_apps(
+		[app for app in results if app not in failed_apps], snova_path=snova_path
+	)
+
+	if failed_apps:
+		raise CommandFailedError(f"Failed to pull apps: {', '.join(failed_apps)}")
+
+
+def pull_app(app, remote, snova: "Snova", reset=False, prefix=None, commit=None):
+	"""Pulls `app` from `remote`, `prefix` is prepended to the output of each command.
+	If `commit` is passed, the app is updated to that already fetched commit instead"""
+	from snova.utils.app import get_current_branch
+
+	app_dir = get_repo_dir(app, snova_path=snova.name)
+	rebase = "--rebase" if snova.conf.get("rebase_on_pull") else ""
+	line_prefix = f"{prefix} " if prefix else ""
+
+	if not snova.conf.get("shallow_clone") or not reset:
+		is_shallow = os.path.exists(os.path.join(app_dir, ".git", "shallow"))
+		if is_shallow:
+			s = " to safely pull remote changes." if not reset else ""
+			print(f"{line_prefix}Unshallowing {app}{s}")
+			snova.run(f"git fetch {remote} --unshallow", cwd=app_dir, prefix=prefix)
+
+	if commit:
+		logger.log(f"updating {app} to prefetched commit {commit}")
+		if reset:
+			snova.run(f"git reset --hard {commit}", cwd=app_dir, prefix=prefix)
+		elif rebase:
+			snova.run(f"git rebase {commit}", cwd=app_dir, prefix=prefix)
+		else:
+			snova.run(f"git merge {commit}", cwd=app_dir, prefix=prefix)
+		snova.run('find . -name "*.pyc" -delete', cwd=app_dir, prefix=prefix)
+		return
+
+	branch = get_current_branch(app, snova_path=snova.name)
+	logger.log(f"pulling {app}")
+	if reset:
+		reset_cmd = f"git reset --hard {remote}/{branch}"
+		if snova.conf.get("shallow_clone"):
+			snova.run(
+				f"git fetch --depth=1 --no-tags {remote} {branch}", cwd=app_dir, prefix=prefix
+			)
+			snova.run(reset_cmd, cwd=app_dir, prefix=prefix)
+			snova.run("git reflog expire --all", cwd=app_dir, prefix=prefix)
+			snova.run("git gc --prune=all", cwd=app_dir, prefix=prefix)
+		else:
+			snova.run("git fetch --all", cwd=app_dir, prefix=prefix)
+			snova.run(reset_cmd, cwd=app_dir, prefix=prefix)
+	else:
+		snova.run(f"git pull {rebase} {remote} {branch}", cwd=app_dir, prefix=prefix)
+	snova.run('find . -name "*.pyc" -delete', cwd=app_dir, prefix=prefix)
+
+
+def print_pull_summary(results):
+	"""Prints a table of apps pulled concurrently. `results` maps each app to a tuple
+	of the error raised while pulling it, if any, and the time taken"""
+	width = max(len(app) for app in results)
+
+	click.secho(f"\n{'App'.ljust(width)}  Status  Time", bold=True)
+	for app, (error, duration) in results.items():
+		status = click.style("failed", fg="red") if error else click.style("ok    ", fg="green")
+		click.echo(f"{app.ljust(width)}  {status}  {duration:.1f}s")
+		if error:
+			click.echo(f"{' ' * width}  {error}")
 
 
 def use_rq(snova_path):
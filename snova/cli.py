@@ -11,7 +11,6 @@ import click
 
 # imports - module imports
 import snova
-from snova.snova import Snova
 from snova.commands import snova_command
 from snova.config.common_site_config import get_config
 from snova.utils import (
@@ -62,6 +61,19 @@ def execute_cmd(check_for_update=True, command: str = None, logger: Logger = Non
 		raise e
 
 
+def log_config_store_stats(logger: Logger):
+	"""Logs how often the command read the snova's config files and how many of those
+	reads parsed the files"""
+	from snova.config.store import config_store
+
+	message = "config reads: {hits} cached, {misses} parsed; config writes: {writes}".format(
+		**config_store.get_stats()
+	)
+	logger.debug(message)
+	if verbose:
+		click.secho(message, fg="bright_black")
+
+
 def cli():
 	setup_clear_cache()
 	global from_command_line, snova_config, is_envvar_warn_set, verbose
@@ -79,6 +91,7 @@ def cli():
 	change_working_directory()
 	logger = setup_logging()
 	logger.info(command)
+	atexit.register(log_config_store_stats, logger)
 
 	snova_config = get_config(".")
 
@@ -127,7 +140,7 @@ def cli():
 	if cmd_from_sys and cmd_from_sys.split("=", 1)[0].strip() in opts:
 		snova_command()
 
-	if cmd_from_sys in snova_command.commands:
+	if snova_command.has_command(cmd_from_sys):
 		with execute_cmd(check_for_update=is_cli_command, command=command, logger=logger):
 			snova_command()
 
@@ -199,6 +212,19 @@ def app_cmd(snova_path="."):
 
 
 def sparrow_cmd(snova_path="."):
+	from snova.helper_daemon import (
+		get_routed_commands,
+		is_helper_daemon_running,
+		run_via_helper_daemon,
+	)
+
+	if is_helper_daemon_running(snova_path) and get_cmd_from_sysargv() in (
+		get_routed_commands(snova_path)
+	):
+		return_code = run_via_helper_daemon(["sparrow"] + sys.argv[1:], snova_path=snova_path)
+		if return_code is not None:
+			sys.exit(return_code)
+
 	f = get_env_cmd("python", snova_path=snova_path)
 	os.chdir(os.path.join(snova_path, "sites"))
 	os.execv(f, [f] + ["-m", "sparrow.utils.snova_helper", "sparrow"] + sys.argv[1:])
@@ -212,12 +238,18 @@ def get_sparrow_commands():
 
 
 def get_sparrow_help(snova_path="."):
+	from snova.helper_daemon import get_helper_daemon_output
+
 	python = get_env_cmd("python", snova_path=snova_path)
 	sites_path = os.path.join(snova_path, "sites")
 	try:
-		out = get_cmd_output(
-			f"{python} -m sparrow.utils.snova_helper get-sparrow-help", cwd=sites_path
-		)
+		result = get_helper_daemon_output(["get-sparrow-help"], snova_path=snova_path)
+		if result and not result[0]:
+			out = result[1]
+		else:
+			out = get_cmd_output(
+				f"{python} -m sparrow.utils.snova_helper get-sparrow-help", cwd=sites_path
+			)
 		return "\n\nFramework commands:\n" + out.split("Commands:")[1]
 	except Exception:
 		return ""
@@ -240,7 +272,9 @@ def setup_clear_cache():
 	f = copy(os.chdir)
 
 	def _chdir(*args, **kwargs):
-		Snova.cache_clear()
+		# avoid importing snova.snova (and GitPython) for commands that never use it
+		if "snova.snova" in sys.modules:
+			sys.modules["snova.snova"].Snova.cache_clear()
 		get_env_cmd.cache_clear()
 		return f(*args, **kwargs)
 
@@ -143,6 +143,12 @@ def drop(path):
 	default=False,
 	help="Resolve dependencies before installing app",
 )
+@click.option(
+	"--refresh-deps-cache",
+	is_flag=True,
+	default=False,
+	help="Fetch dependencies again instead of using the cached ones while resolving",
+)
 def get_app(
 	git_url,
 	branch,
@@ -152,6 +158,7 @@ def get_app(
 	soft_link=False,
 	init_snova=False,
 	resolve_deps=False,
+	refresh_deps_cache=False,
 ):
 	"clone an app from the internet and set it up in your snova"
 	from snova.app import get_app
@@ -164,6 +171,7 @@ def get_app(
 		soft_link=soft_link,
 		init_snova=init_snova,
 		resolve_deps=resolve_deps,
+		refresh_deps_cache=refresh_deps_cache,
 	)
 
 
@@ -213,8 +213,14 @@ def setup_socketio():
 	default=False,
 	is_flag=True,
 )
+@click.option(
+	"--batch",
+	help="Install the Python packages of all apps with a single pip run",
+	default=False,
+	is_flag=True,
+)
 @click.argument("apps", nargs=-1)
-def setup_requirements(node=False, python=False, dev=False, apps=None):
+def setup_requirements(node=False, python=False, dev=False, batch=False, apps=None):
 	"""
 	Setup Python and Node dependencies.
 
@@ -223,12 +229,13 @@ def setup_requirements(node=False, python=False, dev=False, apps=None):
 	from snova.snova import Snova
 
 	snova = Snova(".")
+	batch = batch or snova.conf.get("batch_requirements")
 
 	if not (node or python or dev):
-		snova.setup.requirements(apps=apps)
+		snova.setup.requirements(apps=apps, batch=batch)
 
 	elif not node and not dev:
-		snova.setup.python(apps=apps)
+		snova.setup.python(apps=apps, batch=batch)
 
 	elif not python and not dev:
 		snova.setup.node(apps=apps)
@@ -17,7 +17,12 @@ from snova.utils.snova import post_upgrade, patch_sites, build_assets
 @click.option(
 	"--requirements",
 	is_flag=True,
-	help="Update requirements. If run alone, equivalent to `snova setup requirements`",
+	help="Update requirements of apps whose requirement files changed. If run alone, equivalent to `snova setup requirements`",
+)
+@click.option(
+	"--force-requirements",
+	is_flag=True,
+	help="Reinstall requirements of all apps, even of those whose requirement files are unchanged",
 )
 @click.option(
 	"--restart-supervisor", is_flag=True, help="Restart supervisor processes after update"
@@ -41,19 +46,64 @@ from snova.utils.snova import post_upgrade, patch_sites, build_assets
 	is_flag=True,
 	help="Hard resets git branch's to their new states overriding any changes and overriding rebase on pull",
 )
+@click.option(
+	"--serial",
+	is_flag=True,
+	help="Run the update's stages one after the other instead of overlapping independent ones",
+)
+@click.option(
+	"--full",
+	is_flag=True,
+	help="Migrate sites and build assets of all apps, even if the pulled changes don't affect them",
+)
+@click.option(
+	"--new-env",
+	is_flag=True,
+	help="Install Python packages into a new env and switch to it once complete, keeping the current env for `snova rollback-env`",
+)
+@click.option(
+	"--resume",
+	is_flag=True,
+	help="Continue a failed update with its options, skipping the stages, sites and apps that completed",
+)
+@click.option(
+	"--plan",
+	is_flag=True,
+	help="Print the stages the update would run and their estimated durations, based on past updates, without running them",
+)
+@click.option(
+	"--prefetch",
+	is_flag=True,
+	help="Only fetch the apps' updates and download their requirements, without applying them. The next update uses the fetched commits. Safe to run from cron",
+)
 def update(
 	pull,
 	apps,
 	patch,
 	build,
 	requirements,
+	force_requirements,
 	restart_supervisor,
 	restart_systemd,
 	no_backup,
 	no_compile,
 	force,
 	reset,
+	serial,
+	full,
+	new_env,
+	resume,
+	plan,
+	prefetch,
 ):
+	if prefetch:
+		import re
+
+		from snova.utils.prefetch import prefetch as prefetch_updates
+
+		prefetch_updates(apps=[app for app in re.split(",| ", apps or "") if app], snova_path=".")
+		return
+
 	from snova.utils.snova import update
 
 	update(
@@ -62,18 +112,60 @@ def update(
 		patch=patch,
 		build=build,
 		requirements=requirements,
+		force_requirements=force_requirements,
 		restart_supervisor=restart_supervisor,
 		restart_systemd=restart_systemd,
 		backup=not no_backup,
 		compile=not no_compile,
 		force=force,
 		reset=reset,
+		serial=serial,
+		new_env=new_env,
+		full=full,
+		resume=resume,
+		plan=plan,
+	)
+
+
+@click.command(
+	"rollback",
+	help="Restore the apps, env and assets from before the last update, or the given snapshot",
+)
+@click.argument("snapshot", required=False)
+@click.option("--list", "list_snapshots", is_flag=True, help="List the available snapshots")
+@click.option(
+	"--restart-supervisor", is_flag=True, help="Restart supervisor processes after rollback"
+)
+@click.option("--restart-systemd", is_flag=True, help="Restart systemd units after rollback")
+def rollback(snapshot=None, list_snapshots=False, restart_supervisor=False, restart_systemd=False):
+	if list_snapshots:
+		from snova.utils.snapshot import print_snapshots
+
+		return print_snapshots(snova_path=".")
+
+	from snova.utils.snova import rollback
+
+	rollback(
+		snova_path=".",
+		snapshot=snapshot,
+		restart_supervisor=restart_supervisor,
+		restart_systemd=restart_systemd,
 	)
 
 
-@click.command("retry-upgrade", help="Retry a failed upgrade")
+@click.command(
+	"retry-upgrade",
+	help="Retry a failed upgrade, resuming it if it was started by `snova update`",
+)
 @click.option("--version", default=5)
 def retry_upgrade(version):
+	from snova.utils.journal import UpdateJournal
+
+	if UpdateJournal.load("."):
+		from snova.utils.snova import update
+
+		return update(resume=True)
+
 	pull_apps()
 	patch_sites()
 	build_assets()
@@ -87,10 +179,17 @@ def retry_upgrade(version):
 @click.argument("branch")
 @click.argument("apps", nargs=-1)
 @click.option("--upgrade", is_flag=True)
-def switch_to_branch(branch, apps, upgrade=False):
+@click.option(
+	"--continue-on-error",
+	is_flag=True,
+	help="Switch the other apps if fetching some of them fails",
+)
+def switch_to_branch(branch, apps, upgrade=False, continue_on_error=False):
 	from snova.utils.app import switch_to_branch
 
-	switch_to_branch(branch=branch, apps=list(apps), upgrade=upgrade)
+	switch_to_branch(
+		branch=branch, apps=list(apps), upgrade=upgrade, continue_on_error=continue_on_error
+	)
 
 
 @click.command("switch-to-develop")
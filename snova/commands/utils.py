@@ -1,5 +1,6 @@
 # imports - standard imports
 import os
+import sys
 
 # imports - third party imports
 import click
@@ -176,3 +177,76 @@ def migrate_env(python, backup=True):
 	from snova.utils.snova import migrate_env
 
 	migrate_env(python=python, backup=backup)
+
+
+@click.command(
+	"rollback-env",
+	help="Switch back to the env used before the last `snova update --new-env`",
+)
+def rollback_env():
+	from snova.snova import Snova
+	from snova.utils import log
+	from snova.utils.env import rollback_env
+
+	snova = Snova(".")
+	env_path = rollback_env(snova_path=".")
+
+	# the previous env may not have the current requirements of the apps
+	for app in snova.apps:
+		snova.apps.forget_requirements_fingerprint(app, kinds=("python",))
+
+	log(f"Rolled back to {env_path}, restarting processes...", level=1)
+	snova.reload()
+
+
+@click.group(
+	"helper-daemon",
+	help="Manage a warm process that executes Sparrow commands without cold starts",
+)
+def helper_daemon():
+	pass
+
+
+@click.command("start", help="Start the helper daemon in the background")
+@click.option(
+	"--foreground", is_flag=True, default=False, help="Run in the foreground, eg: under supervisor"
+)
+def start_helper_daemon(foreground=False):
+	from snova.helper_daemon import start_helper_daemon
+	from snova.utils import log
+
+	status = start_helper_daemon(snova_path=".", foreground=foreground)
+
+	if status:
+		log(f"Helper daemon started with pid {status['pid']}", level=1)
+	else:
+		log("Helper daemon failed to start, check logs/snova_helper.log", level=2)
+		sys.exit(1)
+
+
+@click.command("stop", help="Stop the helper daemon")
+def stop_helper_daemon():
+	from snova.helper_daemon import stop_helper_daemon
+	from snova.utils import log
+
+	if not stop_helper_daemon(snova_path="."):
+		log("Helper daemon is not running", level=3)
+
+
+@click.command("status", help="Show the status of the helper daemon")
+def helper_daemon_status():
+	from snova.helper_daemon import ping
+
+	status = ping(snova_path=".")
+
+	if not status:
+		print("Helper daemon is not running")
+	elif status.get("status") == "stale":
+		print("Helper daemon was stale and has exited, start it again")
+	else:
+		print(f"Helper daemon is running with pid {status['pid']}")
+
+
+helper_daemon.add_command(start_helper_daemon)
+helper_daemon.add_command(stop_helper_daemon)
+helper_daemon.add_command(helper_daemon_status)
@@ -1,8 +1,10 @@
 # imports - standard imports
 import getpass
-import json
 import os
 
+# imports - module imports
+from snova.config.store import config_store
+
 default_config = {
 	"restart_supervisor_on_update": False,
 	"restart_systemd_on_update": False,
@@ -17,6 +19,15 @@ default_config = {
 
 DEFAULT_MAX_REQUESTS = 5000
 
+DEFAULT_PORTS = {
+	"webserver_port": 8000,
+	"socketio_port": 9000,
+	"file_watcher_port": 6787,
+	"redis_queue": 11000,
+	"redis_socketio": 13000,
+	"redis_cache": 13000,
+}
+
 
 def setup_config(snova_path):
 	make_pid_folder(snova_path)
@@ -33,23 +44,15 @@ def get_config(snova_path):
 
 
 def get_common_site_config(snova_path):
-	config_path = get_config_path(snova_path)
-	if not os.path.exists(config_path):
-		return {}
-	with open(config_path) as f:
-		return json.load(f)
+	return config_store.read(get_config_path(snova_path))
 
 
 def put_config(config, snova_path="."):
-	config_path = get_config_path(snova_path)
-	with open(config_path, "w") as f:
-		return json.dump(config, f, indent=1, sort_keys=True)
+	config_store.write(get_config_path(snova_path), config, indent=1, sort_keys=True)
 
 
 def update_config(new_config, snova_path="."):
-	config = get_config(snova_path=snova_path)
-	config.update(new_config)
-	put_config(config, snova_path=snova_path)
+	config_store.update(get_config_path(snova_path), new_config, indent=1, sort_keys=True)
 
 
 def get_config_path(snova_path):
@@ -79,7 +82,7 @@ def get_default_max_requests(worker_count: int):
 
 
 def update_config_for_sparrow(config, snova_path):
-	ports = make_ports(snova_path)
+	ports = make_ports(snova_path, config)
 
 	for key in ("redis_cache", "redis_queue", "redis_socketio"):
 		if key not in config:
@@ -90,48 +93,79 @@ def update_config_for_sparrow(config, snova_path):
 			config[key] = ports[key]
 
 
-def make_ports(snova_path):
-	from urllib.parse import urlparse
+def make_ports(snova_path, config=None):
+	"""Returns the ports of the snova's services, keeping those set in `config`.
 
-	snovaes_path = os.path.dirname(os.path.abspath(snova_path))
+	New ports are allocated from the host-wide port registry, see
+	`snova.utils.ports`. If it can't be used, they're the next ports after the highest
+	ones used by the snovas next to this one.
+	"""
+	from snova.utils import log
+	from snova.utils.ports import allocate_ports
 
-	default_ports = {
-		"webserver_port": 8000,
-		"socketio_port": 9000,
-		"file_watcher_port": 6787,
-		"redis_queue": 11000,
-		"redis_socketio": 13000,
-		"redis_cache": 13000,
-	}
+	current = get_config_ports(config or {})
+	# Backward compatbility: always keep redis_cache and redis_socketio port same
+	# Note: not required from v15
+	default_ports = {k: v for k, v in DEFAULT_PORTS.items() if k != "redis_socketio"}
 
-	# collect all existing ports
-	existing_ports = {}
-	for folder in os.listdir(snovaes_path):
-		snova_path = os.path.join(snovaes_path, folder)
-		if os.path.isdir(snova_path):
-			snova_config = get_config(snova_path)
-			for key in list(default_ports.keys()):
-				value = snova_config.get(key)
+	try:
+		ports = allocate_ports(snova_path, default_ports, current=current)
+	except OSError as e:
+		log(f"Couldn't use the port registry, scanning snovas for ports instead: {e}", level=3)
+		ports = scan_ports(snova_path)
+		ports.update(current)
+
+	ports["redis_socketio"] = current.get("redis_socketio", ports["redis_cache"])
+
+	return ports
 
-				# extract port from redis url
-				if value and (key in ("redis_cache", "redis_queue", "redis_socketio")):
-					value = urlparse(value).port
 
-				if value:
-					existing_ports.setdefault(key, []).append(value)
+def scan_ports(snova_path):
+	"""Returns the ports after the highest ones used by the snovas next to this one"""
+	existing_ports = {}
+	for snova_ports in get_sibling_ports(os.path.dirname(os.path.abspath(snova_path))).values():
+		for key, value in snova_ports.items():
+			existing_ports.setdefault(key, []).append(value)
 
 	# new port value = max of existing port value + 1
 	ports = {}
-	for key, value in list(default_ports.items()):
+	for key, value in DEFAULT_PORTS.items():
 		existing_value = existing_ports.get(key, [])
 		if existing_value:
 			value = max(existing_value) + 1
 
 		ports[key] = value
 
-	# Backward compatbility: always keep redis_cache and redis_socketio port same
-	# Note: not required from v15
-	ports["redis_socketio"] = ports["redis_cache"]
+	return ports
+
+
+def get_sibling_ports(snovas_path):
+	"""Returns the ports used by each snova in the directory `snovas_path`"""
+	snovas = {}
+	for folder in os.listdir(snovas_path):
+		snova_path = os.path.join(snovas_path, folder)
+		if os.path.isdir(snova_path):
+			ports = get_config_ports(get_config(snova_path))
+			if ports:
+				snovas[snova_path] = ports
+
+	return snovas
+
+
+def get_config_ports(config):
+	"""Returns the ports set in a snova's config, extracting those of the Redis URLs"""
+	from urllib.parse import urlparse
+
+	ports = {}
+	for key in DEFAULT_PORTS:
+		value = config.get(key)
+
+		# extract port from redis url
+		if value and (key in ("redis_cache", "redis_queue", "redis_socketio")):
+			value = urlparse(value).port
+
+		if value:
+			ports[key] = value
 
 	return ports
 
@@ -9,6 +9,7 @@ import snova
 from snova.config.nginx import make_nginx_conf
 from snova.config.production_setup import service
 from snova.config.site_config import get_domains, remove_domain, update_site_config
+from snova.config.store import config_store
 from snova.snova import Snova
 from snova.utils import exec_cmd, which
 from snova.utils.snova import update_common_site_config
@@ -82,11 +83,12 @@ def run_certbot_and_setup_ssl(site, custom_domain, snova_path, interactive=True)
 	}
 
 	if custom_domain:
-		remove_domain(site, custom_domain, snova_path)
-		domains = get_domains(site, snova_path)
-		ssl_config["domain"] = custom_domain
-		domains.append(ssl_config)
-		update_site_config(site, {"domains": domains}, snova_path=snova_path)
+		with config_store.batch():
+			remove_domain(site, custom_domain, snova_path)
+			domains = get_domains(site, snova_path)
+			ssl_config["domain"] = custom_domain
+			domains.append(ssl_config)
+			update_site_config(site, {"domains": domains}, snova_path=snova_path)
 	else:
 		update_site_config(site, ssl_config, snova_path=snova_path)
 
@@ -1,8 +1,10 @@
 # imports - standard imports
 import hashlib
+import json
 import os
 import random
 import string
+import threading
 
 # imports - third party imports
 import click
@@ -13,6 +15,9 @@ import snova.config
 from snova.snova import Snova
 from snova.utils import get_snova_name
 
+# include files of the server blocks, with `nginx_split_config` set
+NGINX_INCLUDES_DIR = "nginx"
+
 
 def make_nginx_conf(snova_path, yes=False, logging=None, log_format=None):
 	conf_path = os.path.join(snova_path, "config", "nginx.conf")
@@ -30,6 +35,7 @@ def make_nginx_conf(snova_path, yes=False, logging=None, log_format=None):
 	config = Snova(snova_path).conf
 	sites = prepare_sites(config, snova_path)
 	snova_name = get_snova_name(snova_path)
+	split_config = config.get("nginx_split_config")
 
 	allow_rate_limiting = config.get("allow_rate_limiting", False)
 
@@ -46,6 +52,10 @@ def make_nginx_conf(snova_path, yes=False, logging=None, log_format=None):
 		"random_string": "".join(random.choice(string.ascii_lowercase) for i in range(7)),
 	}
 
+	if split_config:
+		# unique to the snova too, but stable so that unchanged files aren't rewritten
+		template_vars["random_string"] = hashlib.sha256(snova_path.encode()).hexdigest()[:7]
+
 	if logging and logging != "none":
 		_log_format = ""
 		if log_format and log_format != "none":
@@ -55,17 +65,196 @@ def make_nginx_conf(snova_path, yes=False, logging=None, log_format=None):
 	if allow_rate_limiting:
 		template_vars.update(
 			{
-				"snova_name_hash": hashlib.sha256(snova_name).hexdigest()[:16],
+				"snova_name_hash": hashlib.sha256(snova_name.encode()).hexdigest()[:16],
 				"limit_conn_shared_memory": get_limit_conn_shared_memory(),
 			}
 		)
 
+	if split_config:
+		return make_split_nginx_conf(template, template_vars, snova_path)
+
 	nginx_conf = template.render(**template_vars)
 
 	with open(conf_path, "w") as f:
 		f.write(nginx_conf)
 
 
+def make_split_nginx_conf(template, template_vars, snova_path) -> dict:
+	"""Writes the server blocks to include files under config/nginx/, with nginx.conf
+	holding the upstreams and maps and including them. That's a file per site when
+	sites are served by port, and otherwise a file per site with its own certificate
+	plus one for the sites served by DNS and one for those using the wildcard
+	certificate.
+
+	A file is only rendered and written if its inputs changed since it was last
+	generated, as recorded in config/nginx/inputs.json, and include files of sites
+	that were removed are deleted. Prints and returns the files written and removed.
+	"""
+	includes_path = os.path.join(snova_path, "config", NGINX_INCLUDES_DIR)
+	inputs_path = os.path.join(includes_path, "inputs.json")
+	os.makedirs(includes_path, exist_ok=True)
+
+	try:
+		with open(inputs_path) as f:
+			old_inputs = json.load(f)
+	except (OSError, ValueError):
+		old_inputs = {}
+
+	sites = template_vars["sites"]
+	main_vars = dict(
+		template_vars,
+		sites={"domain_map": sites["domain_map"], "hash_sizes": sites.get("hash_sizes")},
+		nginx_includes=os.path.join(includes_path, "*.conf"),
+	)
+	site_name_variable = (
+		f"$site_name_{template_vars['random_string']}" if sites["domain_map"] else "$host"
+	)
+	with open(template.filename) as f:
+		template_hash = hashlib.sha256(f.read().encode()).hexdigest()
+	# the template variables that server blocks are rendered with
+	shared_vars = {
+		key: template_vars.get(key)
+		for key in (
+			"allow_rate_limiting",
+			"snova_name_hash",
+			"error_pages",
+			"http_timeout",
+			"logging",
+		)
+	}
+
+	server_blocks = get_server_blocks(
+		sites,
+		snova_name=template_vars["snova_name"],
+		sites_path=template_vars["sites_path"],
+		site_name_variable=site_name_variable,
+	)
+	inputs = {}
+	written = []
+	module = None
+
+	for filename, block in server_blocks.items():
+		inputs[filename] = hashlib.sha256(
+			json.dumps([template_hash, shared_vars, block], sort_keys=True).encode()
+		).hexdigest()
+		path = os.path.join(includes_path, filename)
+
+		if old_inputs.get(filename) == inputs[filename] and os.path.exists(path):
+			continue
+
+		# renders the template's macros, the module's own output isn't used
+		module = module or template.make_module(main_vars)
+		write_if_changed(path, str(module.server_block(**block)), written)
+
+	removed = [
+		os.path.join(includes_path, filename)
+		for filename in os.listdir(includes_path)
+		if filename.endswith(".conf") and filename not in server_blocks
+	]
+	for path in removed:
+		os.remove(path)
+
+	write_if_changed(
+		os.path.join(snova_path, "config", "nginx.conf"), template.render(**main_vars), written
+	)
+
+	write_if_changed(inputs_path, json.dumps(inputs, indent=1, sort_keys=True), [])
+
+	unchanged = len(server_blocks) + 1 - len(written)
+	click.secho(
+		f"nginx config: {len(written)} files written, {len(removed)} removed,"
+		f" {unchanged} unchanged",
+		fg="green" if written or removed else None,
+	)
+	config_path = os.path.join(snova_path, "config")
+	for path in written:
+		click.echo(f"  written: {os.path.relpath(path, config_path)}")
+	for path in removed:
+		click.echo(f"  removed: {os.path.relpath(path, config_path)}")
+
+	return {"written": written, "removed": removed}
+
+
+def get_server_blocks(sites, snova_name, sites_path, site_name_variable) -> dict:
+	"""Returns the arguments of the `server_block` macro of nginx.conf for each include
+	file of `make_split_nginx_conf`, by file name"""
+	blocks = {}
+	shared = {"snova_name": snova_name, "sites_path": sites_path}
+
+	# names of group files start with an underscore, which hostnames can't
+	if sites.get("that_use_dns"):
+		blocks["_dns.conf"] = dict(
+			shared, port=80, server_names=sites["that_use_dns"], site_name=site_name_variable
+		)
+
+	if sites.get("that_use_wildcard_ssl"):
+		blocks["_wildcard_ssl.conf"] = dict(
+			shared,
+			port=443,
+			server_names=sites["that_use_wildcard_ssl"],
+			site_name=site_name_variable,
+			ssl_certificate=sites["wildcard_ssl_certificate"],
+			ssl_certificate_key=sites["wildcard_ssl_certificate_key"],
+		)
+
+	for site in sites.get("that_use_ssl", []):
+		if site.get("server_names"):
+			# hostnames sharing a certificate, with `nginx_map_routing`
+			certificate_hash = hashlib.sha256(site["ssl_certificate"].encode()).hexdigest()
+			filename = f"_ssl_{certificate_hash[:12]}.conf"
+			server_names = site["server_names"]
+		else:
+			server_names = [site.get("domain") or site["name"]]
+			filename = f"{server_names[0]}.conf"
+
+		if filename in blocks:
+			# eg: a site's domain is another site's name. The unsplit config has a server
+			# block for each as well, nginx warns of the conflicting server name
+			click.secho(f"{server_names[0]} is served by more than one site", fg="yellow")
+			i = 1
+			while f"{server_names[0]}-{i}.conf" in blocks:
+				i += 1
+			filename = f"{server_names[0]}-{i}.conf"
+
+		blocks[filename] = dict(
+			shared,
+			port=443,
+			server_names=server_names,
+			site_name=site_name_variable,
+			ssl_certificate=site["ssl_certificate"],
+			ssl_certificate_key=site["ssl_certificate_key"],
+		)
+
+	for site in sites.get("that_use_port", []):
+		blocks[f"{site['name']}.conf"] = dict(
+			shared, port=site["port"], server_names=[site["name"]], site_name=site["name"]
+		)
+
+	return blocks
+
+
+def write_if_changed(path, content, written):
+	"""Writes `content` to the file at `path` unless it has that content already, and
+	appends the path to `written` if it was written"""
+	try:
+		with open(path) as f:
+			if f.read() == content:
+				return
+	except FileNotFoundError:
+		pass
+
+	# unique, as the config may be generated by concurrent commands
+	tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+	try:
+		with open(tmp_path, "w") as f:
+			f.write(content)
+		os.replace(tmp_path, path)
+	finally:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+	written.append(path)
+
+
 def make_snova_manager_nginx_conf(snova_path, yes=False, port=23624, domain=None):
 	from snova.config.site_config import get_site_config
 
@@ -190,22 +379,96 @@ def prepare_sites(config, snova_path):
 
 	sites["domain_map"] = domain_map
 
+	if dns_multitenant and config.get("nginx_map_routing"):
+		use_map_routing(sites, set_hash_sizes=config.get("nginx_hash_sizes"))
+
 	return sites
 
 
+def use_map_routing(sites, set_hash_sizes=False):
+	"""Merges the server blocks of hostnames sharing a certificate, with
+	`nginx_map_routing` set. Hostnames are routed to their sites via the map from $host,
+	which holds the domains that differ from their site's name, as before.
+
+	With thousands of domains, the config then has a server block per certificate rather
+	than per domain, see benchmarks/nginx_map_routing.py. nginx's hashes of hostnames
+	are sized for a few hundred by default. The directives sizing them belong to the
+	host's http block, which other snovas or nginx.conf may set too, so they're only
+	added to the snova's config with `nginx_hash_sizes` set, and printed otherwise.
+	"""
+	groups = {}
+
+	if sites["that_use_wildcard_ssl"]:
+		certificate = (sites["wildcard_ssl_certificate"], sites["wildcard_ssl_certificate_key"])
+		groups[certificate] = list(sites["that_use_wildcard_ssl"])
+
+	for site in sites["that_use_ssl"]:
+		certificate = (site["ssl_certificate"], site["ssl_certificate_key"])
+		groups.setdefault(certificate, []).append(site.get("domain") or site["name"])
+
+	hostnames = sites["that_use_dns"] + [name for names in groups.values() for name in names]
+
+	sites["that_use_wildcard_ssl"] = []
+	sites["that_use_ssl"] = [
+		{"server_names": names, "ssl_certificate": certificate, "ssl_certificate_key": key}
+		for (certificate, key), names in groups.items()
+	]
+
+	hash_sizes = get_hash_sizes(hostnames)
+	if set_hash_sizes:
+		sites["hash_sizes"] = hash_sizes
+	elif hash_sizes:
+		click.secho(
+			f"nginx's default hash sizes are too small for the {len(hostnames)} hostnames"
+			" of this snova. Add the following to the http block of nginx.conf, or set"
+			" nginx_hash_sizes in common_site_config.json to add them to the snova's config:\n"
+			+ "\n".join(f"\t{directive} {value};" for directive, value in hash_sizes.items()),
+			fg="yellow",
+		)
+
+
+def get_hash_sizes(hostnames) -> dict:
+	"""Returns the nginx directives sizing the hashes of the map and of the server names
+	for `hostnames`, if nginx's defaults are too small for them.
+
+	An entry of an nginx hash takes a pointer and the name, padded to a pointer's size,
+	and a bucket must hold the longest entry and a terminating pointer. The hash is
+	given room for twice as many buckets as names, so that nginx finds a size without
+	too many collisions.
+	"""
+	if not hostnames:
+		return {}
+
+	longest = max(len(name) for name in hostnames)
+	entry_size = 8 + (longest + 2 + 7) // 8 * 8
+	bucket_size = max(64, 1 << (entry_size + 8 - 1).bit_length())
+	max_size = 1 << (2 * len(hostnames) - 1).bit_length()
+	directives = {}
+
+	# defaults on 64 bit machines
+	for hash_name, default_max_size in (("map_hash", 2048), ("server_names_hash", 512)):
+		if bucket_size > 64:
+			directives[f"{hash_name}_bucket_size"] = bucket_size
+		if max_size > default_max_size:
+			directives[f"{hash_name}_max_size"] = max_size
+
+	return directives
+
+
 def get_sites_with_config(snova_path):
+	"""Returns the nginx related config of each site, read from the site index, see
+	`snova.utils.site_index`"""
 	from snova.snova import Snova
-	from snova.config.site_config import get_site_config
+	from snova.utils.site_index import SiteIndex
 
-	snova = Snova(snova_path)
-	sites = snova.sites
-	conf = snova.conf
+	conf = Snova(snova_path).conf
+	site_index = SiteIndex(snova_path)
 	dns_multitenant = conf.get("dns_multitenant")
 
 	ret = []
-	for site in sites:
+	for site in site_index.sites:
 		try:
-			site_config = get_site_config(site, snova_path=snova_path)
+			site_config = site_index.get_config(site)
 		except Exception as e:
 			strict_nginx = conf.get("strict_nginx")
 			if strict_nginx:
@@ -239,6 +502,8 @@ def get_sites_with_config(snova_path):
 				# domain can be a string or a dict with 'domain', 'ssl_certificate', 'ssl_certificate_key'
 				if isinstance(domain, str):
 					domain = {"domain": domain}
+				else:
+					domain = dict(domain)
 
 				domain["name"] = site
 				ret.append(domain)
@@ -1,27 +1,38 @@
 # imports - standard imports
-import json
 import os
 from collections import defaultdict
 
+# imports - module imports
+from snova.config.store import config_store
+
 
 def get_site_config(site, snova_path="."):
-	config_path = os.path.join(snova_path, "sites", site, "site_config.json")
-	if not os.path.exists(config_path):
-		return {}
-	with open(config_path) as f:
-		return json.load(f)
+	return config_store.read(get_site_config_path(site, snova_path=snova_path))
+
+
+def get_site_config_path(site, snova_path="."):
+	return os.path.join(snova_path, "sites", site, "site_config.json")
+
+
+def get_site_db_host(site, snova_path="."):
+	"""Returns the database server of the site, as `host:port`"""
+	from snova.config.common_site_config import get_config
+
+	common_config = get_config(snova_path)
+	site_config = get_site_config(site, snova_path=snova_path)
+	host = site_config.get("db_host") or common_config.get("db_host") or "localhost"
+	port = site_config.get("db_port") or common_config.get("db_port") or ""
+	return f"{host}:{port}"
 
 
 def put_site_config(site, config, snova_path="."):
-	config_path = os.path.join(snova_path, "sites", site, "site_config.json")
-	with open(config_path, "w") as f:
-		return json.dump(config, f, indent=1)
+	config_store.write(get_site_config_path(site, snova_path=snova_path), config, indent=1)
 
 
 def update_site_config(site, new_config, snova_path="."):
-	config = get_site_config(site, snova_path=snova_path)
-	config.update(new_config)
-	put_site_config(site, config, snova_path=snova_path)
+	config_store.update(
+		get_site_config_path(site, snova_path=snova_path), new_config, indent=1
+	)
 
 
 def set_nginx_port(site, port, snova_path=".", gen_config=True):
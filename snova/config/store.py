@@ -0,0 +1,142 @@
+# imports - standard imports
+import copy
+import json
+import os
+import stat
+import threading
+from contextlib import contextmanager
+
+
+class ConfigStore:
+	"""Reads and writes the snova's JSON config files, ie: common_site_config.json and
+	the sites' site_config.json.
+
+	Parsed files are cached by path and reused for as long as the file's inode, mtime
+	and size are unchanged, so that reading the config many times during a command
+	costs a stat each. Changes made by other processes are picked up by the next read.
+
+	Writes are atomic: the file is written to a temporary file, fsynced and renamed
+	over the original. Within `batch()`, writes are held back and each file is
+	written once as the outermost batch exits.
+	"""
+
+	lock = threading.RLock()
+
+	def __init__(self):
+		self.cache = {}
+		self.pending = {}
+		self.batch_depth = 0
+		self.hits = 0
+		self.misses = 0
+		self.writes = 0
+
+	def read(self, path) -> dict:
+		"""Returns the parsed contents of the file at `path`, {} if it doesn't exist. The
+		returned dict is the caller's to modify"""
+		path = os.path.abspath(path)
+
+		with self.lock:
+			if path in self.pending:
+				return copy.deepcopy(self.pending[path][0])
+
+			try:
+				key = get_file_key(path)
+			except FileNotFoundError:
+				self.cache.pop(path, None)
+				self.misses += 1
+				return {}
+
+			cached = self.cache.get(path)
+			if cached and cached[0] == key:
+				self.hits += 1
+				return copy.deepcopy(cached[1])
+
+			self.misses += 1
+			with open(path) as f:
+				config = json.load(f)
+			self.cache[path] = (key, config)
+
+			return copy.deepcopy(config)
+
+	def write(self, path, config, **dump_kwargs):
+		"""Replaces the contents of the file at `path` with `config`, serialized with
+		`json.dump(config, **dump_kwargs)`"""
+		path = os.path.abspath(path)
+		config = copy.deepcopy(config)
+
+		with self.lock:
+			if self.batch_depth:
+				self.pending[path] = (config, dump_kwargs)
+			else:
+				self._write(path, config, dump_kwargs)
+
+	def update(self, path, new_config, **dump_kwargs):
+		with self.lock:
+			config = self.read(path)
+			config.update(new_config)
+			self.write(path, config, **dump_kwargs)
+
+	@contextmanager
+	def batch(self):
+		"""Holds back writes until the outermost batch exits, which writes each changed
+		file once. Reads within the batch see the pending changes. Nothing is written if
+		the batch raises"""
+		with self.lock:
+			self.batch_depth += 1
+			try:
+				yield self
+			except BaseException:
+				if self.batch_depth == 1:
+					self.pending.clear()
+				raise
+			finally:
+				self.batch_depth -= 1
+
+			if not self.batch_depth:
+				pending, self.pending = self.pending, {}
+				for path, (config, dump_kwargs) in pending.items():
+					self._write(path, config, dump_kwargs)
+
+	def _write(self, path, config, dump_kwargs):
+		tmp_path = f"{path}.{os.getpid()}.tmp"
+
+		try:
+			mode = stat.S_IMODE(os.stat(path).st_mode)
+		except FileNotFoundError:
+			mode = None
+
+		# created as open() would, honouring the umask
+		fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+		try:
+			with os.fdopen(fd, "w") as f:
+				json.dump(config, f, **dump_kwargs)
+				f.flush()
+				os.fsync(f.fileno())
+			if mode is not None:
+				# keeps eg: site_config.json, which holds credentials, private
+				os.chmod(tmp_path, mode)
+			os.replace(tmp_path, path)
+		except BaseException:
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+			raise
+
+		self.cache[path] = (get_file_key(path), config)
+		self.writes += 1
+
+	def get_stats(self) -> dict:
+		return {"hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+	def clear(self):
+		with self.lock:
+			self.cache.clear()
+
+
+def get_file_key(path):
+	"""Returns what identifies a version of the file at `path`. An atomic write replaces
+	the inode, an in place write changes the mtime and usually the size"""
+	st = os.stat(path)
+	return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+config_store = ConfigStore()
@@ -17,6 +17,7 @@ from snova.config.common_site_config import (
 	get_gunicorn_workers,
 	update_config,
 )
+from snova.config.store import config_store
 from snova.utils import get_snova_name, which
 
 logger = logging.getLogger(snova.PROJECT_NAME)
@@ -72,9 +73,10 @@ def generate_supervisor_config(snova_path, user=None, yes=False, skip_redis=Fals
 	with open(conf_path, "w") as f:
 		f.write(config)
 
-	update_config({"restart_supervisor_on_update": True}, snova_path=snova_path)
-	update_config({"restart_systemd_on_update": False}, snova_path=snova_path)
-	sync_socketio_port(snova_path)
+	with config_store.batch():
+		update_config({"restart_supervisor_on_update": True}, snova_path=snova_path)
+		update_config({"restart_systemd_on_update": False}, snova_path=snova_path)
+		sync_socketio_port(snova_path)
 
 
 def get_supervisord_conf():
@@ -99,7 +101,7 @@ def sync_socketio_port(snova_path):
 	socketio_port = common_config.get("redis_socketio")
 	cache_port = common_config.get("redis_cache")
 	if socketio_port and socketio_port != cache_port:
-		update_config({"redis_socketio": cache_port})
+		update_config({"redis_socketio": cache_port}, snova_path=snova_path)
 
 
 def can_enable_multi_queue_consumption(snova_path: str) -> bool:
@@ -104,8 +104,10 @@ def generate_systemd_config(
 	setup_web_config(snova_info, snova_path)
 	setup_redis_config(snova_info, snova_path)
 
-	update_config({"restart_systemd_on_update": False}, snova_path=snova_path)
-	update_config({"restart_supervisor_on_update": False}, snova_path=snova_path)
+	update_config(
+		{"restart_systemd_on_update": False, "restart_supervisor_on_update": False},
+		snova_path=snova_path,
+	)
 
 
 def setup_systemd_directory(snova_path):
@@ -0,0 +1,153 @@
+"""Entry point of the snova CLI.
+
+Most invocations inside a snova are Sparrow commands (migrate, backup, worker,
+schedule...) which the CLI ultimately hands over to the snova's Python via `os.execv`.
+If the command manifest (see `snova.manifest`) is up to date and lists the command,
+it is forwarded right away, without loading click, the snova config or any of snova's
+commands. Everything else is handled by `snova.cli.cli`.
+
+Note: Keep this module stdlib only, it runs before anything else on every invocation.
+"""
+
+# imports - standard imports
+import os
+import sys
+
+# options that are passed as context to sparrow's snova_helper
+SPARROW_CONTEXT_PARAMS = ("--site",)
+SPARROW_CONTEXT_FLAGS = ("--verbose", "--profile", "--force")
+PATHS_IN_SNOVA = ("apps", "sites", "config", "logs", "config/pids")
+
+
+def main():
+	snova_path = get_forwarding_snova_path()
+
+	if snova_path:
+		forward_to_sparrow(snova_path)
+
+	from snova.cli import cli
+
+	return cli()
+
+
+def get_forwarding_snova_path():
+	"""Returns the snova path if the current command can be forwarded to Sparrow directly"""
+	argv = sys.argv[1:]
+
+	if not argv or argv[0] in ("--help", "-h"):
+		return None
+
+	# privileges are dropped and checked by the CLI
+	if os.getuid() == 0:
+		return None
+
+	snova_path = find_snova_path(os.getcwd())
+	if not snova_path:
+		return None
+
+	if not os.path.exists(os.path.join(snova_path, "env", "bin", "python")):
+		return None
+
+	command = get_command(argv, snova_path)
+	if not command:
+		return None
+
+	from snova.manifest import read_manifest
+
+	manifest = read_manifest(snova_path)
+	if not manifest or "snova_commands" not in manifest:
+		return None
+
+	if command in manifest["snova_commands"]:
+		return None
+
+	if command not in manifest["sparrow_commands"]:
+		return None
+
+	return snova_path
+
+
+def forward_to_sparrow(snova_path):
+	"""Replaces the current process with Sparrow's snova_helper, like `snova.cli.sparrow_cmd`.
+	Commands routed to a running helper daemon are executed there instead."""
+	log_command(snova_path)
+
+	from snova.helper_daemon import (
+		get_routed_commands,
+		is_helper_daemon_running,
+		run_via_helper_daemon,
+	)
+
+	if is_helper_daemon_running(snova_path) and get_command(
+		sys.argv[1:], snova_path
+	) in get_routed_commands(snova_path):
+		return_code = run_via_helper_daemon(["sparrow"] + sys.argv[1:], snova_path=snova_path)
+		if return_code is not None:
+			sys.exit(return_code)
+
+	python = os.path.join(os.path.abspath(snova_path), "env", "bin", "python")
+	os.chdir(os.path.join(snova_path, "sites"))
+	os.execv(
+		python, [python, "-m", "sparrow.utils.snova_helper", "sparrow"] + sys.argv[1:]
+	)
+
+
+def get_command(argv, snova_path):
+	"""Same as `snova.utils.get_cmd_from_sysargv` but never loads the snova. Commands
+	prefixed with an app's name are left to the CLI."""
+	skip_next = False
+
+	for idx, arg in enumerate(argv):
+		if skip_next:
+			skip_next = False
+			continue
+
+		if arg in SPARROW_CONTEXT_FLAGS:
+			continue
+
+		if arg in SPARROW_CONTEXT_PARAMS:
+			skip_next = True
+			continue
+
+		if idx == 0 and os.path.isdir(os.path.join(snova_path, "apps", arg)):
+			return None
+
+		return arg
+
+	return None
+
+
+def is_snova_directory(directory):
+	return all(os.path.exists(os.path.join(directory, path)) for path in PATHS_IN_SNOVA)
+
+
+def find_snova_path(path):
+	"""Same as `snova.utils.find_parent_snova`"""
+	home_path = os.path.expanduser("~")
+	root_path = os.path.abspath(os.sep)
+
+	while True:
+		if is_snova_directory(path):
+			return path
+
+		if path in {home_path, root_path}:
+			return None
+
+		path = os.path.dirname(path)
+
+
+def log_command(snova_path):
+	import logging
+	from snova import PROJECT_NAME
+
+	try:
+		handler = logging.FileHandler(os.path.join(snova_path, "logs", "snova.log"))
+	except OSError:
+		return
+
+	handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+	logger = logging.getLogger(PROJECT_NAME)
+	logger.addHandler(handler)
+	logger.setLevel(logging.DEBUG)
+	logger.info(" ".join(sys.argv))
+	handler.close()
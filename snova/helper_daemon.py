@@ -0,0 +1,447 @@
+"""A warm process for executing Sparrow commands without interpreter cold starts.
+
+`snova helper-daemon start` runs this file with the snova's Python. It preloads
+`sparrow.utils.snova_helper` (and the commands of installed apps) and listens on
+`config/snova_helper.sock`. Each request is served in a forked child that inherits
+the client's stdin, stdout and stderr, so output and exit codes behave the same as
+when spawning `python -m sparrow.utils.snova_helper`.
+
+The daemon is started with the snova's command manifest key (see `snova.manifest`)
+and exits on the first request made with a different key, i.e. once apps have been
+updated or the env has changed. Clients fall back to spawning a new process whenever
+the daemon isn't running or is stale.
+
+Note: This file is executed by the snova's env, which may not have snova installed.
+Keep it stdlib only and don't import snova at module level.
+"""
+
+# imports - standard imports
+import array
+import io
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+
+HELPER_MODULE = "sparrow.utils.snova_helper"
+SOCKET_FILE = "snova_helper.sock"
+PID_FILE = "snova_helper.pid"
+LOG_FILE = "snova_helper.log"
+
+# short-lived, non-interactive commands routed to the daemon by the CLI. Can be
+# overridden via `helper_daemon_commands` in common_site_config.json
+DEFAULT_COMMANDS = (
+	"backup",
+	"build",
+	"clear-cache",
+	"clear-website-cache",
+	"execute",
+	"list-apps",
+	"migrate",
+)
+FORWARDED_SIGNALS = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)
+HEADER = struct.Struct("!I")
+MAX_FDS = 3
+# seconds a client has to send its request, the daemon serves one client at a time
+REQUEST_TIMEOUT = 2
+
+
+def get_socket_path(snova_path="."):
+	return os.path.join(os.path.abspath(snova_path), "config", SOCKET_FILE)
+
+
+def get_pid_path(snova_path="."):
+	return os.path.join(os.path.abspath(snova_path), "config", "pids", PID_FILE)
+
+
+def is_helper_daemon_running(snova_path=".") -> bool:
+	return os.path.exists(get_socket_path(snova_path))
+
+
+def get_routed_commands(snova_path="."):
+	"""Returns the Sparrow commands that the CLI executes via the helper daemon"""
+	from snova.config.common_site_config import get_config
+
+	try:
+		commands = get_config(snova_path).get("helper_daemon_commands")
+	except (OSError, ValueError):
+		commands = None
+
+	return DEFAULT_COMMANDS if commands is None else tuple(commands)
+
+
+def send_message(conn, message, fds=None):
+	payload = json.dumps(message).encode()
+	data = HEADER.pack(len(payload)) + payload
+
+	if fds:
+		ancdata = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))]
+		sent = conn.sendmsg([data], ancdata)
+		data = data[sent:]
+
+	if data:
+		conn.sendall(data)
+
+
+def receive_message(conn):
+	"""Returns the next message and the file descriptors sent along with it"""
+	fds = array.array("i")
+	data, ancdata, _, _ = conn.recvmsg(
+		HEADER.size, socket.CMSG_SPACE(MAX_FDS * fds.itemsize)
+	)
+
+	for level, _type, cmsg_data in ancdata:
+		if level == socket.SOL_SOCKET and _type == socket.SCM_RIGHTS:
+			fds.frombytes(cmsg_data[: len(cmsg_data) - (len(cmsg_data) % fds.itemsize)])
+
+	if not data:
+		raise EOFError("Connection closed")
+
+	data += _receive_exactly(conn, HEADER.size - len(data))
+	(length,) = HEADER.unpack(data)
+	return json.loads(_receive_exactly(conn, length).decode()), list(fds)
+
+
+def _receive_exactly(conn, size):
+	data = b""
+	while len(data) < size:
+		chunk = conn.recv(size - len(data))
+		if not chunk:
+			raise EOFError("Connection closed")
+		data += chunk
+	return data
+
+
+# client
+
+
+def connect(snova_path="."):
+	"""Returns a connection to the snova's helper daemon, None if it isn't running"""
+	socket_path = get_socket_path(snova_path)
+
+	if not os.path.exists(socket_path):
+		return None
+
+	# paths of unix sockets are limited to ~100 bytes
+	relative_path = os.path.relpath(socket_path)
+	if len(relative_path) < len(socket_path):
+		socket_path = relative_path
+
+	conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		conn.connect(socket_path)
+	except OSError:
+		conn.close()
+		return None
+
+	return conn
+
+
+def ping(snova_path=".", key=None):
+	"""Returns the status of the daemon: running, stale or None if not running"""
+	from snova.manifest import get_manifest_key
+
+	conn = connect(snova_path)
+	if not conn:
+		return None
+
+	try:
+		send_message(conn, {"ping": 1, "key": key or get_manifest_key(snova_path)})
+		return receive_message(conn)[0]
+	except (OSError, EOFError, ValueError):
+		return None
+	finally:
+		conn.close()
+
+
+def run_via_helper_daemon(args, snova_path=".", stdout=None):
+	"""Executes `python -m sparrow.utils.snova_helper *args` in the helper daemon.
+
+	Returns the command's exit code or None if the daemon isn't available, in which
+	case the caller is expected to spawn the command itself.
+	"""
+	from snova.manifest import get_manifest_key
+
+	conn = connect(snova_path)
+	if not conn:
+		return None
+
+	request = {
+		"key": get_manifest_key(snova_path),
+		"args": list(args),
+		"cwd": os.path.join(os.path.abspath(snova_path), "sites"),
+		"env": dict(os.environ),
+	}
+	# same as a spawned process, the command inherits the process' standard streams
+	stdout = 1 if stdout is None else stdout
+
+	for stream in (sys.stdout, sys.stderr):
+		stream.flush()
+
+	try:
+		fds = [0, stdout, 2]
+		send_message(conn, request, fds=fds)
+		response = receive_message(conn)[0]
+	except (OSError, EOFError, ValueError):
+		conn.close()
+		return None
+
+	if "pid" not in response:
+		# stale daemon, it exits on its own
+		conn.close()
+		return None
+
+	pid = response["pid"]
+	handlers = {}
+
+	def forward_signal(signum, frame):
+		try:
+			os.kill(pid, signum)
+		except ProcessLookupError:
+			pass
+
+	# signal handlers can only be set from the main thread, eg: not by update stages
+	if threading.current_thread() is threading.main_thread():
+		for signum in FORWARDED_SIGNALS:
+			handlers[signum] = signal.signal(signum, forward_signal)
+
+	try:
+		return receive_message(conn)[0]["exit_code"]
+	except (OSError, EOFError, ValueError, KeyError):
+		# the command was killed before reporting back
+		return 1
+	finally:
+		conn.close()
+		for signum, handler in handlers.items():
+			signal.signal(signum, handler)
+
+
+def get_helper_daemon_output(args, snova_path="."):
+	"""Same as `run_via_helper_daemon` but returns the exit code and captured stdout"""
+	read_fd, write_fd = os.pipe()
+	output = []
+
+	def read_output():
+		with io.open(read_fd, "rb") as f:
+			output.append(f.read())
+
+	reader = threading.Thread(target=read_output, daemon=True)
+	reader.start()
+
+	try:
+		return_code = run_via_helper_daemon(args, snova_path=snova_path, stdout=write_fd)
+	finally:
+		os.close(write_fd)
+
+	reader.join()
+
+	if return_code is None:
+		return None
+
+	return return_code, b"".join(output).decode()
+
+
+def start_helper_daemon(snova_path=".", foreground=False):
+	import subprocess
+	import time
+
+	from snova.manifest import get_manifest_key
+	from snova.utils.snova import get_env_cmd
+
+	python = get_env_cmd("python", snova_path=snova_path)
+	key = get_manifest_key(snova_path)
+	status = ping(snova_path=snova_path, key=key)
+
+	if status and status.get("status") == "running":
+		return status
+	cmd = [
+		python,
+		os.path.abspath(__file__),
+		get_socket_path(snova_path),
+		get_pid_path(snova_path),
+		key,
+	]
+	sites_path = os.path.join(snova_path, "sites")
+
+	if foreground:
+		os.chdir(sites_path)
+		os.execv(python, cmd)
+
+	log_path = os.path.join(os.path.abspath(snova_path), "logs", LOG_FILE)
+	with open(log_path, "a") as log_file:
+		process = subprocess.Popen(
+			cmd,
+			cwd=sites_path,
+			stdin=subprocess.DEVNULL,
+			stdout=log_file,
+			stderr=subprocess.STDOUT,
+			start_new_session=True,
+		)
+
+	for _ in range(600):
+		status = ping(snova_path=snova_path, key=key)
+		if status and status.get("status") == "running":
+			return status
+		if process.poll() is not None:
+			break
+		time.sleep(0.1)
+
+	return None
+
+
+def stop_helper_daemon(snova_path="."):
+	try:
+		with open(get_pid_path(snova_path)) as f:
+			pid = int(f.read().strip())
+		os.kill(pid, signal.SIGTERM)
+	except (OSError, ValueError):
+		return False
+
+	return True
+
+
+# server
+
+
+def preload():
+	import importlib
+
+	helper = importlib.import_module(HELPER_MODULE)
+
+	# resolving the app groups imports the commands of all installed apps
+	get_app_groups = getattr(helper, "get_app_groups", None)
+	if get_app_groups:
+		try:
+			get_app_groups()
+		except Exception:
+			pass
+
+
+def serve(socket_path, pid_path, key):
+	preload()
+
+	def stop(signum, frame):
+		raise SystemExit(0)
+
+	signal.signal(signal.SIGTERM, stop)
+	signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+	if os.path.exists(socket_path):
+		os.remove(socket_path)
+
+	server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	# created accessible to the user only, other users could connect before a chmod
+	umask = os.umask(0o077)
+	try:
+		server.bind(os.path.relpath(socket_path))
+	finally:
+		os.umask(umask)
+	server.listen(16)
+
+	with open(pid_path, "w") as f:
+		f.write(str(os.getpid()))
+
+	print("snova helper daemon {} listening on {}".format(os.getpid(), socket_path))
+	sys.stdout.flush()
+
+	try:
+		while True:
+			conn = server.accept()[0]
+			fds = []
+
+			try:
+				# a client that never sends its request doesn't block the others
+				conn.settimeout(REQUEST_TIMEOUT)
+				request, fds = receive_message(conn)
+				conn.settimeout(None)
+
+				if request.get("key") != key:
+					send_message(conn, {"status": "stale"})
+					print("Apps or env changed since the daemon was started, exiting")
+					break
+
+				if request.get("ping"):
+					send_message(conn, {"status": "running", "pid": os.getpid()})
+					continue
+
+				sys.stdout.flush()
+				sys.stderr.flush()
+
+				if os.fork() == 0:
+					server.close()
+					execute_request(conn, request, fds)
+
+			except (OSError, EOFError, ValueError) as e:
+				print("Failed to handle request: {}".format(e))
+
+			finally:
+				conn.close()
+				for fd in fds:
+					os.close(fd)
+
+	finally:
+		server.close()
+		for path in (socket_path, pid_path):
+			if os.path.exists(path):
+				os.remove(path)
+
+
+def execute_request(conn, request, fds):
+	"""Runs the request in the forked child, never returns"""
+	import runpy
+	import traceback
+
+	exit_code = 1
+
+	try:
+		signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+		signal.signal(signal.SIGTERM, signal.SIG_DFL)
+		signal.signal(signal.SIGINT, signal.default_int_handler)
+
+		for target_fd, fd in enumerate(fds[:MAX_FDS]):
+			os.dup2(fd, target_fd)
+
+		sys.stdin = io.open(0, "r", closefd=False)
+		sys.stdout = io.open(1, "w", buffering=1 if os.isatty(1) else -1, closefd=False)
+		sys.stderr = io.open(2, "w", buffering=1, closefd=False)
+
+		os.chdir(request["cwd"])
+		os.environ.clear()
+		os.environ.update(request["env"])
+
+		send_message(conn, {"pid": os.getpid()})
+		sys.argv = [sys.executable] + request["args"]
+
+		# execute the preloaded helper as __main__, its imports are already warm
+		sys.modules.pop(HELPER_MODULE, None)
+
+		try:
+			runpy.run_module(HELPER_MODULE, run_name="__main__", alter_sys=True)
+			exit_code = 0
+		except SystemExit as e:
+			if e.code is None or isinstance(e.code, int):
+				exit_code = e.code or 0
+			else:
+				print(e.code, file=sys.stderr)
+				exit_code = 1
+
+	except BaseException:
+		traceback.print_exc()
+
+	finally:
+		try:
+			sys.stdout.flush()
+			sys.stderr.flush()
+			send_message(conn, {"exit_code": exit_code})
+		finally:
+			os._exit(exit_code)
+
+
+if __name__ == "__main__":
+	# the script's directory is snova's package directory, its modules (eg: config,
+	# utils, patches) must not shadow the top level modules imported by apps
+	sys.path.pop(0)
+	serve(*sys.argv[1:4])
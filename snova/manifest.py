@@ -0,0 +1,154 @@
+"""On-disk cache of the commands exposed by Sparrow and the apps installed on a snova.
+
+Resolving Sparrow's command list requires spawning the snova's Python and importing
+Sparrow, which is too slow to do on every invocation. The manifest is written to
+`config/sparrow_commands.json` and is keyed on everything that can change that list:
+the snova version, the env's interpreter, `sites/apps.txt` / `sites/apps.json` and
+the checked out commit of each installed app. `snova.dispatch` uses it to forward
+Sparrow commands without loading the CLI.
+
+Note: This module is imported before dispatching commands, keep it stdlib only.
+"""
+
+# imports - standard imports
+import hashlib
+import json
+import os
+
+# imports - module imports
+from snova import VERSION
+
+MANIFEST_FILE = "sparrow_commands.json"
+APP_COMMAND_FILES = ("hooks.py", "commands.py", os.path.join("commands", "__init__.py"))
+
+
+def get_manifest_path(snova_path="."):
+	return os.path.join(snova_path, "config", MANIFEST_FILE)
+
+
+def get_manifest_key(snova_path=".") -> str:
+	"""Returns a hash of the state that the Sparrow command list depends on"""
+	key = hashlib.sha256(VERSION.encode())
+
+	python = os.path.join(snova_path, "env", "bin", "python")
+	key.update(os.path.realpath(python).encode())
+	key.update(_get_stat_signature(os.path.join(snova_path, "env", "pyvenv.cfg")))
+
+	for states_file in ("apps.txt", "apps.json"):
+		key.update(_read_bytes(os.path.join(snova_path, "sites", states_file)))
+
+	for app in get_installed_app_names(snova_path):
+		app_path = os.path.join(snova_path, "apps", app)
+		key.update(app.encode())
+		key.update((get_head_commit(app_path) or "").encode())
+
+		# catch uncommitted changes to an app's commands in developer setups
+		for path in APP_COMMAND_FILES:
+			key.update(_get_stat_signature(os.path.join(app_path, app, path)))
+
+	return key.hexdigest()
+
+
+def read_manifest(snova_path=".", key=None):
+	"""Returns the cached manifest, None if it doesn't exist or is stale"""
+	try:
+		with open(get_manifest_path(snova_path)) as f:
+			manifest = json.load(f)
+	except (OSError, ValueError):
+		return None
+
+	if not isinstance(manifest, dict):
+		return None
+
+	if manifest.get("key") != (key or get_manifest_key(snova_path)):
+		return None
+
+	return manifest
+
+
+def write_manifest(sparrow_commands, snova_path=".", key=None, snova_commands=None):
+	"""Writes the manifest. `snova_commands` are snova's own commands, which take
+	precedence over Sparrow's commands of the same name"""
+	manifest_path = get_manifest_path(snova_path)
+	manifest = {
+		"key": key or get_manifest_key(snova_path),
+		"sparrow_commands": sorted(sparrow_commands),
+	}
+
+	if snova_commands is not None:
+		manifest["snova_commands"] = sorted(snova_commands)
+
+	if not os.path.isdir(os.path.dirname(manifest_path)):
+		return manifest
+
+	# write to a temporary file first so that concurrent invocations never read
+	# a partially written manifest
+	tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+	try:
+		with open(tmp_path, "w") as f:
+			json.dump(manifest, f)
+		os.replace(tmp_path, manifest_path)
+	except OSError:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+
+	return manifest
+
+
+def clear_manifest(snova_path="."):
+	try:
+		os.remove(get_manifest_path(snova_path))
+	except FileNotFoundError:
+		pass
+
+
+def get_installed_app_names(snova_path=".") -> list:
+	try:
+		with open(os.path.join(snova_path, "sites", "apps.txt")) as f:
+			return [app.strip() for app in f.read().splitlines() if app.strip()]
+	except OSError:
+		return []
+
+
+def get_head_commit(app_path):
+	"""Resolves HEAD of a git repository by reading `.git` directly, without spawning git"""
+	git_dir = os.path.join(app_path, ".git")
+
+	if os.path.isfile(git_dir):
+		# worktrees and submodules point to the actual git directory
+		content = _read_bytes(git_dir).decode().strip()
+		if not content.startswith("gitdir:"):
+			return None
+		git_dir = os.path.join(app_path, content.split(":", 1)[1].strip())
+
+	head = _read_bytes(os.path.join(git_dir, "HEAD")).decode().strip()
+
+	if not head.startswith("ref:"):
+		return head or None
+
+	ref = head.split(":", 1)[1].strip()
+	commit = _read_bytes(os.path.join(git_dir, *ref.split("/"))).decode().strip()
+	if commit:
+		return commit
+
+	for line in _read_bytes(os.path.join(git_dir, "packed-refs")).decode().splitlines():
+		if line.endswith(f" {ref}"):
+			return line.split(" ", 1)[0]
+
+	return None
+
+
+def _read_bytes(path) -> bytes:
+	try:
+		with open(path, "rb") as f:
+			return f.read()
+	except OSError:
+		return b""
+
+
+def _get_stat_signature(path) -> bytes:
+	try:
+		stat = os.stat(path)
+	except OSError:
+		return b"-"
+	return f"{stat.st_mtime_ns}:{stat.st_size}".encode()
@@ -6,6 +6,7 @@ import shutil
 import json
 import sys
 import logging
+import threading
 from typing import List, MutableSequence, TYPE_CHECKING, Union
 
 # imports - module imports
@@ -44,8 +45,8 @@ logger = logging.getLogger(snova.PROJECT_NAME)
 
 
 class Base:
-	def run(self, cmd, cwd=None, _raise=True):
-		return exec_cmd(cmd, cwd=cwd or self.cwd, _raise=_raise)
+	def run(self, cmd, cwd=None, _raise=True, prefix=None):
+		return exec_cmd(cmd, cwd=cwd or self.cwd, _raise=_raise, prefix=prefix)
 
 
 class Validator:
@@ -93,14 +94,14 @@ class Snova(Base, Validator):
 
 	@property
 	def sites(self) -> List:
-		return [
-			path
-			for path in os.listdir(os.path.join(self.name, "sites"))
-			if os.path.exists(os.path.join("sites", path, "site_config.json"))
-		]
+		from snova.utils.site_index import SiteIndex
+
+		return SiteIndex(self.name).sites
 
 	@property
 	def conf(self):
+		"""common_site_config.json, parsed only if it changed since last read, see
+		`snova.config.store`"""
 		from snova.config.common_site_config import get_config
 
 		return get_config(self.name)
@@ -137,8 +138,16 @@ class Snova(Base, Validator):
 		self.reload(_raise=False)
 
 	@step(title="Building Snova Assets", success="Snova Assets Built")
-	def build(self):
+	def build(self, apps=None):
 		# build assets & stuff
+		if self.conf.get("use_asset_cache"):
+			from snova.utils.assets import build_with_asset_cache
+
+			return build_with_asset_cache(snova_path=self.name, apps=apps)
+
+		if apps:
+			return run_sparrow_cmd("build", "--apps", ",".join(apps), snova_path=self.name)
+
 		run_sparrow_cmd("build", snova_path=self.name)
 
 	@step(title="Reloading Snova Processes", success="Snova Processes Reloaded")
@@ -168,6 +177,9 @@ class Snova(Base, Validator):
 
 
 class SnovaApps(MutableSequence):
+	# apps.txt and apps.json may be written by stages of an update running concurrently
+	lock = threading.RLock()
+
 	def __init__(self, snova: Snova):
 		self.snova = snova
 		self.states_path = os.path.join(self.snova.name, "sites", "apps.json")
@@ -189,6 +201,12 @@ class SnovaApps(MutableSequence):
 		branch: Union[str, None] = None,
 		required: List = UNSET_ARG,
 	):
+		with self.lock:
+			self._update_apps_states(
+				app_dir=app_dir, app_name=app_name, branch=branch, required=required
+			)
+
+	def _update_apps_states(self, app_dir=None, app_name=None, branch=None, required=UNSET_ARG):
 		if required == UNSET_ARG:
 			required = []
 		if self.apps and not os.path.exists(self.states_path):
@@ -254,6 +272,71 @@ class SnovaApps(MutableSequence):
 		with open(self.states_path, "w") as f:
 			f.write(json.dumps(self.states, indent=4))
 
+	def get_changed_requirements(self, app: str) -> set:
+		"""Returns the kinds of requirements (python, node) of the app whose files changed
+		since they were last installed"""
+		from snova.utils.app import get_requirements_fingerprint
+
+		installed = self.states.get(app, {}).get("requirements") or {}
+		current = get_requirements_fingerprint(
+			app, snova_path=self.snova.name, developer_mode=self.snova.conf.get("developer_mode")
+		)
+		return {kind for kind, fingerprint in current.items() if installed.get(kind) != fingerprint}
+
+	def update_requirements_fingerprint(self, app: str, kinds=("python", "node")):
+		"""Records the app's requirements of the given kinds as installed, see
+		`get_changed_requirements`"""
+		from snova.utils.app import get_requirements_fingerprint
+
+		fingerprint = get_requirements_fingerprint(
+			app, snova_path=self.snova.name, developer_mode=self.snova.conf.get("developer_mode")
+		)
+
+		with self.lock:
+			if app not in self.states:
+				return
+
+			installed = self.states[app].setdefault("requirements", {})
+			installed.update({kind: fingerprint[kind] for kind in kinds})
+
+			with open(self.states_path, "w") as f:
+				f.write(json.dumps(self.states, indent=4))
+
+	def get_stage_commit(self, app: str, stage: str):
+		"""Returns the app's commit that `stage` of `snova update` last completed at"""
+		return (self.states.get(app, {}).get("stages") or {}).get(stage)
+
+	def record_stage_commits(self, stage: str, apps=None):
+		"""Records the apps' checked out commits as the ones `stage` of `snova update`
+		(patch, build) last completed at, see `snova.utils.changes`"""
+		from snova.utils.changes import get_current_commit
+
+		commits = {app: get_current_commit(app, self.snova.name) for app in apps or self.apps}
+
+		with self.lock:
+			for app, commit in commits.items():
+				if app not in self.states:
+					continue
+
+				self.states[app].setdefault("stages", {})[stage] = commit
+
+			with open(self.states_path, "w") as f:
+				f.write(json.dumps(self.states, indent=4))
+
+	def forget_requirements_fingerprint(self, app: str, kinds=("python", "node")):
+		"""Marks the app's requirements of the given kinds as not installed, eg: after
+		switching envs"""
+		with self.lock:
+			installed = self.states.get(app, {}).get("requirements")
+			if not installed:
+				return
+
+			for kind in kinds:
+				installed.pop(kind, None)
+
+			with open(self.states_path, "w") as f:
+				f.write(json.dumps(self.states, indent=4))
+
 	def sync(
 		self,
 		app_name: Union[str, None] = None,
@@ -263,14 +346,16 @@ class SnovaApps(MutableSequence):
 	):
 		if required == UNSET_ARG:
 			required = []
-		self.initialize_apps()
 
-		with open(self.snova.apps_txt, "w") as f:
-			f.write("\n".join(self.apps))
+		with self.lock:
+			self.initialize_apps()
 
-		self.update_apps_states(
-			app_name=app_name, app_dir=app_dir, branch=branch, required=required
-		)
+			with open(self.snova.apps_txt, "w") as f:
+				f.write("\n".join(self.apps))
+
+			self.update_apps_states(
+				app_name=app_name, app_dir=app_dir, branch=branch, required=required
+			)
 
 	def initialize_apps(self):
 		try:
@@ -449,23 +534,82 @@ class SnovaSetup(Base):
 		logger.log("backups were set up")
 
 	@job(title="Setting Up Snova Dependencies", success="Snova Dependencies Set Up")
-	def requirements(self, apps=None):
-		"""Install and upgrade specified / all installed apps on given Snova"""
+	def requirements(
+		self,
+		apps=None,
+		batch=False,
+		skip_unchanged=False,
+		python=True,
+		node=True,
+		on_app_done=None,
+	):
+		"""Install and upgrade specified / all installed apps on given Snova
+
+		If `batch` is set, the Python packages of all apps are installed by a single pip
+		run, i.e. dependencies are resolved once rather than once per app.
+
+		If `skip_unchanged` is set, an app's Python or Node packages are only installed if
+		the files they're installed from changed since the last install.
+
+		Pass `python` or `node` as False to only install the other kind of packages.
+		`on_app_done(app, duration)` is called for each app installed, the duration of
+		a batched pip run is shared among its apps.
+		"""
+		from time import monotonic
+
 		from snova.app import App
+		from snova.utils.snova import install_python_dev_dependencies
 
 		apps = apps or self.snova.apps
+		kinds = {kind for kind, enabled in (("python", python), ("node", node)) if enabled}
+		changed = {app: kinds for app in apps}
 
-		self.pip()
+		if skip_unchanged:
+			changed = {
+				app: self.snova.apps.get_changed_requirements(app) & kinds for app in apps
+			}
+			unchanged_apps = [app for app in apps if not changed[app]]
+			apps = [app for app in apps if changed[app]]
+
+			if unchanged_apps:
+				print(f"Requirements of {', '.join(unchanged_apps)} are unchanged, skipping...")
+
+		if not apps:
+			return
+
+		python_apps = [app for app in apps if "python" in changed[app]]
+		if python_apps:
+			self.pip()
 
 		print(f"Installing {len(apps)} applications...")
+		batch_share = 0
+
+		if batch and python_apps:
+			start = monotonic()
+			self.python_packages(python_apps)
+
+			if self.snova.conf.get("developer_mode"):
+				install_python_dev_dependencies(apps=python_apps, snova_path=self.snova.name)
+
+			for app in python_apps:
+				self.snova.apps.update_requirements_fingerprint(app, kinds=("python",))
+			batch_share = (monotonic() - start) / len(python_apps)
 
 		for app in apps:
+			start = monotonic()
 			path_to_app = os.path.join(self.snova.name, "apps", app)
-			app = App(path_to_app, snova=self.snova, to_clone=False).install(
-				skip_assets=True, restart_snova=False, ignore_resolution=True
+			App(path_to_app, snova=self.snova, to_clone=False).install(
+				skip_assets=True,
+				restart_snova=False,
+				ignore_resolution=True,
+				skip_python=batch or app not in python_apps,
+				skip_node="node" not in changed[app],
 			)
+			if on_app_done:
+				share = batch_share if app in python_apps else 0
+				on_app_done(app, monotonic() - start + share)
 
-	def python(self, apps=None):
+	def python(self, apps=None, batch=False):
 		"""Install and upgrade Python dependencies for specified / all installed apps on given Snova"""
 		import snova.cli
 
@@ -475,11 +619,27 @@ class SnovaSetup(Base):
 
 		self.pip()
 
+		if batch:
+			return self.python_packages(apps)
+
 		for app in apps:
 			app_path = os.path.join(self.snova.name, "apps", app)
 			log(f"\nInstalling python dependencies for {app}", level=3, no_log=True)
 			self.run(f"{self.snova.python} -m pip install {quiet_flag} --upgrade -e {app_path}")
 
+	@step(title="Installing Python Packages", success="Python Packages Installed")
+	def python_packages(self, apps):
+		"""Installs the Python packages of all `apps` with a single pip run"""
+		import snova.cli
+
+		quiet_flag = "" if snova.cli.verbose else "--quiet"
+		editables = " ".join(
+			f"-e {os.path.realpath(os.path.join(self.snova.name, 'apps', app))}" for app in apps
+		)
+
+		log(f"\nInstalling python dependencies for {', '.join(apps)}", level=3, no_log=True)
+		self.run(f"{self.snova.python} -m pip install {quiet_flag} --upgrade {editables}")
+
 	def node(self, apps=None):
 		"""Install and upgrade Node dependencies for specified / all apps on given Snova"""
 		from snova.utils.snova import update_node_packages
@@ -496,3 +656,13 @@ class SnovaTearDown:
 
 	def dirs(self):
 		shutil.rmtree(self.snova.name)
+		self.ports()
+
+	def ports(self):
+		from snova.utils.ports import release_ports
+
+		try:
+			release_ports(self.snova.name)
+		except OSError:
+			# the registry releases ports of removed snovas by itself
+			pass
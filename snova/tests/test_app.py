@@ -0,0 +1,176 @@
+# imports - standard imports
+import os
+from unittest import mock
+
+# imports - module imports
+from snova.tests.test_base import TestSnovaFolder
+
+
+class TestApp(TestSnovaFolder):
+	def test_pull_apps(self):
+		import snova.app
+		from snova.app import pull_apps
+		from snova.config.common_site_config import put_config
+		from snova.utils import setup_logging
+
+		# as the CLI does, pull_app logs with snova's LOG level
+		setup_logging(self.snova_path)
+		put_config({"pull_concurrency": 2}, self.snova_path)
+		apps = ("sparrow", "shopper")
+		sources = {}
+
+		remotes_path = os.path.join(self.snova_path, "remotes")
+
+		for app in apps:
+			sources[app] = self.make_app(app, os.path.join(remotes_path, "src", app))
+			remote = os.path.join(remotes_path, f"{app}.git")
+			self.git(self.snova_path, "clone", "--bare", sources[app], remote)
+			self.git(self.snova_path, "clone", "-o", "upstream", remote, f"apps/{app}")
+			self.git(sources[app], "remote", "add", "origin", remote)
+
+		def push(app):
+			self.git(sources[app], "commit", "--allow-empty", "-m", "change")
+			self.git(sources[app], "push", "origin", "main")
+			return self.git(sources[app], "rev-parse", "HEAD")
+
+		def get_commit(app):
+			return self.git(os.path.join(self.snova_path, "apps", app), "rev-parse", "HEAD")
+
+		# apps are pulled concurrently and summarised once all are done
+		commits = {app: push(app) for app in apps}
+		with mock.patch.object(
+			snova.app, "print_pull_summary", wraps=snova.app.print_pull_summary
+		) as print_pull_summary:
+			pull_apps(snova_path=self.snova_path)
+		self.assertEqual({app: get_commit(app) for app in apps}, commits)
+		results = print_pull_summary.call_args[0][0]
+		self.assertEqual(sorted(results), sorted(apps))
+		self.assertTrue(all(error is None for error, _ in results.values()))
+
+		# local changes in any app abort the update before any app is pulled
+		push("sparrow")
+		hooks_path = os.path.join(self.snova_path, "apps", "shopper", "shopper", "hooks.py")
+		with open(hooks_path, "w") as f:
+			f.write("app_name = 'shopper'\n")
+		with self.assertRaises(SystemExit):
+			pull_apps(snova_path=self.snova_path)
+		self.assertEqual(get_commit("sparrow"), commits["sparrow"])
+
+	def test_install_order(self):
+		from snova.app import get_install_order
+
+		dependencies = {
+			"healthcare": ["shopper", "payments"],
+			"payments": ["shopper"],
+			"shopper": ["sparrow"],
+			"sparrow": ["healthcare"],
+		}
+		self.assertEqual(
+			get_install_order("healthcare", dependencies),
+			["sparrow", "shopper", "payments", "healthcare"],
+		)
+		self.assertEqual(get_install_order("payments", dependencies)[-1], "payments")
+
+	def test_required_deps_cache(self):
+		import snova.utils.app as app_utils
+
+		cache_dir = os.path.join(self.snova_path, "cache")
+		fetch = mock.Mock(return_value=("required_apps = []", '"etag"'))
+
+		with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": cache_dir}), mock.patch.object(
+			app_utils, "fetch_required_deps", fetch
+		), mock.patch.object(app_utils, "get_remote_commit", return_value="a" * 40):
+			app_utils.clear_deps_cache()
+			for _ in range(2):
+				app_utils.get_required_deps("sparrow", "shopper", "develop")
+				app_utils.get_required_deps.cache_clear()
+			self.assertEqual(fetch.call_count, 1)
+
+			# stale entries are revalidated without fetching if the ref's commit is unchanged
+			with mock.patch.object(app_utils, "DEPS_CACHE_TTL", 0):
+				app_utils.get_required_deps("sparrow", "shopper", "develop")
+			self.assertEqual(fetch.call_count, 1)
+
+			app_utils.clear_deps_cache()
+			app_utils.get_required_deps("sparrow", "shopper", "develop")
+			self.assertEqual(fetch.call_count, 2)
+
+	def test_requirements_fingerprint(self):
+		from snova.snova import Snova
+		from snova.utils.app import get_requirements_fingerprint
+
+		app_path = self.make_app("sparrow")
+		with open(os.path.join(app_path, "sparrow", "__init__.py"), "w") as f:
+			f.write("__version__ = '14.0.0'")
+
+		fingerprint = get_requirements_fingerprint("sparrow", snova_path=self.snova_path)
+		self.assertEqual(
+			get_requirements_fingerprint("sparrow", snova_path=self.snova_path), fingerprint
+		)
+		# dev dependencies are only installed in developer mode
+		dev_fingerprint = get_requirements_fingerprint(
+			"sparrow", snova_path=self.snova_path, developer_mode=True
+		)
+		self.assertNotEqual(dev_fingerprint["python"], fingerprint["python"])
+		self.assertEqual(dev_fingerprint["node"], fingerprint["node"])
+
+		# requirements are reinstalled only if the files they're installed from change
+		apps = Snova(self.snova_path).apps
+		apps.update_apps_states(app_name="sparrow")
+		self.assertEqual(apps.get_changed_requirements("sparrow"), {"python", "node"})
+		apps.update_requirements_fingerprint("sparrow")
+		self.assertEqual(apps.get_changed_requirements("sparrow"), set())
+
+		with open(os.path.join(app_path, "package.json"), "w") as f:
+			f.write("{}")
+		self.assertEqual(apps.get_changed_requirements("sparrow"), {"node"})
+
+	def test_setup_requirements(self):
+		from snova.snova import Base, Snova
+
+		apps = ("sparrow", "shopper")
+		for app in apps:
+			app_path = self.make_app(app)
+			with open(os.path.join(app_path, app, "__init__.py"), "w") as f:
+				f.write("__version__ = '14.0.0'")
+			with open(os.path.join(app_path, "pyproject.toml"), "w") as f:
+				f.write(f"[project]\nname = '{app}'\n")
+
+		snova = Snova(self.snova_path)
+		for app in apps:
+			snova.apps.update_apps_states(app_name=app)
+
+		def get_pip_installs(run):
+			commands = [call.args[0] for call in run.call_args_list]
+			return [cmd for cmd in commands if "-m pip install" in cmd and " -e " in cmd]
+
+		def get_editable(app):
+			return f"-e {os.path.realpath(os.path.join(self.snova_path, 'apps', app))}"
+
+		with mock.patch.object(Base, "run") as run, mock.patch(
+			"snova.app.install_app"
+		) as install_app:
+			# a single pip run installs the Python packages of all apps
+			snova.setup.requirements(batch=True, skip_unchanged=True, node=False)
+			pip_installs = get_pip_installs(run)
+			self.assertEqual(len(pip_installs), 1)
+			for app in apps:
+				self.assertIn(get_editable(app), pip_installs[0])
+			# which App.install doesn't run again
+			calls = install_app.call_args_list
+			skip_python = {call.kwargs["app"]: call.kwargs["skip_python"] for call in calls}
+			self.assertEqual(skip_python, {"sparrow": True, "shopper": True})
+
+			# apps whose requirement files are unchanged are skipped
+			pyproject_path = os.path.join(self.snova_path, "apps", "shopper", "pyproject.toml")
+			with open(pyproject_path, "a") as f:
+				f.write("dependencies = ['requests']\n")
+			run.reset_mock()
+			install_app.reset_mock()
+			snova.setup.requirements(batch=True, skip_unchanged=True, node=False)
+			pip_installs = get_pip_installs(run)
+			self.assertEqual(len(pip_installs), 1)
+			self.assertIn(get_editable("shopper"), pip_installs[0])
+			self.assertNotIn(get_editable("sparrow"), pip_installs[0])
+			installed = [call.kwargs["app"] for call in install_app.call_args_list]
+			self.assertEqual(installed, ["shopper"])
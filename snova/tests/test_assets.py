@@ -0,0 +1,68 @@
+# imports - standard imports
+import json
+import os
+import shutil
+from unittest import mock
+
+# imports - module imports
+import snova.utils.assets as assets
+from snova.tests.test_base import TestSnovaFolder
+
+
+class TestAssets(TestSnovaFolder):
+	def test_asset_cache(self):
+		snova_dir = self.snova_path
+		assets_dir = os.path.join(snova_dir, "sites", "assets")
+		apps = ("sparrow", "shopper")
+
+		for app in apps:
+			os.makedirs(os.path.join(snova_dir, "apps", app, app, "public", "js"))
+			for app_file in ("__init__.py", "hooks.py", "modules.txt", "patches.txt"):
+				with open(os.path.join(snova_dir, "apps", app, app, app_file), "w") as f:
+					f.write("__version__ = '14.0.0'")
+			with open(os.path.join(snova_dir, "apps", app, app, "public", "js", "app.js"), "w") as f:
+				f.write(f"console.log('{app}')")
+		os.makedirs(assets_dir)
+
+		def build(*args, snova_path="."):
+			for app in apps:
+				if not os.path.exists(os.path.join(assets_dir, app)):
+					os.symlink(
+						os.path.join(snova_dir, "apps", app, app, "public"), os.path.join(assets_dir, app)
+					)
+				os.makedirs(assets.get_dist_path(app, snova_dir), exist_ok=True)
+				with open(os.path.join(assets.get_dist_path(app, snova_dir), f"{app}.js"), "w") as f:
+					f.write("built")
+			with open(os.path.join(assets_dir, "assets.json"), "w") as f:
+				json.dump({f"{app}.js": f"/assets/{app}/dist/{app}.js" for app in apps}, f)
+
+		with mock.patch.dict(
+			os.environ, {"XDG_CACHE_HOME": os.path.join(snova_dir, "cache")}
+		), mock.patch.object(assets, "run_sparrow_cmd", side_effect=build) as build_cmd:
+			report = assets.build_with_asset_cache(snova_dir)
+			self.assertEqual(report, {"sparrow": "miss", "shopper": "miss"})
+
+			shutil.rmtree(assets_dir)
+			report = assets.build_with_asset_cache(snova_dir)
+			self.assertEqual(report, {"sparrow": "hit", "shopper": "hit"})
+			self.assertEqual(build_cmd.call_count, 1)
+			self.assertTrue(os.path.exists(os.path.join(assets_dir, "shopper", "dist", "shopper.js")))
+			with open(os.path.join(assets_dir, "assets.json")) as f:
+				self.assertIn("shopper.js", json.load(f))
+
+			# changes to the asset sources of an app only rebuild that app
+			shopper_js = os.path.join(snova_dir, "apps", "shopper", "shopper", "public", "js")
+			with open(os.path.join(shopper_js, "app.js"), "a") as f:
+				f.write(";")
+			report = assets.build_with_asset_cache(snova_dir)
+			self.assertEqual(report, {"sparrow": "hit", "shopper": "miss"})
+			build_cmd.assert_called_with("build", "--apps", "shopper", snova_path=snova_dir)
+
+			# while other apps' bundles import Sparrow's public sources
+			sparrow_js = os.path.join(snova_dir, "apps", "sparrow", "sparrow", "public", "js")
+			with open(os.path.join(sparrow_js, "app.js"), "a") as f:
+				f.write(";")
+			report = assets.build_with_asset_cache(snova_dir)
+			self.assertEqual(report, {"sparrow": "miss", "shopper": "miss"})
+
+			assets.print_asset_cache_report({})
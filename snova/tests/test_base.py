@@ -5,11 +5,12 @@ import os
 import shutil
 import subprocess
 import sys
+import tempfile
 import traceback
 import unittest
 
 # imports - module imports
-from snova.utils import paths_in_snova, exec_cmd
+from snova.utils import paths_in_app, paths_in_snova, exec_cmd
 from snova.utils.system import init
 from snova.snova import Snova
 
@@ -132,3 +133,39 @@ class TestSnovaBase(unittest.TestCase):
 		exc_type, exc_value, exc_tb = sys.exc_info()
 		trace_list = traceback.format_exception(exc_type, exc_value, exc_tb)
 		return "".join(str(t) for t in trace_list)
+
+
+class TestSnovaFolder(unittest.TestCase):
+	"""Runs each test against a throwaway folder laid out like a snova, with empty
+	config/ and sites/ folders, at `self.snova_path`"""
+
+	def setUp(self):
+		self.snova_path = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.snova_path)
+		for folder in ("config", "sites"):
+			os.makedirs(os.path.join(self.snova_path, folder))
+
+	def git(self, cwd, *args) -> str:
+		"""Runs git in `cwd` as a throwaway committer, returns its output"""
+		env = dict(
+			os.environ,
+			GIT_AUTHOR_NAME="snova",
+			GIT_AUTHOR_EMAIL="snova@localhost",
+			GIT_COMMITTER_NAME="snova",
+			GIT_COMMITTER_EMAIL="snova@localhost",
+		)
+		return subprocess.check_output(
+			["git", *args], cwd=cwd, env=env, stderr=subprocess.STDOUT, encoding="utf-8"
+		).strip()
+
+	def make_app(self, app, path=None) -> str:
+		"""Creates a git repository at `path` (apps/`app` by default) that snova
+		recognises as a Sparrow app, with one commit on `main`. Returns its path"""
+		path = path or os.path.join(self.snova_path, "apps", app)
+		os.makedirs(os.path.join(path, app))
+		for filename in paths_in_app:
+			open(os.path.join(path, app, filename), "w").close()
+		self.git(path, "init", "-b", "main")
+		self.git(path, "add", "-A")
+		self.git(path, "commit", "-m", "init")
+		return path
@@ -0,0 +1,202 @@
+# imports - standard imports
+import json
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+# imports - module imports
+import snova
+from snova.manifest import write_manifest
+from snova.utils import paths_in_snova
+
+# modules that are only required by snova's own commands
+HEAVY_MODULES = (
+	"git",
+	"jinja2",
+	"requests",
+	"snova.app",
+	"snova.snova",
+	"snova.commands.make",
+	"snova.commands.setup",
+	"snova.commands.update",
+	"snova.commands.utils",
+)
+
+LIST_MODULES = """
+import json, sys
+
+def list_modules(*args):
+	print(json.dumps(sorted(sys.modules)))
+	sys.stdout.flush()
+	os._exit(0)
+"""
+
+INVOKE_DISPATCH = """
+import os
+import snova.dispatch
+
+os.getuid = lambda: 1000
+os.execv = list_modules
+
+sys.argv = ["snova"] + sys.argv[1:]
+snova.dispatch.main()
+"""
+
+INVOKE_CLI = """
+import atexit, os
+import snova.cli
+
+# tests may run as root in containers
+snova.cli.is_root = lambda: False
+os.execv = list_modules
+atexit.register(list_modules)
+
+sys.argv = ["snova"] + sys.argv[1:]
+snova.cli.cli()
+"""
+
+
+class TestSnovaCLI(unittest.TestCase):
+	def setUp(self):
+		self.snova_path = os.path.abspath("./sandbox-cli")
+
+		for folder in paths_in_snova:
+			os.makedirs(os.path.join(self.snova_path, folder), exist_ok=True)
+
+		os.makedirs(os.path.join(self.snova_path, "env", "bin"), exist_ok=True)
+		python = os.path.join(self.snova_path, "env", "bin", "python")
+		if not os.path.exists(python):
+			os.symlink(sys.executable, python)
+
+		write_manifest(
+			["migrate", "worker", "update"],
+			snova_path=self.snova_path,
+			snova_commands=["init", "update"],
+		)
+
+	def tearDown(self):
+		shutil.rmtree(self.snova_path)
+
+	def get_imported_modules(self, *args, entry_point=INVOKE_CLI):
+		out = subprocess.check_output(
+			[sys.executable, "-c", LIST_MODULES + entry_point, *args],
+			cwd=self.snova_path,
+			env=dict(
+				os.environ,
+				SNOVA_DEVELOPER="1",
+				PYTHONPATH=os.path.dirname(snova.__path__[0]),
+			),
+		)
+		return json.loads(out.decode().strip().splitlines()[-1])
+
+	def assert_not_imported(self, modules):
+		for module in HEAVY_MODULES:
+			self.assertNotIn(module, modules)
+
+	def test_version(self):
+		self.assert_not_imported(self.get_imported_modules("--version"))
+
+	def test_forwarded_sparrow_command(self):
+		self.assert_not_imported(self.get_imported_modules("--site", "all", "migrate"))
+
+	def test_lazy_commands(self):
+		from snova.commands import snova_command
+
+		for name in snova_command.list_commands(None):
+			command = snova_command.get_command(None, name)
+			self.assertIsNotNone(command)
+			names = command.name if isinstance(command.name, list) else [command.name]
+			self.assertIn(name, names)
+
+	def test_dispatch_forwards_without_cli(self):
+		modules = self.get_imported_modules("worker", entry_point=INVOKE_DISPATCH)
+		self.assertNotIn("click", modules)
+		self.assertNotIn("snova.cli", modules)
+
+	def test_dispatch_command(self):
+		from snova.dispatch import get_command, get_forwarding_snova_path
+
+		self.assertEqual(get_command(["--site", "all", "migrate"], self.snova_path), "migrate")
+		self.assertEqual(get_command(["--verbose", "worker"], self.snova_path), "worker")
+		self.assertIsNone(get_command(["--site", "all"], self.snova_path))
+
+		cwd, argv = os.getcwd(), sys.argv
+		try:
+			os.chdir(self.snova_path)
+			with mock.patch("os.getuid", return_value=1000):
+				sys.argv = ["snova", "migrate"]
+				self.assertEqual(get_forwarding_snova_path(), self.snova_path)
+
+				# snova's own commands are never forwarded
+				sys.argv = ["snova", "update"]
+				self.assertIsNone(get_forwarding_snova_path())
+		finally:
+			os.chdir(cwd)
+			sys.argv = argv
+
+	def test_helper_daemon(self):
+		import socket
+
+		from snova.helper_daemon import (
+			get_helper_daemon_output,
+			get_socket_path,
+			start_helper_daemon,
+			stop_helper_daemon,
+		)
+
+		# a stand-in for sparrow.utils.snova_helper that echoes its arguments
+		helper_path = os.path.join(self.snova_path, "lib", "sparrow", "utils")
+		os.makedirs(helper_path)
+		for init_path in ("..", "."):
+			open(os.path.join(helper_path, init_path, "__init__.py"), "w").close()
+		with open(os.path.join(helper_path, "snova_helper.py"), "w") as f:
+			f.write(
+					"import sys\n"
+					"if __name__ == '__main__':\n"
+					"	print(' '.join(sys.argv[1:]))\n"
+					"	sys.exit(len(sys.argv) - 1)\n"
+				)
+
+		env = dict(os.environ)
+		os.environ["PYTHONPATH"] = os.pathsep.join(
+			[os.path.dirname(snova.__path__[0]), os.path.join(self.snova_path, "lib")]
+		)
+
+		try:
+			self.assertIsNone(get_helper_daemon_output(["migrate"], snova_path=self.snova_path))
+			self.assertTrue(start_helper_daemon(snova_path=self.snova_path))
+			socket_path = get_socket_path(self.snova_path)
+			self.assertEqual(os.stat(socket_path).st_mode & 0o077, 0)
+
+			# a client that never sends its request is dropped
+			with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle_client:
+				idle_client.connect(socket_path)
+				self.assertEqual(
+					get_helper_daemon_output(["sparrow", "migrate"], snova_path=self.snova_path),
+					(2, "sparrow migrate\n"),
+				)
+		finally:
+			os.environ.clear()
+			os.environ.update(env)
+			stop_helper_daemon(snova_path=self.snova_path)
+
+	def test_helper_daemon_routing(self):
+		from snova.utils import get_cmd_from_sysargv, run_sparrow_cmd
+
+		self.assertEqual(get_cmd_from_sysargv(["--site", "a.com", "migrate"]), "migrate")
+
+		with mock.patch("snova.cli.from_command_line", True), mock.patch(
+			"snova.helper_daemon.run_via_helper_daemon", return_value=0
+		) as run_via_helper_daemon, mock.patch("subprocess.Popen") as popen:
+			popen.return_value.wait.return_value = 0
+			run_sparrow_cmd("--site", "a.com", "migrate", snova_path=self.snova_path)
+			# commands that aren't routed to the daemon, as in the CLI, are spawned
+			run_sparrow_cmd("--site", "a.com", "install-app", "shop", snova_path=self.snova_path)
+
+		run_via_helper_daemon.assert_called_once_with(
+			("sparrow", "--site", "a.com", "migrate"), snova_path=self.snova_path
+		)
+		self.assertEqual(popen.call_count, 1)
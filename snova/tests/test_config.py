@@ -0,0 +1,117 @@
+# imports - standard imports
+import json
+import os
+import shutil
+from unittest import mock
+
+# imports - module imports
+from snova.tests.test_base import TestSnovaFolder
+
+
+class TestConfig(TestSnovaFolder):
+	def test_config_store(self):
+		from snova.config.store import ConfigStore
+
+		folder = os.path.join(self.snova_path, "config")
+		path = os.path.join(folder, "site_config.json")
+		store = ConfigStore()
+
+		self.assertEqual(store.read(path), {})
+
+		with open(path, "w") as f:
+			json.dump({"db_name": "_abc"}, f)
+		os.chmod(path, 0o600)
+
+		config = store.read(path)
+		config["db_name"] = "modified by the caller"
+		self.assertEqual(store.read(path), {"db_name": "_abc"})
+		self.assertEqual(store.get_stats(), {"hits": 1, "misses": 2, "writes": 0})
+
+		# changes made by other processes are picked up
+		with open(path, "w") as f:
+			json.dump({"db_name": "_xyz", "encryption_key": "k"}, f)
+		self.assertEqual(store.read(path)["db_name"], "_xyz")
+
+		with store.batch():
+			store.update(path, {"maintenance_mode": 1})
+			with store.batch():
+				store.update(path, {"pause_scheduler": 1})
+			self.assertEqual(store.get_stats()["writes"], 0)
+			self.assertEqual(store.read(path)["pause_scheduler"], 1)
+
+		with open(path) as f:
+			self.assertEqual(
+				json.load(f),
+				{"db_name": "_xyz", "encryption_key": "k", "maintenance_mode": 1, "pause_scheduler": 1},
+			)
+		self.assertEqual(store.get_stats()["writes"], 1)
+		self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+		self.assertEqual(os.listdir(folder), ["site_config.json"])
+
+		with self.assertRaises(ValueError), store.batch():
+			store.update(path, {"maintenance_mode": 0})
+			raise ValueError
+		self.assertEqual(store.read(path)["maintenance_mode"], 1)
+
+	def test_site_index(self):
+		import time
+
+		from snova.config.store import config_store
+		from snova.utils.site_index import SiteIndex
+
+		snova_path = self.snova_path
+		sites_path = os.path.join(snova_path, "sites")
+		os.makedirs(os.path.join(sites_path, "assets"))
+		past = time.time() - 60
+
+		def write_site_config(site, config):
+			os.makedirs(os.path.join(sites_path, site), exist_ok=True)
+			path = os.path.join(sites_path, site, "site_config.json")
+			with open(path, "w") as f:
+				f.write(config if isinstance(config, str) else json.dumps(config))
+			# files modified within the same mtime tick can't be told apart
+			os.utime(path, (past, past))
+			os.utime(sites_path, (past, past))
+
+		write_site_config("a.com", {"db_name": "a", "nginx_port": 8001})
+		write_site_config("b.com", {"db_name": "b", "domains": ["b.org"]})
+
+		index = SiteIndex(snova_path)
+		self.assertEqual(sorted(index.sites), ["a.com", "b.com"])
+		self.assertEqual(sorted(index.changed), ["a.com", "b.com"])
+		self.assertEqual(index.get_config("a.com"), {"nginx_port": 8001})
+
+		# unchanged sites are served from the index
+		misses = config_store.misses
+		index = SiteIndex(snova_path)
+		self.assertEqual((index.changed, index.removed), ([], []))
+		self.assertEqual(config_store.misses, misses)
+
+		# a folder that becomes a site later, without sites/ changing
+		os.makedirs(os.path.join(sites_path, "c.com"))
+		os.utime(sites_path, (past, past))
+		self.assertNotIn("c.com", SiteIndex(snova_path).sites)
+		write_site_config("c.com", {"db_name": "c"})
+		write_site_config("b.com", "{broken")
+		shutil.rmtree(os.path.join(sites_path, "a.com"))
+		os.utime(sites_path, (past + 1, past + 1))
+
+		index = SiteIndex(snova_path)
+		self.assertEqual(sorted(index.sites), ["b.com", "c.com"])
+		self.assertEqual(sorted(index.changed), ["b.com", "c.com"])
+		self.assertEqual(index.removed, ["a.com"])
+		self.assertRaises(ValueError, index.get_config, "b.com")
+
+		# an index belonging to another user is read but left as is
+		index_path = os.path.join(snova_path, "config", "site_index.json")
+		os.remove(index_path)
+		with mock.patch("snova.utils.site_index.is_owned", return_value=False):
+			self.assertEqual(sorted(SiteIndex(snova_path).sites), ["b.com", "c.com"])
+		self.assertFalse(os.path.exists(index_path))
+
+		# a site_config.json the user can't read is an error of its site, not a crash
+		write_site_config("c.com", {"db_name": "c", "nginx_port": 8002})
+		with mock.patch.object(config_store, "read", side_effect=PermissionError("denied")):
+			index = SiteIndex(snova_path)
+		self.assertEqual(sorted(index.sites), ["b.com", "c.com"])
+		self.assertRaises(ValueError, index.get_config, "c.com")
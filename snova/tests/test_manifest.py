@@ -0,0 +1,25 @@
+# imports - standard imports
+import os
+
+# imports - module imports
+from snova.manifest import get_head_commit, read_manifest, write_manifest
+from snova.tests.test_base import TestSnovaFolder
+
+
+class TestManifest(TestSnovaFolder):
+	def test_sparrow_commands_manifest(self):
+		app_path = self.make_app("sparrow")
+		with open(os.path.join(self.snova_path, "sites", "apps.txt"), "w") as f:
+			f.write("sparrow")
+
+		self.assertEqual(get_head_commit(app_path), self.git(app_path, "rev-parse", "HEAD"))
+
+		self.assertIsNone(read_manifest(self.snova_path))
+		write_manifest(["migrate", "backup"], snova_path=self.snova_path)
+		self.assertEqual(
+			read_manifest(self.snova_path)["sparrow_commands"], ["backup", "migrate"]
+		)
+
+		# a new commit in any installed app invalidates the manifest
+		self.git(app_path, "commit", "--allow-empty", "-m", "update")
+		self.assertIsNone(read_manifest(self.snova_path))
@@ -0,0 +1,91 @@
+# imports - standard imports
+import os
+import shutil
+
+# imports - module imports
+from snova.tests.test_base import TestSnovaFolder
+
+
+class TestNginx(TestSnovaFolder):
+	def test_split_nginx_conf(self):
+		from snova.config.common_site_config import put_config
+		from snova.config.nginx import get_server_blocks, make_nginx_conf
+		from snova.config.site_config import update_site_config
+
+		snova_path = self.snova_path
+		put_config({"nginx_split_config": 1, "webserver_port": 8000}, snova_path)
+		for site in ("a.com", "b.com"):
+			os.makedirs(os.path.join(snova_path, "sites", site))
+			update_site_config(site, {"db_name": site}, snova_path=snova_path)
+
+		def generate():
+			result = make_nginx_conf(snova_path, yes=True)
+			return sorted(
+				os.path.relpath(path, os.path.join(snova_path, "config"))
+				for path in result["written"] + result["removed"]
+			)
+
+		self.assertEqual(generate(), ["nginx.conf", "nginx/a.com.conf", "nginx/b.com.conf"])
+		with open(os.path.join(snova_path, "config", "nginx.conf")) as f:
+			self.assertIn(f"include {snova_path}/config/nginx/*.conf;", f.read())
+		with open(os.path.join(snova_path, "config", "nginx", "a.com.conf")) as f:
+			self.assertIn("server_name\n\t\ta.com", f.read())
+
+		self.assertEqual(generate(), [])
+
+		update_site_config("b.com", {"nginx_port": 8080}, snova_path=snova_path)
+		self.assertEqual(generate(), ["nginx/b.com.conf"])
+
+		shutil.rmtree(os.path.join(snova_path, "sites", "a.com"))
+		self.assertEqual(generate(), ["nginx/a.com.conf"])
+		self.assertFalse(os.path.exists(os.path.join(snova_path, "config", "nginx", "a.com.conf")))
+
+		# server blocks for the same hostname are kept in separate files
+		ssl = {"ssl_certificate": "a.crt", "ssl_certificate_key": "a.key"}
+		sites = {"that_use_ssl": [dict(ssl, name="a.com"), dict(ssl, name="b.com", domain="a.com")]}
+		self.assertEqual(
+			sorted(get_server_blocks(sites, "snova", "sites", "$host")),
+			["a.com-1.conf", "a.com.conf"],
+		)
+
+	def test_nginx_map_routing(self):
+		from snova.config.common_site_config import put_config
+		from snova.config.nginx import get_hash_sizes, prepare_sites
+		from snova.config.site_config import update_site_config
+
+		snova_path = self.snova_path
+		config = {"dns_multitenant": 1, "nginx_map_routing": 1}
+		put_config(config, snova_path)
+
+		shared = {"ssl_certificate": "shared.crt", "ssl_certificate_key": "shared.key"}
+		domains = {
+			"a.com": [dict(shared, domain="a.org"), "a.net"],
+			"b.com": [dict(shared, domain="b.org")],
+			"c.com": [
+				{"domain": "c.org", "ssl_certificate": "c.crt", "ssl_certificate_key": "c.key"}
+			],
+		}
+		for site, site_domains in domains.items():
+			os.makedirs(os.path.join(snova_path, "sites", site))
+			update_site_config(site, {"domains": site_domains}, snova_path=snova_path)
+
+		sites = prepare_sites(config, snova_path)
+
+		# hostnames that are their site's name are routed by the map's default
+		self.assertEqual(
+			sites["domain_map"],
+			{"a.org": "a.com", "a.net": "a.com", "b.org": "b.com", "c.org": "c.com"},
+		)
+		self.assertNotIn("hash_sizes", sites)
+		# a server block per certificate
+		certificates = sorted(
+			(site["ssl_certificate"], sorted(site["server_names"]))
+			for site in sites["that_use_ssl"]
+		)
+		self.assertEqual(certificates, [("c.crt", ["c.org"]), ("shared.crt", ["a.org", "b.org"])])
+
+		# nginx's defaults fit a few hundred short hostnames
+		self.assertEqual(get_hash_sizes(["a.com"] * 200), {})
+		hash_sizes = get_hash_sizes([f"{i}.example.com" for i in range(3000)] + ["a" * 100])
+		self.assertEqual(hash_sizes["map_hash_bucket_size"], 128)
+		self.assertEqual(hash_sizes["server_names_hash_max_size"], 8192)
@@ -0,0 +1,68 @@
+# imports - standard imports
+import os
+import shutil
+import socket
+from unittest import mock
+
+# imports - module imports
+from snova.tests.test_base import TestSnovaFolder
+
+
+class TestPorts(TestSnovaFolder):
+	def test_port_registry(self):
+		from snova.config.common_site_config import make_ports, put_config
+		from snova.exceptions import ValidationError
+		from snova.utils.ports import allocate_ports, is_port_free, release_ports
+
+		folder = self.snova_path
+		snovas_path = os.path.join(folder, "snovas")
+
+		# snovas created before the registry are found by scanning their configs
+		os.makedirs(os.path.join(snovas_path, "old-snova", "sites"))
+		put_config(
+			{"webserver_port": 8000, "redis_cache": "redis://127.0.0.1:13000"},
+			os.path.join(snovas_path, "old-snova"),
+		)
+
+		with mock.patch.dict(os.environ, {"XDG_DATA_HOME": os.path.join(folder, "data")}):
+			ports = make_ports(os.path.join(snovas_path, "snova-1"))
+			self.assertEqual(ports["webserver_port"], 8001)
+			self.assertEqual(ports["redis_socketio"], ports["redis_cache"])
+
+			os.makedirs(os.path.join(snovas_path, "snova-1"))
+			default_ports = {"webserver_port": 8000}
+			snova_2 = os.path.join(snovas_path, "snova-2")
+			os.makedirs(snova_2)
+			for _ in range(2):
+				# allocating again returns the snova's ports
+				ports = allocate_ports(snova_2, default_ports, check_free=False)
+				self.assertEqual(ports, {"webserver_port": 8002})
+
+			# ports of dropped and removed snovas are reused
+			release_ports(snova_2)
+			shutil.rmtree(os.path.join(snovas_path, "old-snova"))
+			snova_3 = os.path.join(snovas_path, "snova-3")
+			ports = allocate_ports(snova_3, default_ports, check_free=False)
+			self.assertEqual(ports, {"webserver_port": 8000})
+
+			# ports in use on the machine are skipped
+			with socket.socket() as sock:
+				sock.bind(("127.0.0.1", 0))
+				sock.listen()
+				port = sock.getsockname()[1]
+				self.assertFalse(is_port_free(port))
+				ports = allocate_ports(snova_2, {"webserver_port": port})
+				self.assertNotEqual(ports["webserver_port"], port)
+
+			# rather than handing out a taken port
+			with mock.patch("snova.utils.ports.MAX_PORT_PROBES", 1), self.assertRaises(
+				ValidationError
+			):
+				allocate_ports(os.path.join(snovas_path, "snova-4"), {"webserver_port": 8001})
+
+			# the fallback keeps redis_socketio on redis_cache's port too
+			with mock.patch(
+				"snova.utils.ports.locked_registry", side_effect=PermissionError
+			):
+				ports = make_ports(os.path.join(snovas_path, "snova-5"))
+			self.assertEqual(ports["redis_socketio"], ports["redis_cache"])
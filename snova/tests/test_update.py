@@ -0,0 +1,470 @@
+# imports - standard imports
+import json
+import os
+import shutil
+import subprocess
+
+# imports - module imports
+from snova.tests.test_base import TestSnovaFolder
+
+
+class TestUpdate(TestSnovaFolder):
+	def test_prefetch_state(self):
+		import io
+		import tarfile
+		import time
+
+		from snova.utils.prefetch import (
+			clear_prefetched_apps,
+			extract_tree,
+			get_prefetched_commits,
+			read_prefetch_state,
+			write_prefetch_state,
+		)
+
+		snova_path = self.snova_path
+
+		state = {
+			"sparrow": {"commit": "abc", "fetched_at": time.time()},
+			"shopper": {"commit": "def", "fetched_at": time.time() - 2 * 24 * 60 * 60},
+		}
+		write_prefetch_state(state, snova_path)
+		self.assertEqual(read_prefetch_state(snova_path), state)
+
+		# stale and missing apps are pulled from their remotes
+		self.assertEqual(get_prefetched_commits(snova_path), {})
+
+		clear_prefetched_apps(["sparrow"], snova_path)
+		self.assertEqual(list(read_prefetch_state(snova_path)), ["shopper"])
+
+		archive_path = os.path.join(snova_path, "tree.tar")
+		with tarfile.open(archive_path, "w") as archive:
+			archive.addfile(tarfile.TarInfo("../escaped.txt"), io.BytesIO())
+		with tarfile.open(archive_path) as archive, self.assertRaises(tarfile.TarError):
+			extract_tree(archive, os.path.join(snova_path, "tree"))
+		self.assertFalse(os.path.exists(os.path.join(snova_path, "escaped.txt")))
+
+	def test_snapshots(self):
+		from snova.exceptions import ValidationError
+		from snova.utils.snapshot import (
+			SNAPSHOT_FILE,
+			get_snapshot_path,
+			get_snapshots,
+			link_tree,
+			prune_snapshots,
+			restore_snapshot,
+		)
+
+		snova_path = self.snova_path
+
+		env_path = os.path.join(snova_path, "env")
+		os.makedirs(os.path.join(env_path, "lib"))
+		with open(os.path.join(env_path, "lib", "module.py"), "w") as f:
+			f.write("v1")
+		os.symlink("lib", os.path.join(env_path, "lib64"))
+
+		link_tree(env_path, os.path.join(snova_path, "env-copy"))
+		copied_module = os.path.join(snova_path, "env-copy", "lib", "module.py")
+		self.assertTrue(os.path.samefile(copied_module, os.path.join(env_path, "lib", "module.py")))
+		self.assertEqual(os.readlink(os.path.join(snova_path, "env-copy", "lib64")), "lib")
+
+		# pip replaces files rather than writing to them, leaving the snapshot intact
+		os.remove(os.path.join(env_path, "lib", "module.py"))
+		with open(os.path.join(env_path, "lib", "module.py"), "w") as f:
+			f.write("v2")
+		with open(copied_module) as f:
+			self.assertEqual(f.read(), "v1")
+
+		self.assertRaises(ValidationError, get_snapshot_path, snova_path)
+
+		for name in ("20260101_000000", "20260102_000000", "20260103_000000"):
+			os.makedirs(os.path.join(snova_path, "snapshots", name))
+			open(os.path.join(snova_path, "snapshots", name, SNAPSHOT_FILE), "w").close()
+		# snapshots being taken aren't listed
+		os.makedirs(os.path.join(snova_path, "snapshots", "20260104_000000.tmp"))
+
+		self.assertTrue(get_snapshot_path(snova_path).endswith("20260103_000000"))
+		prune_snapshots(snova_path, keep=2)
+		self.assertEqual(get_snapshots(snova_path), ["20260102_000000", "20260103_000000"])
+		self.assertRaises(ValidationError, get_snapshot_path, snova_path, "20260101_000000")
+
+		# restoring keeps the snapshot, so that a failed rollback can be retried
+		snapshot_path = get_snapshot_path(snova_path)
+		link_tree(os.path.join(snova_path, "env-copy"), os.path.join(snapshot_path, "env"))
+		with open(os.path.join(snapshot_path, SNAPSHOT_FILE), "w") as f:
+			json.dump({"apps": {}, "env": "env"}, f)
+
+		for _ in range(2):
+			restore_snapshot(snova_path)
+			with open(os.path.join(env_path, "lib", "module.py")) as f:
+				self.assertEqual(f.read(), "v1")
+		self.assertTrue(os.path.exists(os.path.join(snapshot_path, "env", "lib", "module.py")))
+
+	def test_snapshot_detached_app(self):
+		from snova.utils.snapshot import SNAPSHOT_FILE, restore_snapshot, take_snapshot
+
+		app_dir = self.make_app("sparrow")
+		self.git(app_dir, "commit", "--allow-empty", "-m", "v2")
+		# eg: an app installed from a tag
+		self.git(app_dir, "checkout", "--detach", "HEAD~1")
+		commit = self.git(app_dir, "rev-parse", "HEAD")
+
+		snapshot_path = take_snapshot(self.snova_path)
+		with open(os.path.join(snapshot_path, SNAPSHOT_FILE)) as f:
+			self.assertEqual(json.load(f)["apps"]["sparrow"], {"commit": commit, "branch": None})
+
+		self.git(app_dir, "checkout", "main")
+		restore_snapshot(self.snova_path)
+		self.assertEqual(self.git(app_dir, "rev-parse", "HEAD"), commit)
+		self.assertRaises(
+			subprocess.CalledProcessError, self.git, app_dir, "symbolic-ref", "-q", "HEAD"
+		)
+
+	def test_switch_branch(self):
+		from snova.utils.app import switch_branch
+
+		snova_path = self.snova_path
+		git = self.git
+
+		for app in ("sparrow", "shopper"):
+			remote = os.path.join(snova_path, "remotes", app)
+			os.makedirs(os.path.join(remote, app))
+			git(remote, "init", "-b", "version-14")
+			for version in ("14", "15"):
+				with open(os.path.join(remote, app, "__init__.py"), "w") as f:
+					f.write(f"__version__ = '{version}.0.0'\n")
+				git(remote, "add", "-A")
+				git(remote, "commit", "-m", f"v{version}")
+				if version == "14":
+					git(remote, "checkout", "-b", "version-15")
+			git(remote, "checkout", "version-14")
+			git(snova_path, "clone", "-o", "upstream", remote, os.path.join("apps", app))
+
+		def get_branches():
+			return [
+				subprocess.check_output(
+					["git", "rev-parse", "--abbrev-ref", "HEAD"],
+					cwd=os.path.join(snova_path, "apps", app),
+					encoding="utf-8",
+				).strip()
+				for app in ("sparrow", "shopper")
+			]
+
+		# upgrades are detected from the fetched branches, before any app is switched
+		with self.assertRaises(SystemExit):
+			switch_branch("version-15", snova_path=snova_path)
+		self.assertEqual(get_branches(), ["version-14", "version-14"])
+
+		# no app is switched if any fails to be fetched
+		shopper_path = os.path.join(snova_path, "apps", "shopper")
+		git(shopper_path, "remote", "set-url", "upstream", "/nonexistent")
+		with self.assertRaises(SystemExit):
+			switch_branch("version-15", snova_path=snova_path, check_upgrade=False)
+		self.assertEqual(get_branches(), ["version-14", "version-14"])
+
+		switch_branch(
+			"version-15", snova_path=snova_path, check_upgrade=False, continue_on_error=True
+		)
+		self.assertEqual(get_branches(), ["version-15", "version-14"])
+
+	def test_patch_sites_concurrently(self):
+		import threading
+		import time
+		from unittest import mock
+
+		from snova.config.common_site_config import put_config
+		from snova.config.site_config import update_site_config
+		from snova.exceptions import CommandFailedError, PatchError
+		from snova.snova import Snova
+		from snova.utils.snova import patch_sites_concurrently
+
+		put_config({"migrate_concurrency_per_db_host": 2}, self.snova_path)
+		sites = [f"{host}{i}.com" for host in ("db1", "db2") for i in range(4)]
+		for site in sites:
+			os.makedirs(os.path.join(self.snova_path, "sites", site))
+			update_site_config(site, {"db_host": site[:3]}, snova_path=self.snova_path)
+
+		lock = threading.Lock()
+		running, most_running, durations = {}, {}, {}
+
+		def migrate_site(site, snova_path=".", **kwargs):
+			db_host = site[:3]
+			with lock:
+				running[db_host] = running.get(db_host, 0) + 1
+				most_running[db_host] = max(most_running.get(db_host, 0), running[db_host])
+			time.sleep(0.05)
+			with lock:
+				running[db_host] -= 1
+			if site == "db10.com":
+				raise CommandFailedError(f"bench --site {site} migrate")
+
+		with mock.patch("snova.utils.system.migrate_site", side_effect=migrate_site):
+			with self.assertRaises(PatchError) as context:
+				patch_sites_concurrently(
+					Snova(self.snova_path),
+					sites=sites,
+					on_site_done=lambda site, duration: durations.update({site: duration}),
+				)
+
+		# sites are migrated per database server, up to the per host limit
+		self.assertEqual(most_running, {"db1": 2, "db2": 2})
+		# the failed site doesn't stop the others and is reported once all are done
+		self.assertEqual(sorted(durations), [site for site in sites if site != "db10.com"])
+		self.assertIn("db10.com", str(context.exception))
+		self.assertNotIn("db11.com", str(context.exception))
+
+	def test_stage_scheduler(self):
+		import threading
+
+		from snova.utils.scheduler import Stage, StageScheduler
+
+		order = []
+		pulled = threading.Event()
+
+		def backup():
+			# runs alongside pull
+			self.assertTrue(pulled.wait(timeout=5))
+			order.append("backup")
+
+		def pull():
+			pulled.set()
+			order.append("pull")
+
+		def fail():
+			raise ValueError("requirements failed")
+
+		stages = [
+			Stage("backup", backup),
+			Stage("pull", pull),
+			Stage("patch", lambda: order.append("patch"), requires=["backup", "pull", "missing"]),
+		]
+		StageScheduler(stages).run()
+		self.assertEqual(order, ["pull", "backup", "patch"])
+
+		order.clear()
+		scheduler = StageScheduler(
+			[
+				Stage("pull", lambda: order.append("pull")),
+				Stage("requirements", fail, requires=["pull"]),
+				Stage("patch", lambda: order.append("patch"), requires=["requirements"]),
+			],
+			serial=True,
+		)
+		with self.assertRaises(ValueError):
+			scheduler.run()
+		self.assertEqual(order, ["pull"])
+		self.assertEqual(scheduler.stages["patch"].status, "pending")
+
+		with self.assertRaises(ValueError):
+			StageScheduler(
+				[Stage("a", print, requires=["b"]), Stage("b", print, requires=["a"])]
+			).run()
+
+	def test_run_concurrently(self):
+		import threading
+		import time
+
+		from snova.utils.scheduler import run_concurrently
+
+		lock = threading.Lock()
+		running, peaks = {}, {}
+
+		def backup(site):
+			host = site.split(".")[0]
+			with lock:
+				running[host] = running.get(host, 0) + 1
+				peaks[host] = max(peaks.get(host, 0), running[host])
+			time.sleep(0.05)
+			with lock:
+				running[host] -= 1
+			if site == "db1.c":
+				raise ValueError(site)
+
+		sites = ["db1.a", "db1.b", "db1.c", "db2.a", "db2.b"]
+		results = run_concurrently(
+			backup, sites, max_workers=4, key=lambda site: site.split(".")[0], max_per_key=2
+		)
+
+		self.assertEqual(list(results), sites)
+		self.assertEqual(peaks, {"db1": 2, "db2": 2})
+		self.assertIsInstance(results["db1.c"][0], ValueError)
+		self.assertIsNone(results["db2.b"][0])
+
+	def test_env_swap(self):
+		import time
+
+		from snova.utils.env import get_current_env, prune_envs, rollback_env, swap_env
+
+		snova_path = self.snova_path
+
+		def make_env(path):
+			os.makedirs(os.path.join(path, "bin"))
+			open(os.path.join(path, "bin", "python"), "w").close()
+			return path
+
+		initial_env = make_env(os.path.join(snova_path, "env"))
+		envs = []
+		for name in ("env-1", "env-2"):
+			time.sleep(0.01)
+			envs.append(make_env(os.path.join(snova_path, "envs", name)))
+			swap_env(envs[-1], snova_path)
+
+		self.assertEqual(get_current_env(snova_path), os.path.realpath(envs[-1]))
+		self.assertTrue(os.path.exists(os.path.join(snova_path, "envs", "env-initial")))
+		self.assertTrue(os.path.islink(initial_env))
+
+		self.assertEqual(rollback_env(snova_path), envs[0])
+		self.assertEqual(get_current_env(snova_path), os.path.realpath(envs[0]))
+
+		# an env directory created again doesn't replace the initial one
+		os.remove(initial_env)
+		make_env(initial_env)
+		swap_env(envs[-1], snova_path)
+		self.assertTrue(os.path.exists(os.path.join(snova_path, "envs", "env-initial-1")))
+		self.assertEqual(
+			[name for name in os.listdir(snova_path) if name.endswith(".tmp")], []
+		)
+		shutil.rmtree(os.path.join(snova_path, "envs", "env-initial-1"))
+
+		# the current and the most recent other env are kept
+		prune_envs(snova_path)
+		self.assertEqual(
+			sorted(os.listdir(os.path.join(snova_path, "envs"))), ["env-1", "env-2"]
+		)
+
+	def test_update_change_detection(self):
+		from snova.utils.changes import SPARROW_BUILD_PATTERNS, STAGE_FILES, match_files
+
+		files = [
+			"shopper/patches.txt",
+			"shopper/hooks.py",
+			"shopper/selling/doctype/quotation/quotation.json",
+			"shopper/selling/report/sales/sales.py",
+			"shopper/public/js/utils.js",
+			"package.json",
+		]
+		patterns, excludes, _ = STAGE_FILES["patch"]
+		self.assertEqual(match_files(files, patterns, excludes), files[:3])
+
+		patterns, excludes, _ = STAGE_FILES["build"]
+		self.assertEqual(match_files(files, patterns, excludes), files[4:])
+
+		# other apps' bundles import Sparrow's public sources
+		sparrow_files = ["sparrow/public/js/form.js", "sparrow/hooks.py"]
+		self.assertEqual(match_files(sparrow_files, SPARROW_BUILD_PATTERNS), sparrow_files[:1])
+
+	def test_update_journal(self):
+		from snova.utils.journal import UpdateJournal
+		from snova.utils.scheduler import Stage, StageScheduler
+
+		snova_path = self.snova_path
+		pulls, migrated, failing = [], [], ["b.com"]
+
+		def patch():
+			for site in journal.get_pending("patch", ["a.com", "b.com"]):
+				if site in failing:
+					raise ValueError(site)
+				migrated.append(site)
+				journal.mark_done("patch", site)
+
+		def run_update():
+			stages = [Stage("pull", lambda: pulls.append(1)), Stage("patch", patch, ["pull"])]
+			StageScheduler([journal.track(stage) for stage in stages]).run()
+
+		journal = UpdateJournal.start(snova_path, {"pull": True})
+		with self.assertRaises(ValueError):
+			run_update()
+
+		# a unit being recorded as the update crashed is run again
+		with open(journal.log_path, "a") as f:
+			f.write('\n["patch", "b.c')
+
+		journal = UpdateJournal.load(snova_path)
+		self.assertEqual(journal.options, {"pull": True})
+		self.assertTrue(journal.is_done("pull"))
+		self.assertEqual(journal.get_pending("patch", ["a.com", "b.com"]), ["b.com"])
+		self.assertEqual(journal.get_units("patch"), ["a.com"])
+
+		# resuming skips the pull and the site migrated before
+		failing.clear()
+		run_update()
+		self.assertEqual(pulls, [1])
+		self.assertEqual(migrated, ["a.com", "b.com"])
+
+		self.assertEqual(UpdateJournal.load(snova_path).get_units("patch"), ["a.com", "b.com"])
+		journal.finish()
+		self.assertIsNone(UpdateJournal.load(snova_path))
+		self.assertFalse(os.path.exists(journal.log_path))
+
+	def test_update_timings(self):
+		from snova.utils.scheduler import Stage, StageScheduler
+		from snova.utils.timings import (
+			UpdateTimings,
+			estimate_stage,
+			estimate_total,
+			read_update_history,
+		)
+
+		snova_path = self.snova_path
+		for _ in range(3):
+			timings = UpdateTimings()
+			scheduler = StageScheduler([Stage("backup", print), Stage("pull", print)])
+			scheduler.run()
+			scheduler.stages["backup"].duration = 20
+			timings.record_unit("backup", "a.com", 10)
+			timings.record_unit("backup", "b.com", 30)
+			timings.save(scheduler, snova_path=snova_path, restart=5)
+
+		history = read_update_history(snova_path)
+		self.assertEqual(len(history), 3)
+		self.assertEqual(estimate_stage(history, "backup"), 20)
+		self.assertEqual(estimate_stage(history, "restart"), 5)
+		self.assertIsNone(estimate_stage(history, "patch"))
+
+		# backups ran concurrently, a new site is expected to take as long as the typical one
+		self.assertEqual(estimate_stage(history, "backup", ["a.com"]), 5)
+		self.assertEqual(estimate_stage(history, "backup", ["a.com", "b.com", "c.com"]), 30)
+
+		stages = [Stage("backup", print), Stage("pull", print), Stage("patch", print, ["backup"])]
+		estimates = {"backup": 20, "pull": 30, "patch": 15, "restart": 5}
+		self.assertEqual(estimate_total(stages, estimates), 40)
+		self.assertEqual(estimate_total(stages, estimates, serial=True), 70)
+
+		# stages without history count as taking no time
+		estimates["patch"] = None
+		self.assertEqual(estimate_total(stages, estimates), 35)
+		self.assertEqual(estimate_total(stages, estimates, serial=True), 55)
+
+	def test_update_stage_timings(self):
+		from unittest import mock
+
+		from snova.snova import Snova
+		from snova.utils.scheduler import StageScheduler
+		from snova.utils.snova import get_update_stages
+		from snova.utils.timings import UpdateTimings
+
+		apps = ["sparrow", "shopper"]
+		for app in apps:
+			self.make_app(app)
+
+		snova = Snova(self.snova_path)
+		timings = UpdateTimings()
+
+		def requirements(on_app_done=None, **kwargs):
+			for app in apps:
+				on_app_done(app, 1)
+
+		with mock.patch.object(
+			snova.setup, "requirements", side_effect=requirements
+		), mock.patch.object(snova, "build"):
+			stages = get_update_stages(
+				snova, backup=False, pull=False, patch=False, timings=timings
+			)
+			StageScheduler(stages).run()
+
+		# installs and builds scale with the apps involved too
+		self.assertEqual(
+			sorted(timings.units), ["build", "node requirements", "python requirements"]
+		)
+		for units in timings.units.values():
+			self.assertEqual(sorted(units), sorted(apps))
@@ -141,17 +141,33 @@ def pause_exec(seconds=10):
 	print(" " * 40, end="\r")
 
 
-def exec_cmd(cmd, cwd=".", env=None, _raise=True):
+def exec_cmd(cmd, cwd=".", env=None, _raise=True, prefix=None):
+	"""Runs `cmd` in a subprocess. If `prefix` is passed, the command's output is
+	printed line by line with the prefix, which keeps the output of commands running
+	concurrently readable"""
 	if env:
 		env.update(os.environ.copy())
 
-	click.secho(f"$ {cmd}", fg="bright_black")
+	line_prefix = f"{prefix} " if prefix else ""
+	click.secho(f"{line_prefix}$ {cmd}", fg="bright_black")
 
 	cwd_info = f"cd {cwd} && " if cwd != "." else ""
 	cmd_log = f"{cwd_info}{cmd}"
 	logger.debug(cmd_log)
 	spl_cmd = split(cmd)
-	return_code = subprocess.call(spl_cmd, cwd=cwd, universal_newlines=True, env=env)
+
+	if prefix:
+		process = subprocess.Popen(
+			spl_cmd,
+			cwd=cwd,
+			env=env,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.STDOUT,
+			universal_newlines=True,
+		)
+		return_code = print_prefixed_output(process, prefix)
+	else:
+		return_code = subprocess.call(spl_cmd, cwd=cwd, universal_newlines=True, env=env)
 	if return_code:
 		logger.warning(f"{cmd_log} executed with exit code {return_code}")
 		if _raise:
@@ -159,6 +175,34 @@ def exec_cmd(cmd, cwd=".", env=None, _raise=True):
 	return return_code
 
 
+def print_prefixed_output(process, prefix):
+	"""Prints the output of `process`, started with stdout=PIPE and universal_newlines,
+	with `prefix` before each line. Returns the process' exit code"""
+	for line in process.stdout:
+		click.echo(f"{prefix} {line.rstrip()}")
+	return process.wait()
+
+
+def get_cache_dir(*paths) -> str:
+	"""Returns a directory for snova's caches that are shared by all snovas of the
+	user, under $XDG_CACHE_HOME (~/.cache by default). The directory is created if it
+	doesn't exist"""
+	cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+	cache_dir = os.path.join(cache_home, PROJECT_NAME, *paths)
+	os.makedirs(cache_dir, exist_ok=True)
+	return cache_dir
+
+
+def get_data_dir(*paths) -> str:
+	"""Returns a directory for data shared by all snovas of the user, under
+	$XDG_DATA_HOME (~/.local/share by default). The directory is created if it doesn't
+	exist"""
+	data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+	data_dir = os.path.join(data_home, PROJECT_NAME, *paths)
+	os.makedirs(data_dir, exist_ok=True)
+	return data_dir
+
+
 def which(executable: str, raise_err: bool = False) -> str:
 	from shutil import which
 
@@ -230,25 +274,51 @@ def is_root():
 
 
 def run_sparrow_cmd(*args, **kwargs):
+	"""Runs a Sparrow command, exits if it fails.
+
+	Optional kwargs: `prefix` is printed before each line of the command's output and
+	`cmd_prefix` is a sequence of arguments the command is run with, eg: ("nice",).
+	"""
 	from snova.cli import from_command_line
 	from snova.utils.snova import get_env_cmd
 
 	snova_path = kwargs.get("snova_path", ".")
+	prefix = kwargs.get("prefix")
+	cmd_prefix = tuple(kwargs.get("cmd_prefix") or ())
 	f = get_env_cmd("python", snova_path=snova_path)
 	sites_dir = os.path.join(snova_path, "sites")
+	cmd = cmd_prefix + (f, "-m", "sparrow.utils.snova_helper", "sparrow") + args
+
+	if prefix:
+		p = subprocess.Popen(
+			cmd,
+			cwd=sites_dir,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.STDOUT,
+			universal_newlines=True,
+		)
+		return_code = print_prefixed_output(p, prefix)
+		if return_code > 0:
+			sys.exit(return_code)
+		return
 
 	is_async = not from_command_line
+
+	if not is_async and not cmd_prefix:
+		from snova.helper_daemon import get_routed_commands, run_via_helper_daemon
+
+		if get_cmd_from_sysargv(args) in get_routed_commands(snova_path):
+			return_code = run_via_helper_daemon(("sparrow",) + args, snova_path=snova_path)
+			if return_code is not None:
+				if return_code > 0:
+					sys.exit(return_code)
+				return
 	if is_async:
 		stderr = stdout = subprocess.PIPE
 	else:
 		stderr = stdout = None
 
-	p = subprocess.Popen(
-		(f, "-m", "sparrow.utils.snova_helper", "sparrow") + args,
-		cwd=sites_dir,
-		stdout=stdout,
-		stderr=stderr,
-	)
+	p = subprocess.Popen(cmd, cwd=sites_dir, stdout=stdout, stderr=stderr)
 
 	return_code = print_output(p) if is_async else p.wait()
 	if return_code > 0:
@@ -386,18 +456,35 @@ def find_parent_snova(path: str) -> str:
 def get_env_sparrow_commands(snova_path=".") -> List:
 	"""Caches all available commands (even custom apps) via Sparrow
 	Default caching behaviour: generated the first time any command (for a specific snova directory)
+	is executed and stored in config/sparrow_commands.json. The cache is rebuilt when the
+	installed apps, their commits or the env's interpreter change.
 	"""
+	from snova.commands import snova_command
+	from snova.manifest import get_manifest_key, read_manifest, write_manifest
 	from snova.utils.snova import get_env_cmd
 
+	manifest_key = get_manifest_key(snova_path)
+	manifest = read_manifest(snova_path, key=manifest_key)
+
+	if manifest:
+		return manifest["sparrow_commands"]
+
 	python = get_env_cmd("python", snova_path=snova_path)
 	sites_path = os.path.join(snova_path, "sites")
 
 	try:
-		return json.loads(
+		sparrow_commands = json.loads(
 			get_cmd_output(
 				f"{python} -m sparrow.utils.snova_helper get-sparrow-commands", cwd=sites_path
 			)
 		)
+		write_manifest(
+			sparrow_commands,
+			snova_path=snova_path,
+			key=manifest_key,
+			snova_commands=snova_command.list_commands(None),
+		)
+		return sparrow_commands
 
 	except subprocess.CalledProcessError as e:
 		if hasattr(e, "stderr"):
@@ -523,20 +610,25 @@ class _dict(dict):
 		return _dict(dict(self).copy())
 
 
-def get_cmd_from_sysargv():
+def is_app_directory(app: str, snova_path: str = ".") -> bool:
+	"""Checks if app is a Sparrow app in the snova's apps folder without loading the snova"""
+	app_path = os.path.join(snova_path, "apps", app)
+	return os.path.isdir(app_path) and is_sparrow_app(app_path)
+
+
+def get_cmd_from_sysargv(args=None):
 	"""Identify and segregate tokens to options and command
 
 	For Command: `snova --profile --site sparrowframework.com migrate --no-backup`
 	sys.argv: ["/home/sparrow/.local/bin/snova", "--profile", "--site", "sparrowframework.com", "migrate", "--no-backup"]
 	Actual command run: migrate
 
+	Pass `args` to identify the command in them rather than in sys.argv[1:].
 	"""
 	# context is passed as options to sparrow's snova_helper
-	from snova.snova import Snova
-
 	sparrow_context = _dict(params={"--site"}, flags={"--verbose", "--profile", "--force"})
 	cmd_from_ctx = None
-	sys_argv = sys.argv[1:]
+	sys_argv = sys.argv[1:] if args is None else list(args)
 	skip_next = False
 
 	for arg in sys_argv:
@@ -551,7 +643,7 @@ def get_cmd_from_sysargv():
 			skip_next = True
 			continue
 
-		if sys_argv.index(arg) == 0 and arg in Snova(".").apps:
+		if sys_argv.index(arg) == 0 and is_app_directory(arg):
 			continue
 
 		cmd_from_ctx = arg
@@ -1,9 +1,14 @@
 # imports - standard imports
+import hashlib
+import json
 import os
 import pathlib
 import re
+import shutil
 import sys
 import subprocess
+import threading
+import time
 from typing import List
 from functools import lru_cache
 
@@ -17,8 +22,12 @@ from snova.exceptions import (
 from snova.app import get_repo_dir
 
 
-def is_version_upgrade(app="sparrow", snova_path=".", branch=None):
-	upstream_version = get_upstream_version(app=app, branch=branch, snova_path=snova_path)
+def is_version_upgrade(app="sparrow", snova_path=".", branch=None, fetch=True):
+	"""Returns a tuple of whether the app's major version upstream is higher than the
+	checked out one, and both versions. Pass `fetch=False` if upstream was just fetched"""
+	upstream_version = get_upstream_version(
+		app=app, branch=branch, snova_path=snova_path, fetch=fetch
+	)
 
 	if not upstream_version:
 		raise InvalidBranchException(
@@ -34,10 +43,30 @@ def is_version_upgrade(app="sparrow", snova_path=".", branch=None):
 	return (False, local_version, upstream_version)
 
 
-def switch_branch(branch, apps=None, snova_path=".", upgrade=False, check_upgrade=True):
+def switch_branch(
+	branch,
+	apps=None,
+	snova_path=".",
+	upgrade=False,
+	check_upgrade=True,
+	continue_on_error=False,
+):
+	"""Switches `apps` (all apps by default) to `branch`.
+
+	The apps are fetched concurrently, up to `pull_concurrency` at once, and their
+	versions checked against the fetched branches. Branches are checked out only once
+	all fetches completed and no app would be upgraded without `upgrade`, and a summary
+	of the apps switched and failed is printed at the end.
+
+	If any app fails to be fetched or checked, no app is switched, so that apps aren't
+	left on mismatched branches. With `continue_on_error`, the other apps are switched.
+	"""
 	import git
+	from snova.app import print_pull_summary
+	from snova.config.common_site_config import get_config
 	from snova.snova import Snova
 	from snova.utils import log, exec_cmd
+	from snova.utils.scheduler import run_concurrently
 	from snova.utils.snova import (
 		build_assets,
 		patch_sites,
@@ -46,8 +75,7 @@ def switch_branch(branch, apps=None, snova_path=".", upgrade=False, check_upgrad
 	from snova.utils.system import backup_all_sites
 
 	apps_dir = os.path.join(snova_path, "apps")
-	version_upgrade = (False,)
-	switched_apps = []
+	version_upgrades = {}
 
 	if not apps:
 		apps = [
@@ -55,39 +83,81 @@ def switch_branch(branch, apps=None, snova_path=".", upgrade=False, check_upgrad
 		]
 
 	for app in apps:
-		app_dir = os.path.join(apps_dir, app)
-
-		if not os.path.exists(app_dir):
+		if not os.path.exists(os.path.join(apps_dir, app)):
 			log(f"{app} does not exist!", level=2)
-			continue
+	apps = [app for app in apps if os.path.exists(os.path.join(apps_dir, app))]
 
-		repo = git.Repo(app_dir)
+	def fetch_app(app):
+		app_dir = os.path.join(apps_dir, app)
 		unshallow_flag = os.path.exists(os.path.join(app_dir, ".git", "shallow"))
 		log(f"Fetching upstream {'unshallow ' if unshallow_flag else ''}for {app}")
 
-		exec_cmd("git remote set-branches upstream  '*'", cwd=app_dir)
+		exec_cmd("git remote set-branches upstream  '*'", cwd=app_dir, prefix=f"[{app}]")
 		exec_cmd(
-			f"git fetch --all{' --unshallow' if unshallow_flag else ''} --quiet", cwd=app_dir
+			f"git fetch --all{' --unshallow' if unshallow_flag else ''} --quiet",
+			cwd=app_dir,
+			prefix=f"[{app}]",
 		)
 
 		if check_upgrade:
-			version_upgrade = is_version_upgrade(app=app, snova_path=snova_path, branch=branch)
-			if version_upgrade[0] and not upgrade:
-				log(
-					f"Switching to {branch} will cause upgrade from"
-					f" {version_upgrade[1]} to {version_upgrade[2]}. Pass --upgrade to"
-					" confirm",
-					level=2,
-				)
-				sys.exit(1)
+			# upstream was just fetched, the check only reads the fetched branch
+			version_upgrades[app] = is_version_upgrade(
+				app=app, snova_path=snova_path, branch=branch, fetch=False
+			)
+
+	results = run_concurrently(
+		fetch_app,
+		apps,
+		max_workers=int(get_config(snova_path).get("pull_concurrency") or 1),
+	)
 
+	failed_fetches = [app for app, (error, _) in results.items() if error]
+	if failed_fetches and not continue_on_error:
+		print_pull_summary(results)
+		log(
+			f"Fetching failed for: {', '.join(failed_fetches)}. No app was switched, pass"
+			" --continue-on-error to switch the others",
+			level=2,
+		)
+		sys.exit(1)
+
+	upgrades = {app: v for app, v in version_upgrades.items() if v[0]}
+	if upgrades and not upgrade:
+		for app, (_, local_version, upstream_version) in upgrades.items():
+			log(
+				f"Switching {app} to {branch} will cause upgrade from"
+				f" {local_version} to {upstream_version}. Pass --upgrade to confirm",
+				level=2,
+			)
+		sys.exit(1)
+
+	for app, (error, duration) in results.items():
+		if error:
+			continue
+
+		app_dir = os.path.join(apps_dir, app)
+		start = time.monotonic()
 		print("Switching for " + app)
-		exec_cmd(f"git checkout -f {branch}", cwd=app_dir)
 
-		if str(repo.active_branch) == branch:
-			switched_apps.append(app)
-		else:
-			log(f"Switching branches failed for: {app}", level=2)
+		try:
+			exec_cmd(f"git checkout -f {branch}", cwd=app_dir)
+			# raises a TypeError if HEAD is detached
+			active_branch = str(git.Repo(app_dir).active_branch)
+			if active_branch != branch:
+				raise CommandFailedError(f"{app} is on {active_branch} instead")
+		except (CommandFailedError, TypeError) as e:
+			error = e
+
+		results[app] = (error, duration + time.monotonic() - start)
+
+	switched_apps = [app for app, (error, _) in results.items() if not error]
+	failed_apps = [app for app, (error, _) in results.items() if error]
+
+	if results:
+		print_pull_summary(results)
+
+	if failed_apps:
+		log(f"Switching branches failed for: {', '.join(failed_apps)}", level=2)
 
 	if switched_apps:
 		log(f"Successfully switched branches for: {', '.join(switched_apps)}", level=1)
@@ -96,16 +166,26 @@ def switch_branch(branch, apps=None, snova_path=".", upgrade=False, check_upgrad
 			" database schema"
 		)
 
+	version_upgrade = upgrades.get("sparrow") or next(iter(upgrades.values()), (False,))
 	if version_upgrade[0] and upgrade:
-		Snova(snova_path).setup.requirements()
+		snova = Snova(snova_path)
+		snova.setup.requirements(batch=snova.conf.get("batch_requirements"))
 		backup_all_sites()
 		patch_sites()
 		build_assets()
 		post_upgrade(version_upgrade[1], version_upgrade[2])
 
 
-def switch_to_branch(branch=None, apps=None, snova_path=".", upgrade=False):
-	switch_branch(branch, apps=apps, snova_path=snova_path, upgrade=upgrade)
+def switch_to_branch(
+	branch=None, apps=None, snova_path=".", upgrade=False, continue_on_error=False
+):
+	switch_branch(
+		branch,
+		apps=apps,
+		snova_path=snova_path,
+		upgrade=upgrade,
+		continue_on_error=continue_on_error,
+	)
 
 
 def switch_to_develop(apps=None, snova_path=".", upgrade=True):
@@ -133,17 +213,22 @@ def get_develop_version(app, snova_path="."):
 		return get_version_from_string(f.read(), field="develop_version")
 
 
-def get_upstream_version(app, branch=None, snova_path="."):
+def get_upstream_version(app, branch=None, snova_path=".", fetch=True):
+	"""Returns the app's version on `branch` (the current branch by default) upstream.
+	Pass `fetch=False` to read the branch as last fetched"""
 	repo_dir = get_repo_dir(app, snova_path=snova_path)
 	if not branch:
 		branch = get_current_branch(app, snova_path=snova_path)
 
-	try:
-		subprocess.call(
-			f"git fetch --depth=1 --no-tags upstream {branch}", shell=True, cwd=repo_dir
-		)
-	except CommandFailedError:
-		raise InvalidRemoteException(f"Failed to fetch from remote named upstream for {app}")
+	if fetch:
+		try:
+			subprocess.call(
+				f"git fetch --depth=1 --no-tags upstream {branch}", shell=True, cwd=repo_dir
+			)
+		except CommandFailedError:
+			raise InvalidRemoteException(
+				f"Failed to fetch from remote named upstream for {app}"
+			)
 
 	try:
 		contents = subprocess.check_output(
@@ -175,22 +260,142 @@ def get_current_branch(app, snova_path="."):
 	return get_cmd_output("basename $(git symbolic-ref -q HEAD)", cwd=repo_dir)
 
 
+# seconds after which cached dependency files are revalidated with GitHub
+DEPS_CACHE_TTL = 6 * 60 * 60
+
+
 @lru_cache(maxsize=5)
 def get_required_deps(org, name, branch, deps="hooks.py"):
+	"""Returns the contents of `deps` in the app's GitHub repository.
+
+	Responses are cached on disk for DEPS_CACHE_TTL seconds. Stale entries are
+	revalidated by resolving the ref to its commit, which is cheaper than and not
+	rate limited like the GitHub API, and otherwise via a conditional request.
+	"""
+	ref = branch or "develop"
+	entry = read_deps_cache(org, name, ref, deps)
+
+	if entry and time.time() - entry["fetched_at"] < DEPS_CACHE_TTL:
+		return entry["content"]
+
+	# files at a commit never change, cached entries of other refs are reused too
+	commit = get_remote_commit(org, name, ref)
+	cached = None
+	if commit:
+		if entry and entry.get("commit") == commit:
+			cached = entry
+		else:
+			cached = read_deps_cache(org, name, commit, deps)
+
+	if cached:
+		content, etag = cached["content"], cached.get("etag")
+	else:
+		etag = entry.get("etag") if entry else None
+		try:
+			content, etag = fetch_required_deps(org, name, ref, deps, etag=etag)
+		except Exception:
+			if not entry:
+				raise
+			# offline or rate limited, a stale copy is better than none
+			return entry["content"]
+
+		if content is None:
+			content = entry["content"]
+
+	entry = {"commit": commit, "etag": etag, "content": content, "fetched_at": time.time()}
+	write_deps_cache(entry, org, name, ref, deps)
+	if commit and commit != ref:
+		write_deps_cache(entry, org, name, commit, deps)
+
+	return content
+
+
+def fetch_required_deps(org, name, ref, deps="hooks.py", etag=None):
+	"""Fetches `deps` from GitHub. Returns the contents and the response's ETag,
+	contents are None if they haven't changed since the response with `etag`"""
 	import requests
 	import base64
 
+	headers = {"If-None-Match": etag} if etag else {}
 	git_api_url = f"https://api.github.com/repos/{org}/{name}/contents/{name}/{deps}"
-	params = {"ref": branch or "develop"}
-	res = requests.get(url=git_api_url, params=params).json()
+	res = requests.get(url=git_api_url, params={"ref": ref}, headers=headers)
 
-	if "message" in res:
-		git_url = (
-			f"https://raw.githubusercontent.com/{org}/{name}/{params['ref']}/{name}/{deps}"
-		)
-		return requests.get(git_url).text
+	if res.status_code == 304:
+		return None, etag
+
+	data = res.json()
+	if "message" in data:
+		git_url = f"https://raw.githubusercontent.com/{org}/{name}/{ref}/{name}/{deps}"
+		res = requests.get(git_url, headers=headers)
+		if res.status_code == 304:
+			return None, etag
+		return res.text, res.headers.get("ETag")
+
+	return base64.decodebytes(data["content"].encode()).decode(), res.headers.get("ETag")
+
+
+def get_remote_commit(org, name, ref):
+	"""Returns the commit `ref` points to in the app's GitHub repository, None if it
+	can't be resolved"""
+	if re.fullmatch(r"[0-9a-f]{40}", ref):
+		return ref
+
+	try:
+		output = subprocess.check_output(
+			["git", "ls-remote", f"https://github.com/{org}/{name}.git", ref],
+			env=dict(os.environ, GIT_TERMINAL_PROMPT="0"),
+			stderr=subprocess.DEVNULL,
+			timeout=30,
+		).decode()
+	except (OSError, subprocess.SubprocessError):
+		return None
+
+	refs = dict(reversed(line.split("\t", 1)) for line in output.splitlines() if "\t" in line)
+
+	# annotated tags are peeled to the commit they point to
+	for ref_name in (f"refs/heads/{ref}", f"refs/tags/{ref}^{{}}", f"refs/tags/{ref}"):
+		if ref_name in refs:
+			return refs[ref_name]
+
+	return None
+
+
+def get_deps_cache_path(org, name, ref, deps="hooks.py"):
+	from snova.utils import get_cache_dir
+
+	key = hashlib.sha256("/".join((org, name, ref, deps)).encode()).hexdigest()
+	return os.path.join(get_cache_dir("required_deps"), f"{key}.json")
+
+
+def read_deps_cache(org, name, ref, deps="hooks.py"):
+	try:
+		with open(get_deps_cache_path(org, name, ref, deps)) as f:
+			entry = json.load(f)
+	except (OSError, ValueError):
+		return None
 
-	return base64.decodebytes(res["content"].encode()).decode()
+	return entry if isinstance(entry, dict) and "content" in entry else None
+
+
+def write_deps_cache(entry, org, name, ref, deps="hooks.py"):
+	cache_path = get_deps_cache_path(org, name, ref, deps)
+	tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+	try:
+		with open(tmp_path, "w") as f:
+			json.dump(entry, f)
+		os.replace(tmp_path, cache_path)
+	except OSError:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+
+
+def clear_deps_cache():
+	"""Removes all cached dependency files, they're fetched again on next use"""
+	from snova.utils import get_cache_dir
+
+	shutil.rmtree(get_cache_dir("required_deps"), ignore_errors=True)
+	get_required_deps.cache_clear()
 
 
 def required_apps_from_hooks(required_deps: str, local: bool = False) -> List:
@@ -267,6 +472,43 @@ def check_existing_dir(snova_path, repo_name):
 	return dir_already_exists, cloned_path
 
 
+# files that an app's Python and Node packages are installed from
+PYTHON_REQUIREMENT_FILES = (
+	"pyproject.toml",
+	"setup.py",
+	"setup.cfg",
+	"requirements.txt",
+	"dev-requirements.txt",
+)
+NODE_REQUIREMENT_FILES = ("package.json", "yarn.lock")
+
+
+def get_requirements_fingerprint(app, snova_path=".", developer_mode=False) -> dict:
+	"""Returns hashes of the files that the app's Python and Node packages are installed
+	from. The Python hash covers the env's interpreter and developer mode, which decides
+	whether dev dependencies are installed, too"""
+	app_path = os.path.join(snova_path, "apps", app)
+	env_path = os.path.join(snova_path, "env")
+	fingerprint = {}
+
+	for kind, files in (("python", PYTHON_REQUIREMENT_FILES), ("node", NODE_REQUIREMENT_FILES)):
+		key = hashlib.sha256()
+		for filename in files:
+			path = os.path.join(app_path, filename)
+			key.update(filename.encode())
+			key.update(pathlib.Path(path).read_bytes() if os.path.isfile(path) else b"-")
+
+		if kind == "python":
+			key.update(os.path.realpath(os.path.join(env_path, "bin", "python")).encode())
+			pyvenv_cfg = os.path.join(env_path, "pyvenv.cfg")
+			key.update(pathlib.Path(pyvenv_cfg).read_bytes() if os.path.isfile(pyvenv_cfg) else b"-")
+			key.update(b"dev" if developer_mode else b"")
+
+		fingerprint[kind] = key.hexdigest()
+
+	return fingerprint
+
+
 def get_current_version(app, snova_path="."):
 	current_version = None
 	repo_dir = get_repo_dir(app, snova_path=snova_path)
@@ -0,0 +1,214 @@
+# imports - standard imports
+import hashlib
+import json
+import os
+import shutil
+
+# imports - third party imports
+import click
+
+# imports - module imports
+from snova.utils import get_cache_dir, run_sparrow_cmd
+
+# bundle manifests written by `sparrow build`, mapping bundle names to built files
+ASSET_MANIFESTS = ("assets.json", "assets-rtl.json")
+# directories of an app's public folder that aren't build inputs
+EXCLUDED_DIRS = ("dist", "node_modules")
+# builds kept in the host-wide cache, least recently used ones are removed first
+MAX_CACHED_BUILDS = 100
+
+
+def build_with_asset_cache(snova_path=".", apps=None):
+	"""Builds the assets of `apps` (all apps by default), restoring the build outputs of
+	apps whose asset inputs are unchanged from the cache shared by all snovas of the user.
+
+	An app's inputs are its public folder, package.json and yarn.lock, Sparrow's version,
+	build tooling and public folder and the snova's developer mode. Returns a dict of the apps and
+	whether their assets were restored from the cache ("hit") or built ("miss").
+	"""
+	from snova.snova import Snova
+	from snova.utils.app import get_current_version
+
+	snova = Snova(snova_path)
+	all_apps = list(snova.apps)
+	apps = apps or all_apps
+	sparrow_path = os.path.join(snova_path, "apps", "sparrow")
+	# apps' bundles import Sparrow's public sources, which change without a version bump
+	sparrow_inputs = "{}:{}:{}:{}".format(
+		get_current_version("sparrow", snova_path=snova_path),
+		get_tree_hash(os.path.join(sparrow_path, "esbuild")),
+		get_tree_hash(os.path.join(sparrow_path, "yarn.lock")),
+		get_tree_hash(os.path.join(sparrow_path, "sparrow", "public")),
+	)
+	developer_mode = bool(snova.conf.get("developer_mode"))
+
+	keys = {
+		app: get_assets_key(app, snova_path, sparrow_inputs, developer_mode) for app in apps
+	}
+	report = {
+		app: "hit" if restore_assets(app, keys[app], snova_path) else "miss" for app in apps
+	}
+	missed_apps = [app for app in apps if report[app] == "miss"]
+
+	if missed_apps:
+		if set(missed_apps) == set(all_apps):
+			run_sparrow_cmd("build", snova_path=snova_path)
+		else:
+			run_sparrow_cmd("build", "--apps", ",".join(missed_apps), snova_path=snova_path)
+
+		for app in missed_apps:
+			store_assets(app, keys[app], snova_path)
+
+		prune_asset_cache()
+
+	print_asset_cache_report(report)
+	return report
+
+
+def get_assets_key(app, snova_path, sparrow_inputs, developer_mode=False):
+	app_path = os.path.join(snova_path, "apps", app)
+	key = hashlib.sha256(f"{app}:{sparrow_inputs}:{developer_mode}".encode())
+
+	key.update(get_tree_hash(os.path.join(app_path, app, "public")).encode())
+	for lockfile in ("package.json", "yarn.lock"):
+		key.update(get_tree_hash(os.path.join(app_path, lockfile)).encode())
+
+	return key.hexdigest()
+
+
+def get_tree_hash(path):
+	"""Returns a hash of the names and contents of the files under `path` (or of the
+	file at `path`), skipping build outputs"""
+	key = hashlib.sha256()
+
+	if os.path.isfile(path):
+		with open(path, "rb") as f:
+			key.update(f.read())
+		return key.hexdigest()
+
+	for root, dirs, files in os.walk(path):
+		dirs[:] = sorted(d for d in dirs if d not in EXCLUDED_DIRS)
+		for filename in sorted(files):
+			file_path = os.path.join(root, filename)
+			key.update(os.path.relpath(file_path, path).encode())
+			try:
+				with open(file_path, "rb") as f:
+					key.update(f.read())
+			except OSError:
+				key.update(b"-")
+
+	return key.hexdigest()
+
+
+def get_cached_build_path(key):
+	return os.path.join(get_cache_dir("assets"), key)
+
+
+def get_dist_path(app, snova_path="."):
+	"""`sites/assets/{app}` is usually a symlink to the app's public folder"""
+	return os.path.join(snova_path, "sites", "assets", app, "dist")
+
+
+def restore_assets(app, key, snova_path="."):
+	"""Copies the cached build outputs of `app` into the snova, returns False if there
+	are none"""
+	cached_path = get_cached_build_path(key)
+	cached_manifests = read_json(os.path.join(cached_path, "manifests.json"))
+
+	if not cached_manifests or not os.path.isdir(os.path.join(cached_path, "dist")):
+		return False
+
+	app_assets_path = os.path.join(snova_path, "sites", "assets", app)
+	if not os.path.exists(app_assets_path):
+		os.makedirs(os.path.dirname(app_assets_path), exist_ok=True)
+		os.symlink(
+			os.path.abspath(os.path.join(snova_path, "apps", app, app, "public")), app_assets_path
+		)
+
+	dist_path = get_dist_path(app, snova_path)
+	if os.path.exists(dist_path):
+		shutil.rmtree(dist_path)
+	shutil.copytree(os.path.join(cached_path, "dist"), dist_path, symlinks=True)
+
+	for manifest in ASSET_MANIFESTS:
+		manifest_path = os.path.join(snova_path, "sites", "assets", manifest)
+		assets = read_json(manifest_path)
+		assets = {
+			bundle: path for bundle, path in assets.items() if not is_app_asset(app, path)
+		}
+		assets.update(cached_manifests.get(manifest) or {})
+		write_json(manifest_path, assets)
+
+	# marks the build as recently used
+	os.utime(cached_path)
+	return True
+
+
+def store_assets(app, key, snova_path="."):
+	"""Adds the build outputs of `app` to the cache"""
+	dist_path = get_dist_path(app, snova_path)
+	cached_path = get_cached_build_path(key)
+
+	if not os.path.isdir(dist_path) or os.path.exists(cached_path):
+		return
+
+	# copied to a temporary directory first as builds of other snovas may read the cache
+	tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+	shutil.copytree(dist_path, os.path.join(tmp_path, "dist"), symlinks=True)
+
+	manifests = {}
+	for manifest in ASSET_MANIFESTS:
+		assets = read_json(os.path.join(snova_path, "sites", "assets", manifest))
+		manifests[manifest] = {
+			bundle: path for bundle, path in assets.items() if is_app_asset(app, path)
+		}
+	write_json(os.path.join(tmp_path, "manifests.json"), manifests)
+
+	try:
+		os.rename(tmp_path, cached_path)
+	except OSError:
+		# the same build was cached concurrently
+		shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def prune_asset_cache(max_builds=MAX_CACHED_BUILDS):
+	cache_dir = get_cache_dir("assets")
+	builds = [
+		os.path.join(cache_dir, name)
+		for name in os.listdir(cache_dir)
+		if not name.endswith(".tmp")
+	]
+	builds.sort(key=os.path.getmtime, reverse=True)
+
+	for path in builds[max_builds:]:
+		shutil.rmtree(path, ignore_errors=True)
+
+
+def is_app_asset(app, path):
+	return isinstance(path, str) and path.startswith(f"/assets/{app}/")
+
+
+def read_json(path):
+	try:
+		with open(path) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+
+def write_json(path, data):
+	with open(path, "w") as f:
+		json.dump(data, f, indent=4)
+
+
+def print_asset_cache_report(report):
+	if not report:
+		return
+
+	hits = [app for app, status in report.items() if status == "hit"]
+	width = max(len(app) for app in report)
+
+	click.secho(f"\nAsset cache: {len(hits)} of {len(report)} apps restored", bold=True)
+	for app, status in report.items():
+		color = "green" if status == "hit" else "yellow"
+		click.echo(f"{app.ljust(width)}  {click.style(status, fg=color)}")
@@ -0,0 +1,132 @@
+# imports - standard imports
+import fnmatch
+import os
+import subprocess
+
+# imports - third party imports
+import click
+
+# files that migrating a site acts upon: patches, DocType and other module JSON,
+# fixtures and hooks
+MIGRATE_PATTERNS = (
+	"patches.txt",
+	"*/patches.txt",
+	"*/hooks.py",
+	"*/patches/*.py",
+	"*/fixtures/*",
+	"*.json",
+)
+MIGRATE_EXCLUDES = ("package.json", "*/package.json", "*/public/*", "*/node_modules/*")
+# files that the assets of an app are built from
+BUILD_PATTERNS = ("*/public/*", "package.json", "yarn.lock")
+# Sparrow's build tooling and public sources, which other apps' bundles import, changes
+# to which affect the assets of all apps
+SPARROW_BUILD_PATTERNS = ("esbuild/*", "package.json", "yarn.lock", "sparrow/public/*")
+
+STAGE_FILES = {
+	"patch": (MIGRATE_PATTERNS, MIGRATE_EXCLUDES, "patches, DocType JSON, fixtures or hooks"),
+	"build": (BUILD_PATTERNS, (), "frontend sources"),
+}
+
+
+def get_current_commit(app, snova_path="."):
+	"""Returns the app's checked out commit, None if it isn't a git repository"""
+	app_dir = os.path.join(snova_path, "apps", app)
+
+	if not os.path.exists(os.path.join(app_dir, ".git")):
+		return None
+
+	try:
+		return subprocess.check_output(
+			["git", "rev-parse", "HEAD"], cwd=app_dir, stderr=subprocess.DEVNULL, encoding="utf-8"
+		).strip()
+	except subprocess.CalledProcessError:
+		return None
+
+
+def get_changed_files(app, since, snova_path="."):
+	"""Returns the files changed in the app between the commit `since` and the checked
+	out one, None if that can't be determined, eg: the commit isn't known"""
+	if not since:
+		return None
+
+	try:
+		output = subprocess.check_output(
+			["git", "diff", "--name-only", since, "HEAD"],
+			cwd=os.path.join(snova_path, "apps", app),
+			stderr=subprocess.DEVNULL,
+			encoding="utf-8",
+		)
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+	return output.split()
+
+
+def match_files(files, patterns, excludes=()):
+	return [
+		f
+		for f in files
+		if any(fnmatch.fnmatch(f, p) for p in patterns)
+		and not any(fnmatch.fnmatch(f, p) for p in excludes)
+	]
+
+
+def get_affected_apps(snova, stage) -> dict:
+	"""Returns the apps whose changes since `stage` (patch, build) last completed call
+	for running it, mapped to the relevant files changed. Apps whose changes can't be
+	determined, eg: as the stage never completed for them, are mapped to None and
+	always considered affected. For builds, changes to Sparrow's tooling or public
+	sources, or unknown changes to Sparrow, affect all apps"""
+	patterns, excludes, _ = STAGE_FILES[stage]
+	changes = {
+		app: get_changed_files(
+			app, snova.apps.get_stage_commit(app, stage), snova_path=snova.name
+		)
+		for app in snova.apps
+	}
+
+	if stage == "build" and "sparrow" in changes:
+		if changes["sparrow"] is None:
+			return {app: None for app in snova.apps}
+
+		sparrow_files = match_files(changes["sparrow"], SPARROW_BUILD_PATTERNS)
+		if sparrow_files:
+			# the assets of all apps are rebuilt against Sparrow's changes
+			return {app: [f"sparrow/{f}" for f in sparrow_files] for app in snova.apps}
+
+	affected = {}
+
+	for app, changed_files in changes.items():
+		if changed_files is None:
+			affected[app] = None
+			continue
+
+		changed_files = match_files(changed_files, patterns, excludes)
+		if changed_files:
+			affected[app] = changed_files
+
+	return affected
+
+
+def print_affected_apps(stage, affected, apps):
+	"""Explains why `stage` runs for the `affected` apps or is skipped altogether"""
+	description = STAGE_FILES[stage][2]
+
+	if not affected:
+		click.secho(
+			f"Skipping {stage}: no {description} changed in {', '.join(apps)}", fg="yellow"
+		)
+		return
+
+	for app, files in affected.items():
+		if files is None:
+			reason = "its previous state is unknown"
+		else:
+			more = f" and {len(files) - 3} more" if len(files) > 3 else ""
+			reason = f"{', '.join(files[:3])}{more} changed"
+		click.secho(f"Running {stage} for {app}: {reason}", fg="yellow")
+
+	skipped = [app for app in apps if app not in affected]
+	if skipped:
+		click.secho(f"No {description} changed in {', '.join(skipped)}", fg="yellow")
@@ -15,6 +15,10 @@ def print_snova_version(ctx, param, value):
 
 
 class MultiCommandGroup(click.Group):
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.lazy_commands = {}
+
 	def add_command(self, cmd, name=None):
 		"""Registers another :class:`Command` with this group.  If the name
 		is not provided, the name of the command is used.
@@ -34,6 +38,40 @@ class MultiCommandGroup(click.Group):
 				for _name in name:
 					self.commands[_name] = cmd
 
+	def add_lazy_commands(self, module, commands):
+		"""Registers commands of a module without importing it. The module is
+		imported only when one of its commands is resolved.
+
+		:param module: dotted path of the module defining the commands
+		:param commands: mapping of command name(s) to the command's attribute name
+		"""
+		for name, attr in commands.items():
+			names = name if isinstance(name, (list, tuple)) else [name]
+			for _name in names:
+				self.lazy_commands[_name] = (module, attr)
+
+	def has_command(self, name) -> bool:
+		return name in self.commands or name in self.lazy_commands
+
+	def list_commands(self, ctx):
+		return sorted(set(self.commands) | set(self.lazy_commands))
+
+	def get_command(self, ctx, name):
+		if name not in self.commands and name in self.lazy_commands:
+			self.resolve_lazy_command(name)
+		return self.commands.get(name)
+
+	def resolve_lazy_command(self, name):
+		from importlib import import_module
+
+		module, attr = self.lazy_commands[name]
+		cmd = getattr(import_module(module), attr)
+
+		# register all aliases of the command at once
+		for _name, target in self.lazy_commands.items():
+			if target == (module, attr):
+				self.commands[_name] = cmd
+
 
 class SugaredOption(click.Option):
 	def __init__(self, *args, **kwargs):
@@ -0,0 +1,168 @@
+# imports - standard imports
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+
+# imports - third party imports
+import click
+
+# imports - module imports
+from snova.exceptions import ValidationError
+from snova.utils import log
+
+# envs built side by side are kept under this directory, `env` is a symlink to one
+ENVS_DIR = "envs"
+# the current and the previous env, for rolling back
+KEEP_ENVS = 2
+
+
+def build_env(snova, apps=None, commits=None) -> str:
+	"""Creates a new virtualenv under envs/, with the current env's interpreter, and
+	installs the Python packages of `apps` (all apps by default) into it. The current
+	env isn't touched. Returns the new env's path.
+
+	`commits` maps apps to commits that are fetched but not checked out yet, eg: while
+	sites are up ahead of an update. Those apps are installed from archives of the
+	commits, along with their packages, and are installed from the apps' folders by
+	`finish_env` once the commits are checked out.
+
+	Packages built for the current env are reused from pip's wheel cache. Packages that
+	were installed into the current env by hand and aren't required by any app are not
+	carried over.
+	"""
+	import snova.cli as snova_cli
+	from snova.utils.prefetch import extract_commit
+	from snova.utils.snova import install_python_dev_dependencies
+
+	apps = apps or snova.apps
+	commits = commits or {}
+	quiet_flag = "" if snova_cli.verbose else "--quiet"
+	envs_path = os.path.join(snova.name, ENVS_DIR)
+	env_path = os.path.join(envs_path, f"env-{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+	python = os.path.join(env_path, "bin", "python")
+	tmp_path = tempfile.mkdtemp(prefix="snova-env-")
+
+	os.makedirs(envs_path, exist_ok=True)
+	log(f"Building a new env at {env_path}")
+
+	try:
+		packages = []
+		for app in apps:
+			if app in commits:
+				tree_path = os.path.join(tmp_path, app)
+				extract_commit(app, commits[app], tree_path, snova)
+				packages.append(tree_path)
+			else:
+				packages.append(f"-e {os.path.realpath(os.path.join(snova.name, 'apps', app))}")
+
+		snova.run(f"{os.path.realpath(snova.python)} -m venv {env_path}")
+		snova.run(f"{python} -m pip install {quiet_flag} --upgrade pip wheel")
+		snova.run(f"{python} -m pip install {quiet_flag} --upgrade {' '.join(packages)}")
+
+		if snova.conf.get("developer_mode"):
+			install_python_dev_dependencies(apps=apps, snova_path=snova.name, python=python)
+	except BaseException:
+		shutil.rmtree(env_path, ignore_errors=True)
+		raise
+	finally:
+		shutil.rmtree(tmp_path, ignore_errors=True)
+
+	return env_path
+
+
+def finish_env(env_path, snova, apps=None):
+	"""Installs `apps` into the env built by `build_env` from their folders. Their
+	packages are installed already, unless the checked out commits require others"""
+	import snova.cli as snova_cli
+
+	apps = apps or snova.apps
+	quiet_flag = "" if snova_cli.verbose else "--quiet"
+	editables = " ".join(
+		f"-e {os.path.realpath(os.path.join(snova.name, 'apps', app))}" for app in apps
+	)
+
+	python = os.path.join(env_path, "bin", "python")
+
+	snova.run(f"{python} -m pip install {quiet_flag} {editables}")
+
+
+def swap_env(env_path, snova_path="."):
+	"""Points the snova's `env` at `env_path` by atomically replacing the symlink, so
+	running processes see either the old or the new env, never a partial one.
+
+	An `env` directory is moved under envs/ first, where it stays available for rolling
+	back.
+	"""
+	env_link = os.path.join(snova_path, "env")
+	tmp_link = f"{env_link}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+	if os.path.isdir(env_link) and not os.path.islink(env_link):
+		os.makedirs(os.path.join(snova_path, ENVS_DIR), exist_ok=True)
+		os.rename(env_link, get_unused_path(os.path.join(snova_path, ENVS_DIR, "env-initial")))
+
+	try:
+		os.symlink(os.path.relpath(env_path, snova_path), tmp_link)
+		os.replace(tmp_link, env_link)
+	finally:
+		if os.path.lexists(tmp_link):
+			os.remove(tmp_link)
+
+	log(f"Switched env to {env_path}", level=1)
+
+
+def get_unused_path(path):
+	"""Returns `path`, suffixed with a number if something exists there already"""
+	candidate, i = path, 1
+	while os.path.lexists(candidate):
+		candidate, i = f"{path}-{i}", i + 1
+	return candidate
+
+
+def rollback_env(snova_path="."):
+	"""Switches back to the env that was used before the current one"""
+	previous_env = get_previous_env(snova_path)
+
+	if not previous_env:
+		raise ValidationError("No previous env found to roll back to")
+
+	swap_env(previous_env, snova_path)
+	return previous_env
+
+
+def get_envs(snova_path=".") -> list:
+	"""Returns the paths of the envs under envs/, oldest first"""
+	envs_path = os.path.join(snova_path, ENVS_DIR)
+
+	if not os.path.isdir(envs_path):
+		return []
+
+	envs = [
+		os.path.join(envs_path, name)
+		for name in os.listdir(envs_path)
+		if os.path.exists(os.path.join(envs_path, name, "bin", "python"))
+	]
+	return sorted(envs, key=os.path.getmtime)
+
+
+def get_current_env(snova_path="."):
+	env_link = os.path.join(snova_path, "env")
+	return os.path.realpath(env_link) if os.path.islink(env_link) else None
+
+
+def get_previous_env(snova_path="."):
+	"""Returns the most recently built env besides the current one"""
+	current_env = get_current_env(snova_path)
+	envs = [env for env in get_envs(snova_path) if os.path.realpath(env) != current_env]
+	return envs[-1] if envs else None
+
+
+def prune_envs(snova_path=".", keep=KEEP_ENVS):
+	"""Removes all envs but the current one and the `keep - 1` most recent others"""
+	current_env = get_current_env(snova_path)
+	envs = [env for env in get_envs(snova_path) if os.path.realpath(env) != current_env]
+
+	for env in envs[: max(len(envs) - keep + 1, 0)]:
+		click.secho(f"Removing old env {env}", fg="yellow")
+		shutil.rmtree(env, ignore_errors=True)
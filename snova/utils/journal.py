@@ -0,0 +1,145 @@
+# imports - standard imports
+import json
+import os
+import threading
+import time
+
+# imports - third party imports
+import click
+
+JOURNAL_FILE = "update_journal.json"
+JOURNAL_LOG_FILE = "update_journal.log"
+
+
+class UpdateJournal:
+	"""Progress of a `snova update`, kept in config/update_journal.json until the update
+	completes so that `snova update --resume` can continue a failed one.
+
+	The journal holds the update's options and the stages that completed. The units of
+	stages working through sites or apps (eg: sites migrated) that completed are
+	appended to config/update_journal.log as they complete, so that recording one
+	doesn't rewrite the progress of thousands of others.
+	"""
+
+	lock = threading.Lock()
+
+	def __init__(self, snova_path=".", data=None, units=None):
+		self.snova_path = snova_path
+		self.data = data or {}
+		# stage: {unit: None}, ordered sets of the units that completed
+		self.units = units or {}
+
+	@property
+	def path(self):
+		return get_journal_path(self.snova_path)
+
+	@property
+	def log_path(self):
+		return get_journal_log_path(self.snova_path)
+
+	@property
+	def options(self) -> dict:
+		return self.data["options"]
+
+	@property
+	def started_at(self) -> str:
+		return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.data["started_at"]))
+
+	@classmethod
+	def load(cls, snova_path="."):
+		"""Returns the journal of an unfinished update, None if there's none"""
+		try:
+			with open(get_journal_path(snova_path)) as f:
+				data = json.load(f)
+		except (OSError, ValueError):
+			return None
+
+		return cls(snova_path, data, read_units(get_journal_log_path(snova_path)))
+
+	@classmethod
+	def start(cls, snova_path=".", options=None):
+		journal = cls(
+			snova_path, {"started_at": time.time(), "options": options or {}, "stages": {}}
+		)
+		if os.path.exists(journal.log_path):
+			os.remove(journal.log_path)
+		journal.save()
+		return journal
+
+	def save(self):
+		tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		with open(tmp_path, "w") as f:
+			json.dump(self.data, f, indent=4)
+		os.replace(tmp_path, self.path)
+
+	def finish(self):
+		for path in (self.path, self.log_path):
+			if os.path.exists(path):
+				os.remove(path)
+
+	def get_units(self, stage) -> list:
+		"""Returns the units of `stage` that completed, in the order they did"""
+		return list(self.units.get(stage, ()))
+
+	def is_done(self, stage, unit=None) -> bool:
+		if unit:
+			return unit in self.units.get(stage, ())
+		return self.data["stages"].get(stage, {}).get("done", False)
+
+	def mark_done(self, stage, unit=None):
+		"""Records that `stage`, or one of its units, completed"""
+		with self.lock:
+			if unit:
+				self.units.setdefault(stage, {})[unit] = None
+				with open(self.log_path, "a") as f:
+					# starts a new line, should the last one have been cut short
+					f.write("\n" + json.dumps([stage, unit]))
+			else:
+				self.data["stages"].setdefault(stage, {})["done"] = True
+				self.save()
+
+	def get_pending(self, stage, units) -> list:
+		done = self.units.get(stage, {})
+		return [unit for unit in units if unit not in done]
+
+	def track(self, stage):
+		"""Makes `stage` (a `snova.utils.scheduler.Stage`) a no-op if it completed before
+		and records it once it completes"""
+		func = stage.func
+
+		def run():
+			if self.is_done(stage.name):
+				click.secho(f"Skipping {stage.name}, completed before", fg="yellow")
+				return
+			func()
+			self.mark_done(stage.name)
+
+		stage.func = run
+		return stage
+
+
+def read_units(path) -> dict:
+	"""Reads the units recorded in the journal's log. A line cut short by a crash is
+	ignored, as its unit didn't finish being recorded"""
+	units = {}
+
+	try:
+		with open(path) as f:
+			for line in f:
+				try:
+					stage, unit = json.loads(line)
+				except ValueError:
+					continue
+				units.setdefault(stage, {})[unit] = None
+	except OSError:
+		pass
+
+	return units
+
+
+def get_journal_path(snova_path="."):
+	return os.path.join(snova_path, "config", JOURNAL_FILE)
+
+
+def get_journal_log_path(snova_path="."):
+	return os.path.join(snova_path, "config", JOURNAL_LOG_FILE)
@@ -0,0 +1,120 @@
+# imports - standard imports
+import fcntl
+import json
+import os
+import socket
+from contextlib import contextmanager
+
+# imports - module imports
+from snova.exceptions import ValidationError
+
+REGISTRY_FILE = "ports.json"
+# ports probed past a taken one before giving up
+MAX_PORT_PROBES = 1000
+
+
+def allocate_ports(snova_path, default_ports, current=None, check_free=True) -> dict:
+	"""Returns ports for the snova's services and records them in the host-wide port
+	registry, kept in the user's data directory, so that no other snova is given them.
+
+	Ports in `current`, eg: already set in the snova's config, are kept. Each port in
+	`default_ports` that's missing is allocated the lowest port from its default that
+	isn't registered to another snova and, with `check_free`, isn't in use on the
+	machine. The registry is locked meanwhile, so snovas created at the same time get
+	different ports. Raises a ValidationError if no port is available for a service.
+
+	The first time a snova is created in a directory, the snovas already in there are
+	added to the registry by reading their configs.
+	"""
+	from snova.config.common_site_config import get_sibling_ports
+
+	snova_path = os.path.abspath(snova_path)
+	snovas_path = os.path.dirname(snova_path)
+	ports = dict(current or {})
+
+	with locked_registry() as registry:
+		if snovas_path not in registry["seeded"]:
+			for path, sibling_ports in get_sibling_ports(snovas_path).items():
+				registry["snovas"].setdefault(path, sibling_ports)
+			registry["seeded"].append(snovas_path)
+
+		prune_registry(registry)
+		used = {
+			port
+			for path, snova_ports in registry["snovas"].items()
+			if path != snova_path
+			for port in snova_ports.values()
+		}
+
+		for key, default_port in default_ports.items():
+			if key in ports:
+				continue
+			for port in range(default_port, default_port + MAX_PORT_PROBES):
+				if port in used or port in ports.values():
+					continue
+				if not check_free or is_port_free(port):
+					break
+			else:
+				raise ValidationError(
+					f"No free port found for {key} between {default_port} and"
+					f" {default_port + MAX_PORT_PROBES - 1}, drop unused snovas or set it in"
+					" common_site_config.json"
+				)
+			ports[key] = port
+
+		registry["snovas"][snova_path] = ports
+
+	return ports
+
+
+def release_ports(snova_path):
+	"""Removes the snova's ports from the registry, making them available to new snovas"""
+	with locked_registry() as registry:
+		registry["snovas"].pop(os.path.abspath(snova_path), None)
+
+
+def prune_registry(registry):
+	"""Releases the ports of snovas that were removed without `snova drop`"""
+	for path in list(registry["snovas"]):
+		if not os.path.isdir(path):
+			del registry["snovas"][path]
+
+
+def is_port_free(port, host="127.0.0.1") -> bool:
+	with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+		# ports of recently stopped services are in TIME_WAIT, but can be listened on
+		sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		try:
+			sock.bind((host, port))
+		except OSError:
+			return False
+	return True
+
+
+def get_registry_path():
+	from snova.utils import get_data_dir
+
+	return os.path.join(get_data_dir(), REGISTRY_FILE)
+
+
+@contextmanager
+def locked_registry():
+	"""Yields the registry, holding an exclusive lock on it, and saves it unless the
+	block raises"""
+	path = get_registry_path()
+
+	with open(f"{path}.lock", "w") as lock_file:
+		fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+		try:
+			with open(path) as f:
+				registry = json.load(f)
+		except (OSError, ValueError):
+			registry = {"snovas": {}, "seeded": []}
+
+		yield registry
+
+		tmp_path = f"{path}.tmp"
+		with open(tmp_path, "w") as f:
+			json.dump(registry, f, indent=1, sort_keys=True)
+		os.replace(tmp_path, path)
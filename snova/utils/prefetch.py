@@ -0,0 +1,249 @@
+# imports - standard imports
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+
+# imports - third party imports
+import click
+
+# imports - module imports
+from snova.exceptions import CommandFailedError
+from snova.utils import get_cmd_output
+
+PREFETCH_FILE = "prefetch.json"
+# prefetched commits older than this are ignored by `snova update`
+PREFETCH_MAX_AGE = 24 * 60 * 60
+
+
+def prefetch(apps=None, snova_path=".", requirements=True):
+	"""command: snova update --prefetch
+
+	Fetches the remote branches of `apps` (all apps by default) and, with
+	`requirements`, downloads the Python and Node packages of apps whose requirement
+	files changed upstream into pip's and yarn's caches. Neither the apps' working trees
+	nor the env are touched, so this can run from cron while sites are up. The next
+	`snova update` checks out the fetched commits without contacting the remotes, see
+	`get_prefetched_commits`.
+	"""
+	from snova.app import get_repo_dir, print_pull_summary
+	from snova.snova import Snova
+	from snova.utils.app import get_remote
+	from snova.utils.scheduler import run_concurrently
+
+	snova = Snova(snova_path)
+	remotes = {}
+
+	for app in apps or snova.apps:
+		if app in snova.excluded_apps:
+			print(f"Skipping prefetch for app {app}")
+			continue
+		if os.path.exists(os.path.join(get_repo_dir(app, snova_path=snova_path), ".git")):
+			remote = get_remote(app, snova_path=snova_path)
+			if remote:
+				remotes[app] = remote
+
+	if not remotes:
+		return
+
+	fetched = {}
+
+	def _prefetch_app(app):
+		fetched[app] = prefetch_app(app, remotes[app], snova, prefix=f"[{app}]")
+		# the fetch is kept even if downloading the requirements fails
+		if requirements:
+			prefetch_requirements(app, fetched[app]["commit"], snova, prefix=f"[{app}]")
+
+	results = run_concurrently(
+		_prefetch_app,
+		remotes,
+		max_workers=int(snova.conf.get("pull_concurrency") or 1),
+	)
+
+	state = read_prefetch_state(snova_path)
+	state.update(fetched)
+	write_prefetch_state(state, snova_path)
+
+	print_pull_summary(results)
+
+	failed_apps = [app for app, (error, _) in results.items() if error]
+	if failed_apps:
+		raise CommandFailedError(f"Failed to prefetch apps: {', '.join(failed_apps)}")
+
+
+def prefetch_app(app, remote, snova, prefix=None) -> dict:
+	"""Fetches the app's current branch from `remote` the same way `pull_app` would.
+	Returns the app's prefetch state"""
+	from snova.app import get_repo_dir
+	from snova.utils.app import get_current_branch
+
+	app_dir = get_repo_dir(app, snova_path=snova.name)
+	branch = get_current_branch(app, snova_path=snova.name)
+
+	if snova.conf.get("shallow_clone"):
+		snova.run(f"git fetch --depth=1 --no-tags {remote} {branch}", cwd=app_dir, prefix=prefix)
+	elif os.path.exists(os.path.join(app_dir, ".git", "shallow")):
+		snova.run(f"git fetch {remote} {branch} --unshallow", cwd=app_dir, prefix=prefix)
+	else:
+		snova.run(f"git fetch {remote} {branch}", cwd=app_dir, prefix=prefix)
+
+	commit = get_cmd_output("git rev-parse FETCH_HEAD", cwd=app_dir)
+
+	return {"remote": remote, "branch": branch, "commit": commit, "fetched_at": time.time()}
+
+
+def prefetch_requirements(app, commit, snova, prefix=None):
+	"""Downloads the packages that installing the app at `commit` needs, if its
+	requirement files differ from the checked out ones. The packages end up in the
+	user's pip and yarn caches, which the next install is served from"""
+	from snova.app import get_repo_dir
+	from snova.utils import which
+	from snova.utils.app import NODE_REQUIREMENT_FILES, PYTHON_REQUIREMENT_FILES
+
+	app_dir = get_repo_dir(app, snova_path=snova.name)
+	changed_files = get_cmd_output(
+		"git diff --name-only HEAD {} -- {}".format(
+			commit, " ".join(PYTHON_REQUIREMENT_FILES + NODE_REQUIREMENT_FILES)
+		),
+		cwd=app_dir,
+	).split()
+
+	python = any(f in PYTHON_REQUIREMENT_FILES for f in changed_files)
+	node = any(f in NODE_REQUIREMENT_FILES for f in changed_files) and which("yarn")
+
+	if not (python or node):
+		return
+
+	tmp_path = tempfile.mkdtemp(prefix=f"snova-prefetch-{app}-")
+
+	try:
+		tree_path = os.path.join(tmp_path, app)
+		extract_commit(app, commit, tree_path, snova, prefix=prefix)
+
+		if python:
+			snova.run(
+				f"{snova.python} -m pip download --quiet --dest {tmp_path}/packages {tree_path}",
+				prefix=prefix,
+			)
+
+		if node and os.path.exists(os.path.join(tree_path, "yarn.lock")):
+			snova.run(
+				"yarn install --frozen-lockfile --ignore-scripts --non-interactive"
+				f" --modules-folder {tmp_path}/node_modules",
+				cwd=tree_path,
+				prefix=prefix,
+			)
+	finally:
+		shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def extract_commit(app, commit, path, snova, prefix=None):
+	"""Extracts the app's tree at `commit` into `path`, leaving its working tree as is"""
+	from snova.app import get_repo_dir
+
+	archive_path = f"{path}.tar"
+	os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+	snova.run(
+		f"git archive --output {archive_path} {commit}",
+		cwd=get_repo_dir(app, snova_path=snova.name),
+		prefix=prefix,
+	)
+
+	try:
+		with tarfile.open(archive_path) as archive:
+			extract_tree(archive, path)
+	finally:
+		os.remove(archive_path)
+
+
+def extract_tree(archive, path):
+	"""Extracts the tar `archive` into `path`, refusing members that would end up
+	outside of it. Without tarfile's extraction filters, links aren't extracted"""
+	if hasattr(tarfile, "data_filter"):
+		archive.extractall(path, filter="data")
+		return
+
+	root = os.path.realpath(path)
+	members = []
+
+	for member in archive.getmembers():
+		member_path = os.path.realpath(os.path.join(root, member.name))
+		if os.path.commonpath([root, member_path]) != root:
+			raise tarfile.TarError(f"Refusing to extract {member.name} outside of {path}")
+		if member.isfile() or member.isdir():
+			members.append(member)
+
+	archive.extractall(path, members=members)
+
+
+def get_prefetched_commits(snova_path=".", max_age=PREFETCH_MAX_AGE) -> dict:
+	"""Returns the apps' prefetched commits that `snova update` can check out as is,
+	i.e. that were fetched recently for the app's current remote and branch"""
+	from snova.app import get_repo_dir
+	from snova.utils.app import get_current_branch, get_remote
+
+	commits = {}
+
+	for app, entry in read_prefetch_state(snova_path).items():
+		app_dir = get_repo_dir(app, snova_path=snova_path)
+
+		if time.time() - entry.get("fetched_at", 0) > max_age or not os.path.isdir(app_dir):
+			continue
+
+		if entry.get("branch") != get_current_branch(app, snova_path=snova_path):
+			continue
+
+		if entry.get("remote") != get_remote(app, snova_path=snova_path):
+			continue
+
+		if get_cmd_output(f"git cat-file -t {entry['commit']}", cwd=app_dir, _raise=False) != "commit":
+			continue
+
+		commits[app] = entry["commit"]
+
+	return commits
+
+
+def get_prefetch_path(snova_path="."):
+	return os.path.join(snova_path, "config", PREFETCH_FILE)
+
+
+def read_prefetch_state(snova_path=".") -> dict:
+	try:
+		with open(get_prefetch_path(snova_path)) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+
+def write_prefetch_state(state, snova_path="."):
+	path = get_prefetch_path(snova_path)
+	# a prefetch from cron may run alongside an update
+	tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+	with open(tmp_path, "w") as f:
+		json.dump(state, f, indent=4)
+	os.replace(tmp_path, path)
+
+
+def clear_prefetched_apps(apps, snova_path="."):
+	"""Forgets the prefetched commits of `apps`, once they've been checked out"""
+	state = read_prefetch_state(snova_path)
+
+	if any(app in state for app in apps):
+		write_prefetch_state(
+			{app: entry for app, entry in state.items() if app not in apps}, snova_path
+		)
+
+
+def print_prefetched_commits(commits):
+	if commits:
+		click.secho(
+			"Using prefetched commits of {}".format(
+				", ".join(f"{app} ({commit[:8]})" for app, commit in commits.items())
+			),
+			fg="yellow",
+		)
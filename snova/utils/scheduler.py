@@ -0,0 +1,190 @@
+# imports - standard imports
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List
+
+# imports - third party imports
+import click
+
+
+class Stage:
+	"""A unit of work of a pipeline, run once all the stages it `requires` succeeded.
+	Requirements on stages that aren't part of the pipeline are ignored."""
+
+	def __init__(self, name: str, func: Callable, requires: Iterable[str] = ()):
+		self.name = name
+		self.func = func
+		self.requires = tuple(requires)
+		self.status = "pending"
+		self.duration = None
+
+	def run(self):
+		start = time.monotonic()
+		self.status = "running"
+
+		try:
+			result = self.func()
+		except BaseException:
+			self.status = "failed"
+			raise
+		else:
+			self.status = "done"
+		finally:
+			self.duration = time.monotonic() - start
+
+		return result
+
+
+class StageScheduler:
+	"""Runs stages concurrently as soon as their requirements are met, or one at a time
+	in the order they were added if `serial` is set.
+
+	If a stage fails, no further stages are started; the stages already running are
+	waited for and the first error is raised.
+	"""
+
+	def __init__(self, stages: List[Stage] = None, serial: bool = False, max_workers: int = 4):
+		self.stages = {}
+		self.serial = serial
+		self.max_workers = max_workers
+		self.duration = None
+
+		for stage in stages or []:
+			self.add(stage)
+
+	def add(self, stage: Stage):
+		if stage.name in self.stages:
+			raise ValueError(f"Stage {stage.name} is already scheduled")
+		self.stages[stage.name] = stage
+
+	def get_requirements(self, stage: Stage):
+		return [name for name in stage.requires if name in self.stages]
+
+	def validate(self):
+		"""Raises ValueError if the stages' requirements are circular"""
+		done = set()
+		pending = list(self.stages.values())
+
+		while pending:
+			ready = [s for s in pending if set(self.get_requirements(s)) <= done]
+			if not ready:
+				names = ", ".join(s.name for s in pending)
+				raise ValueError(f"Circular requirements between stages: {names}")
+			done.update(s.name for s in ready)
+			pending = [s for s in pending if s not in ready]
+
+	def run(self):
+		self.validate()
+		start = time.monotonic()
+
+		try:
+			if self.serial:
+				for stage in self.stages.values():
+					stage.run()
+			else:
+				self._run_concurrently()
+		finally:
+			self.duration = time.monotonic() - start
+
+	def _run_concurrently(self):
+		error = None
+		running = {}
+
+		with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+			while True:
+				if error is None:
+					for stage in self.get_ready_stages():
+						running[executor.submit(stage.run)] = stage
+
+				if not running:
+					break
+
+				finished, _ = wait(running, return_when=FIRST_COMPLETED)
+				for future in finished:
+					running.pop(future)
+					if future.exception() is not None and error is None:
+						error = future.exception()
+
+		if error is not None:
+			raise error
+
+	def get_ready_stages(self):
+		return [
+			stage
+			for stage in self.stages.values()
+			if stage.status == "pending"
+			and all(self.stages[name].status == "done" for name in self.get_requirements(stage))
+		]
+
+	def print_summary(self):
+		if not self.stages:
+			return
+
+		width = max(len(name) for name in self.stages)
+		total = sum(stage.duration or 0 for stage in self.stages.values())
+		colors = {"done": "green", "failed": "red"}
+
+		click.secho(f"\n{'Stage'.ljust(width)}  Status   Time", bold=True)
+		for stage in self.stages.values():
+			status = click.style(stage.status.ljust(7), fg=colors.get(stage.status))
+			duration = f"{stage.duration:.1f}s" if stage.duration is not None else "-"
+			click.echo(f"{stage.name.ljust(width)}  {status}  {duration}")
+
+		click.echo(f"{'total'.ljust(width)}           {self.duration or 0:.1f}s", nl=False)
+		click.echo(f" (stages took {total:.1f}s)" if not self.serial else "")
+
+
+def run_concurrently(
+	func: Callable,
+	items: Iterable,
+	max_workers: int = 1,
+	key: Callable = None,
+	max_per_key: int = None,
+	on_done: Callable = None,
+) -> dict:
+	"""Calls `func(item)` for all items, running at most `max_workers` calls at once and
+	at most `max_per_key` at once for items with the same `key(item)`, eg: sites on the
+	same database server. Items are started in the given order.
+
+	Returns a dict mapping each item to a tuple of the exception raised by its call, if
+	any, and the time it took. Calls don't affect each other, all items are processed.
+	`on_done(item, error, duration, running)` is called as each call finishes, with the
+	items still running.
+	"""
+	items = list(items)
+	keys = {item: key(item) if key else None for item in items}
+	max_workers = max(max_workers, 1)
+	max_per_key = max_per_key or max_workers
+	pending = list(items)
+	running = {}
+	results = {}
+
+	def call(item):
+		start = time.monotonic()
+		try:
+			func(item)
+		except BaseException as e:
+			return e, time.monotonic() - start
+		return None, time.monotonic() - start
+
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		while pending or running:
+			running_keys = [keys[item] for item in running.values()]
+
+			for item in list(pending):
+				if len(running) >= max_workers:
+					break
+				if running_keys.count(keys[item]) >= max_per_key:
+					continue
+				pending.remove(item)
+				running_keys.append(keys[item])
+				running[executor.submit(call, item)] = item
+
+			finished, _ = wait(running, return_when=FIRST_COMPLETED)
+			for future in finished:
+				item = running.pop(future)
+				results[item] = future.result()
+				if on_done:
+					on_done(item, *results[item], list(running.values()))
+
+	return {item: results[item] for item in items}
@@ -0,0 +1,162 @@
+# imports - standard imports
+import json
+import logging
+import os
+import threading
+import time
+
+# imports - module imports
+from snova import PROJECT_NAME
+
+INDEX_FILE = "site_index.json"
+INDEX_VERSION = 1
+# the site_config.json fields that the nginx config is generated from
+NGINX_FIELDS = ("nginx_port", "ssl_certificate", "ssl_certificate_key", "domains")
+# files modified this recently may be modified again within the same mtime tick
+RACY_SECONDS = 2
+
+logger = logging.getLogger(PROJECT_NAME)
+
+
+class SiteIndex:
+	"""Index of the snova's sites, kept in config/site_index.json, with the nginx
+	related fields of each site's site_config.json.
+
+	The index is brought up to date as it's loaded: sites/ is listed only if its mtime
+	changed, and a site_config.json is parsed only if its inode, mtime or size did, so
+	that a snova with thousands of sites is read with a stat per site rather than by
+	opening every site_config.json. Sites added, changed or removed since the index
+	was last saved are in `changed` and `removed`.
+	"""
+
+	def __init__(self, snova_path="."):
+		self.snova_path = snova_path
+		self.sites_path = os.path.join(snova_path, "sites")
+		# outside sites/, as writing it there would change the mtime of sites/
+		self.path = os.path.join(snova_path, "config", INDEX_FILE)
+		self.entries = {}
+		self.changed = []
+		self.removed = []
+		self.refresh()
+
+	@property
+	def sites(self) -> list:
+		return [name for name, entry in self.entries.items() if entry["key"]]
+
+	def get_config(self, site) -> dict:
+		"""Returns the nginx related fields of the site's config. Raises a ValueError if
+		the site's config is broken"""
+		entry = self.entries[site]
+		if entry.get("error"):
+			raise ValueError(f"Broken site_config.json of {site}: {entry['error']}")
+		return entry["config"]
+
+	def load(self) -> dict:
+		try:
+			with open(self.path) as f:
+				index = json.load(f)
+		except (OSError, ValueError):
+			return {}
+
+		return index if index.get("version") == INDEX_VERSION else {}
+
+	def refresh(self):
+		from snova.config.store import config_store, get_file_key
+
+		index = self.load()
+		old_entries = index.get("sites", {})
+		sites_mtime = get_mtime(self.sites_path)
+
+		if sites_mtime and sites_mtime == index.get("sites_mtime"):
+			names = list(old_entries)
+		else:
+			try:
+				names = os.listdir(self.sites_path)
+			except FileNotFoundError:
+				names = []
+
+		self.entries, self.changed = {}, []
+
+		for name in names:
+			# folders that aren't sites (yet) are indexed too, they're only listed again
+			# once sites/ changes
+			config_path = os.path.join(self.sites_path, name, "site_config.json")
+			try:
+				key = list(get_file_key(config_path))
+			except OSError:
+				key = None
+
+			old_entry = old_entries.get(name)
+			if old_entry and old_entry["key"] == key:
+				self.entries[name] = old_entry
+				continue
+
+			entry = {"key": key}
+			if key:
+				try:
+					config = config_store.read(config_path)
+					entry["config"] = {f: config[f] for f in NGINX_FIELDS if f in config}
+				except (OSError, ValueError) as e:
+					# eg: invalid JSON or a file the user can't read
+					entry["error"] = str(e)
+				if is_racy(key[1]):
+					# makes the next refresh parse the file again
+					key[1] = 0
+				if not (old_entry and old_entry["key"]) or any(
+					old_entry.get(k) != entry.get(k) for k in ("config", "error")
+				):
+					self.changed.append(name)
+
+			self.entries[name] = entry
+
+		self.removed = [
+			name
+			for name, entry in old_entries.items()
+			if entry["key"] and not self.entries.get(name, {}).get("key")
+		]
+
+		if is_racy(sites_mtime):
+			sites_mtime = None
+
+		if self.entries != old_entries or sites_mtime != index.get("sites_mtime"):
+			self.save(sites_mtime)
+
+	def save(self, sites_mtime=None):
+		"""Writes the index, unless it (or config/, until it exists) belongs to another
+		user, eg: `sudo snova setup production` refreshing a bench user's index. The index
+		is rebuilt as it's loaded, so not saving it only makes the next load slower"""
+		if not is_owned(self.path if os.path.exists(self.path) else os.path.dirname(self.path)):
+			return
+
+		# the index may be refreshed by several threads and processes at once
+		tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		index = {"version": INDEX_VERSION, "sites_mtime": sites_mtime, "sites": self.entries}
+
+		try:
+			with open(tmp_path, "w") as f:
+				json.dump(index, f)
+			os.replace(tmp_path, self.path)
+		except OSError as e:
+			logger.warning(f"Couldn't save the site index {self.path}: {e}")
+		finally:
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+
+
+def is_owned(path) -> bool:
+	"""Returns True if `path` exists and belongs to the current user"""
+	try:
+		return os.stat(path).st_uid == os.getuid()
+	except OSError:
+		return False
+
+
+def get_mtime(path):
+	try:
+		return os.stat(path).st_mtime_ns
+	except OSError:
+		return None
+
+
+def is_racy(mtime_ns):
+	return mtime_ns is not None and time.time() - mtime_ns / 1e9 < RACY_SECONDS
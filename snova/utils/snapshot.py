@@ -0,0 +1,257 @@
+# imports - standard imports
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+# imports - third party imports
+import click
+
+# imports - module imports
+from snova.exceptions import CommandFailedError, ValidationError
+from snova.utils import log
+
+SNAPSHOTS_DIR = "snapshots"
+SNAPSHOT_FILE = "snapshot.json"
+# snapshots kept by default, overridden by `update_snapshots` in common_site_config.json
+DEFAULT_SNAPSHOTS = 2
+ASSET_MANIFESTS = ("assets.json", "assets-rtl.json")
+
+
+def take_snapshot(snova_path=".", keep=DEFAULT_SNAPSHOTS) -> str:
+	"""Records the state `snova update` changes, for `restore_snapshot`: each app's
+	commit, sites/apps.json, the env and the built assets. Returns the snapshot's path.
+
+	The env and the built assets are snapshotted as hard links, which is cheap and safe
+	as pip replaces files rather than writing to them and `sparrow build` removes the
+	dist folders it builds first. An `env` symlink (see `snova.utils.env`) is recorded
+	as is, as the env it points to is kept around.
+	"""
+	from snova.snova import Snova
+	from snova.utils.assets import get_dist_path
+	from snova.utils.changes import get_current_commit
+
+	snova = Snova(snova_path)
+	start = time.monotonic()
+	snapshots_path = os.path.join(snova_path, SNAPSHOTS_DIR)
+	path = os.path.join(snapshots_path, datetime.now().strftime("%Y%m%d_%H%M%S"))
+	tmp_path = f"{path}.tmp"
+	snapshot = {"created_at": time.time(), "apps": {}, "env": None}
+
+	os.makedirs(tmp_path)
+
+	try:
+		for app in snova.apps:
+			commit = get_current_commit(app, snova_path=snova_path)
+			if commit:
+				snapshot["apps"][app] = {
+					"commit": commit,
+					"branch": get_branch(app, snova_path),
+				}
+
+			dist_path = get_dist_path(app, snova_path)
+			if os.path.isdir(dist_path):
+				link_tree(dist_path, os.path.join(tmp_path, "assets", app, "dist"))
+
+		for filename in ASSET_MANIFESTS + ("apps.json",):
+			folder = "assets" if filename in ASSET_MANIFESTS else ""
+			file_path = os.path.join(snova_path, "sites", folder, filename)
+			if os.path.exists(file_path):
+				os.makedirs(os.path.join(tmp_path, "sites", folder), exist_ok=True)
+				shutil.copy2(file_path, os.path.join(tmp_path, "sites", folder, filename))
+
+		env_path = os.path.join(snova_path, "env")
+		if os.path.islink(env_path):
+			snapshot["env"] = os.path.realpath(env_path)
+		elif os.path.isdir(env_path):
+			link_tree(env_path, os.path.join(tmp_path, "env"))
+			snapshot["env"] = "env"
+
+		with open(os.path.join(tmp_path, SNAPSHOT_FILE), "w") as f:
+			json.dump(snapshot, f, indent=4)
+
+	except BaseException:
+		shutil.rmtree(tmp_path, ignore_errors=True)
+		raise
+
+	os.rename(tmp_path, path)
+	prune_snapshots(snova_path, keep=keep)
+	log(f"Snapshot {os.path.basename(path)} taken in {time.monotonic() - start:.1f}s")
+
+	return path
+
+
+def restore_snapshot(snova_path=".", name=None):
+	"""Restores the apps' commits, sites/apps.json, the env and the built assets from
+	the snapshot `name`, the latest one by default. Databases aren't restored, that's
+	what the backups taken by `snova update` are for.
+
+	The snapshot's env and assets are hard linked into place and the snapshot is kept
+	until it's pruned, so a failed rollback can be retried.
+	"""
+	from snova.utils.env import swap_env
+
+	path = get_snapshot_path(snova_path, name)
+	start = time.monotonic()
+
+	with open(os.path.join(path, SNAPSHOT_FILE)) as f:
+		snapshot = json.load(f)
+
+	# assets first, as `git reset --keep` refuses to touch rebuilt files that are tracked
+	assets_path = os.path.join(path, "assets")
+	for app in os.listdir(assets_path) if os.path.isdir(assets_path) else []:
+		restore_assets(app, path, snova_path)
+
+	failed_apps = []
+	for app, state in snapshot["apps"].items():
+		if not restore_app(app, state, snova_path):
+			failed_apps.append(app)
+
+	if snapshot["env"] == "env":
+		env_path = os.path.join(snova_path, "env")
+		new_env_path = f"{env_path}.{os.getpid()}.new"
+		old_env_path = f"{env_path}.{os.getpid()}.old"
+
+		shutil.rmtree(new_env_path, ignore_errors=True)
+		link_tree(os.path.join(path, "env"), new_env_path)
+		if os.path.lexists(env_path):
+			os.rename(env_path, old_env_path)
+		os.rename(new_env_path, env_path)
+		if os.path.islink(old_env_path):
+			os.remove(old_env_path)
+		else:
+			shutil.rmtree(old_env_path, ignore_errors=True)
+
+	elif snapshot["env"]:
+		if os.path.isdir(snapshot["env"]):
+			swap_env(snapshot["env"], snova_path=snova_path)
+		else:
+			log(f"The snapshot's env {snapshot['env']} doesn't exist anymore", level=3)
+
+	sites_path = os.path.join(path, "sites")
+	for root, _, files in os.walk(sites_path):
+		for filename in files:
+			relative_path = os.path.relpath(os.path.join(root, filename), sites_path)
+			shutil.copy2(
+				os.path.join(sites_path, relative_path),
+				os.path.join(snova_path, "sites", relative_path),
+			)
+
+	if failed_apps:
+		raise CommandFailedError(
+			f"Failed to restore the commits of apps: {', '.join(failed_apps)}"
+		)
+
+	duration = time.monotonic() - start
+	log(f"Restored snapshot {os.path.basename(path)} in {duration:.1f}s", level=1)
+
+
+def restore_app(app, state, snova_path="."):
+	"""Checks out the app's branch and commit, keeping uncommitted changes. Apps that
+	weren't on a branch, eg: installed from a tag, get their commit checked out. Returns
+	False if that isn't possible, eg: the commit was pruned from a shallow clone"""
+	from snova.utils import exec_cmd
+
+	app_dir = os.path.join(snova_path, "apps", app)
+
+	if not os.path.isdir(app_dir):
+		return False
+
+	try:
+		if not state["branch"]:
+			exec_cmd(f"git checkout --detach {state['commit']}", cwd=app_dir)
+			return True
+		if state["branch"] != get_branch(app, snova_path):
+			exec_cmd(f"git checkout {state['branch']}", cwd=app_dir)
+		exec_cmd(f"git reset --keep {state['commit']}", cwd=app_dir)
+	except CommandFailedError:
+		return False
+
+	return True
+
+
+def get_branch(app, snova_path="."):
+	"""Returns the app's checked out branch, None if its HEAD is detached"""
+	from snova.utils import get_cmd_output
+
+	app_dir = os.path.join(snova_path, "apps", app)
+	return get_cmd_output("git symbolic-ref -q --short HEAD", cwd=app_dir, _raise=False) or None
+
+
+def restore_assets(app, path, snova_path="."):
+	from snova.utils.assets import get_dist_path
+
+	dist_path = get_dist_path(app, snova_path)
+	if not os.path.isdir(os.path.dirname(dist_path)):
+		return
+
+	if os.path.exists(dist_path):
+		shutil.rmtree(dist_path)
+	link_tree(os.path.join(path, "assets", app, "dist"), dist_path)
+
+
+def link_tree(src, dst):
+	"""Copies the directory `src` to `dst` as hard links, falling back to copying files
+	that can't be linked"""
+	for root, dirs, files in os.walk(src):
+		target_root = os.path.join(dst, os.path.relpath(root, src))
+		os.makedirs(target_root, exist_ok=True)
+
+		for name in dirs + files:
+			source = os.path.join(root, name)
+			target = os.path.join(target_root, name)
+
+			if os.path.islink(source):
+				os.symlink(os.readlink(source), target)
+				if name in dirs:
+					# symlinked directories aren't walked
+					dirs.remove(name)
+			elif name in files:
+				try:
+					os.link(source, target)
+				except OSError:
+					shutil.copy2(source, target)
+
+
+def get_snapshots(snova_path=".") -> list:
+	"""Returns the names of the snapshots, oldest first"""
+	snapshots_path = os.path.join(snova_path, SNAPSHOTS_DIR)
+
+	if not os.path.isdir(snapshots_path):
+		return []
+
+	return sorted(
+		name
+		for name in os.listdir(snapshots_path)
+		if os.path.exists(os.path.join(snapshots_path, name, SNAPSHOT_FILE))
+	)
+
+
+def get_snapshot_path(snova_path=".", name=None):
+	snapshots = get_snapshots(snova_path)
+
+	if not snapshots:
+		raise ValidationError("No snapshots found, they're taken by `snova update`")
+
+	name = name or snapshots[-1]
+	if name not in snapshots:
+		raise ValidationError(f"No snapshot named {name}, see `snova rollback --list`")
+
+	return os.path.join(snova_path, SNAPSHOTS_DIR, name)
+
+
+def prune_snapshots(snova_path=".", keep=DEFAULT_SNAPSHOTS):
+	for name in get_snapshots(snova_path)[: -keep or None]:
+		shutil.rmtree(os.path.join(snova_path, SNAPSHOTS_DIR, name), ignore_errors=True)
+
+
+def print_snapshots(snova_path="."):
+	for name in get_snapshots(snova_path):
+		with open(os.path.join(snova_path, SNAPSHOTS_DIR, name, SNAPSHOT_FILE)) as f:
+			snapshot = json.load(f)
+
+		apps = ", ".join(
+			f"{app}@{state['commit'][:8]}" for app, state in snapshot["apps"].items()
+		)
+		click.echo(f"{name}  {apps}")
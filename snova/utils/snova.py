@@ -63,7 +63,8 @@ def update_node_packages(snova_path=".", apps=None):
 		update_yarn_packages(snova_path, apps=apps)
 
 
-def install_python_dev_dependencies(snova_path=".", apps=None, verbose=False):
+def install_python_dev_dependencies(snova_path=".", apps=None, verbose=False, python=None):
+	"""Installs the apps' dev dependencies into the snova's env, or the env of `python`"""
 	import snova.cli
 	from snova.snova import Snova
 
@@ -71,6 +72,7 @@ def install_python_dev_dependencies(snova_path=".", apps=None, verbose=False):
 	quiet_flag = "" if verbose else "--quiet"
 
 	snova = Snova(snova_path)
+	python = python or snova.python
 
 	if isinstance(apps, str):
 		apps = [apps]
@@ -86,11 +88,11 @@ def install_python_dev_dependencies(snova_path=".", apps=None, verbose=False):
 		if os.path.exists(pyproject_path):
 			pyproject_deps = _generate_dev_deps_pattern(pyproject_path)
 			if pyproject_deps:
-				snova.run(f"{snova.python} -m pip install {quiet_flag} --upgrade {pyproject_deps}")
+				snova.run(f"{python} -m pip install {quiet_flag} --upgrade {pyproject_deps}")
 
 		if not pyproject_deps and os.path.exists(dev_requirements_path):
 			snova.run(
-				f"{snova.python} -m pip install {quiet_flag} --upgrade -r {dev_requirements_path}"
+				f"{python} -m pip install {quiet_flag} --upgrade -r {dev_requirements_path}"
 			)
 
 
@@ -263,17 +265,77 @@ def post_upgrade(from_ver, to_ver, snova_path="."):
 		)
 
 
-def patch_sites(snova_path="."):
+def patch_sites(snova_path=".", sites=None, on_site_done=None):
+	"""Migrates all sites of the snova, or `sites`, one at a time unless
+	`migrate_concurrency` or `migrate_concurrency_per_db_host` is set in
+	common_site_config.json, see `patch_sites_concurrently`. `on_site_done(site,
+	duration)` is called for each site migrated"""
+	from time import monotonic
+
 	from snova.snova import Snova
 	from snova.utils.system import migrate_site
 
 	snova = Snova(snova_path)
+	sites = snova.sites if sites is None else sites
+
+	if snova.conf.get("migrate_concurrency_per_db_host") or snova.conf.get(
+		"migrate_concurrency"
+	):
+		return patch_sites_concurrently(snova, sites=sites, on_site_done=on_site_done)
 
-	for site in snova.sites:
+	for site in sites:
+		start = monotonic()
 		try:
 			migrate_site(site, snova_path=snova_path)
 		except subprocess.CalledProcessError:
 			raise PatchError
+		if on_site_done:
+			on_site_done(site, monotonic() - start)
+
+
+def patch_sites_concurrently(snova, sites=None, on_site_done=None):
+	"""Migrates up to `migrate_concurrency_per_db_host` sites of each database server at
+	once, and up to `migrate_concurrency` sites in total if set. A failed migration doesn't
+	stop the others, PatchError is raised once all sites are done"""
+	from time import monotonic
+
+	from snova.config.site_config import get_site_db_host
+	from snova.utils.scheduler import run_concurrently
+	from snova.utils.system import migrate_site
+
+	conf = snova.conf
+	sites = snova.sites if sites is None else sites
+	db_hosts = {site: get_site_db_host(site, snova_path=snova.name) for site in sites}
+	per_db_host = int(conf.get("migrate_concurrency_per_db_host") or 1)
+	concurrency = int(
+		conf.get("migrate_concurrency") or per_db_host * len(set(db_hosts.values()))
+	)
+	done = []
+
+	def migrate(site):
+		start = monotonic()
+		migrate_site(site, snova_path=snova.name, prefix=f"[{site}]")
+		if on_site_done:
+			on_site_done(site, monotonic() - start)
+
+	def on_done(site, error, duration, running):
+		done.append(site)
+		status = click.style("failed", fg="red") if error else click.style("migrated", fg="green")
+		in_progress = f", in progress: {', '.join(running)}" if running else ""
+		click.echo(f"{site} {status} in {duration:.1f}s ({len(done)}/{len(sites)}){in_progress}")
+
+	results = run_concurrently(
+		migrate,
+		sites,
+		max_workers=concurrency,
+		key=db_hosts.get,
+		max_per_key=per_db_host,
+		on_done=on_done,
+	)
+
+	failed_sites = [site for site, (error, _) in results.items() if error]
+	if failed_sites:
+		raise PatchError(f"Failed to migrate sites: {', '.join(failed_sites)}")
 
 
 def restart_supervisor_processes(snova_path=".", web_workers=False, _raise=False):
@@ -345,6 +407,13 @@ def restart_process_manager(snova_path=".", web_workers=False):
 
 
 def build_assets(snova_path=".", app=None):
+	from snova.config.common_site_config import get_config
+
+	if get_config(snova_path).get("use_asset_cache"):
+		from snova.utils.assets import build_with_asset_cache
+
+		return build_with_asset_cache(snova_path=snova_path, apps=[app] if app else None)
+
 	command = "snova build"
 	if app:
 		command += f" --app {app}"
@@ -391,23 +460,55 @@ def update(
 	patch: bool = False,
 	build: bool = False,
 	requirements: bool = False,
+	force_requirements: bool = False,
 	backup: bool = True,
 	compile: bool = True,
 	force: bool = False,
 	reset: bool = False,
 	restart_supervisor: bool = False,
 	restart_systemd: bool = False,
+	serial: bool = False,
+	new_env: bool = False,
+	full: bool = False,
+	resume: bool = False,
+	plan: bool = False,
 ):
-	"""command: snova update"""
+	"""command: snova update
+
+	The update's stages run concurrently where they don't depend on each other, see
+	`get_update_stages`. Pass `serial` to run them one after the other.
+
+	With `new_env` (or `side_by_side_env` set in common_site_config.json), Python
+	packages are installed into a new env which replaces the current one once complete,
+	see `snova.utils.env`. The env is built before sites are put in maintenance mode.
+
+	When apps are pulled, sites are only migrated and assets only built for apps whose
+	changes call for it, see `snova.utils.changes`. Pass `full` to always run both.
+
+	Progress is recorded in a journal, see `snova.utils.journal`. Pass `resume` to
+	continue a failed update with its options, skipping the stages, sites and apps that
+	completed.
+
+	The apps' commits, env and assets are snapshotted first for `snova rollback`, see
+	`snova.utils.snapshot`. `update_snapshots` in common_site_config.json sets how many
+	snapshots are kept, 0 disables them.
+
+	The durations of stages, sites and apps are recorded, see `snova.utils.timings`.
+	Pass `plan` to print what the update would run and how long it's expected to take
+	instead of running it.
+	"""
 	import re
+	import time
 
 	from snova import patches
-	from snova.app import pull_apps
 	from snova.snova import Snova
 	from snova.config.common_site_config import update_config
-	from snova.exceptions import CannotUpdateReleaseSnova
+	from snova.exceptions import CannotUpdateReleaseSnova, ValidationError
 	from snova.utils.app import is_version_upgrade
-	from snova.utils.system import backup_all_sites
+	from snova.utils.journal import UpdateJournal
+	from snova.utils.scheduler import StageScheduler
+	from snova.utils.snapshot import DEFAULT_SNAPSHOTS, take_snapshot
+	from snova.utils.timings import APP_STAGES, UpdateTimings, print_update_plan
 
 	snova_path = os.path.abspath(".")
 	snova = Snova(snova_path)
@@ -417,46 +518,120 @@ def update(
 	if conf.get("release_snova"):
 		raise CannotUpdateReleaseSnova("Release snova detected, cannot update!")
 
-	if not (pull or patch or build or requirements):
-		pull, patch, build, requirements = True, True, True, True
+	journal = UpdateJournal.load(snova_path)
 
-	if apps and pull:
-		apps = [app.strip() for app in re.split(",| ", apps) if app]
-	else:
-		apps = []
+	if resume:
+		if not journal:
+			raise ValidationError("No unfinished update found to resume")
+		click.secho(f"Resuming the update started at {journal.started_at}", fg="yellow")
+		options = journal.options
 
-	validate_branch()
+	else:
+		if journal and not plan:
+			click.secho(
+				f"Discarding the progress of the unfinished update started at"
+				f" {journal.started_at}, use `snova update --resume` to continue one",
+				fg="yellow",
+			)
 
-	version_upgrade = is_version_upgrade()
-	handle_version_upgrade(version_upgrade, snova_path, force, reset, conf)
+		if not (pull or patch or build or requirements):
+			pull, patch, build, requirements = True, True, True, True
 
-	conf.update({"maintenance_mode": 1, "pause_scheduler": 1})
-	update_config(conf, snova_path=snova_path)
+		if apps and pull:
+			apps = [app.strip() for app in re.split(",| ", apps) if app]
+		else:
+			apps = []
 
-	if backup:
-		print("Backing up sites...")
-		backup_all_sites(snova_path=snova_path)
+		if plan:
+			# planning is a dry run, upstream isn't fetched to check for a major upgrade
+			version_upgrade = (False, None, None)
+		else:
+			validate_branch()
+			version_upgrade = is_version_upgrade()
+			handle_version_upgrade(version_upgrade, snova_path, force, reset, conf)
+
+		options = {
+			"apps": apps,
+			"backup": backup,
+			"pull": pull,
+			"requirements": requirements,
+			"force_requirements": force_requirements,
+			"patch": patch,
+			"build": build,
+			"reset": reset,
+			"version_upgrade": version_upgrade if (version_upgrade[0] or force) else None,
+			"serial": serial,
+			"new_env": bool(new_env or conf.get("side_by_side_env")),
+			"skip_unaffected": pull and not full,
+			"restart_supervisor": restart_supervisor,
+			"restart_systemd": restart_systemd,
+		}
+		journal = None if plan else UpdateJournal.start(snova_path, options)
+
+	def enter_maintenance():
+		conf.update({"maintenance_mode": 1, "pause_scheduler": 1})
+		update_config(conf, snova_path=snova_path)
+
+	timings = UpdateTimings()
+	stages = get_update_stages(
+		snova,
+		**{
+			key: value
+			for key, value in options.items()
+			if key not in ("restart_supervisor", "restart_systemd")
+		},
+		maintenance=enter_maintenance,
+		journal=journal,
+		timings=timings,
+	)
 
-	if pull:
-		print("Updating apps source...")
-		pull_apps(apps=apps, snova_path=snova_path, reset=reset)
+	if plan:
+		units = {"backup": list(snova.sites), "pull": options["apps"] or list(snova.apps)}
+		units["patch"] = units["backup"]
+		for stage in APP_STAGES:
+			units.setdefault(stage, list(snova.apps))
+		if journal:
+			stages = [stage for stage in stages if not journal.is_done(stage.name)]
+			units = {stage: journal.get_pending(stage, items) for stage, items in units.items()}
+
+		return print_update_plan(
+			stages,
+			units={stage.name: units.get(stage.name) for stage in stages},
+			snova_path=snova_path,
+			serial=options["serial"],
+		)
 
-	if requirements:
-		print("Setting up requirements...")
-		snova.setup.requirements()
+	# a resumed update was snapshotted when it started
+	keep_snapshots = int(conf.get("update_snapshots", DEFAULT_SNAPSHOTS))
+	if keep_snapshots and not resume:
+		take_snapshot(snova_path, keep=keep_snapshots)
 
-	if patch:
-		print("Patching sites...")
-		patch_sites(snova_path=snova_path)
+	scheduler = StageScheduler(stages, serial=options["serial"])
 
-	if build:
-		print("Building assets...")
-		snova.build()
+	try:
+		scheduler.run()
+	except BaseException:
+		scheduler.print_summary()
+		timings.save(scheduler, snova_path=snova_path, resumed=resume)
+		click.secho(
+			"\nThe update failed, run `snova update --resume` to continue from where it"
+			" stopped once the cause is fixed",
+			fg="red",
+		)
+		raise
 
-	if version_upgrade[0] or (not version_upgrade[0] and force):
-		post_upgrade(version_upgrade[1], version_upgrade[2], snova_path=snova_path)
+	scheduler.print_summary()
 
-	snova.reload(web=False, supervisor=restart_supervisor, systemd=restart_systemd)
+	start = time.monotonic()
+	snova.reload(
+		web=False,
+		supervisor=options["restart_supervisor"],
+		systemd=options["restart_systemd"],
+	)
+	timings.save(
+		scheduler, snova_path=snova_path, restart=time.monotonic() - start, resumed=resume
+	)
+	journal.finish()
 
 	conf.update({"maintenance_mode": 0, "pause_scheduler": 0})
 	update_config(conf, snova_path=snova_path)
@@ -469,6 +644,279 @@ def update(
 	)
 
 
+def rollback(snova_path=".", snapshot=None, restart_supervisor=False, restart_systemd=False):
+	"""command: snova rollback
+
+	Restores the state from before the last `snova update`, or the given snapshot, and
+	restarts the snova's processes. Sites are kept in maintenance mode meanwhile."""
+	from snova.snova import Snova
+	from snova.config.common_site_config import update_config
+	from snova.utils.journal import UpdateJournal
+	from snova.utils.snapshot import restore_snapshot
+
+	snova = Snova(snova_path)
+	conf = snova.conf
+
+	conf.update({"maintenance_mode": 1, "pause_scheduler": 1})
+	update_config(conf, snova_path=snova_path)
+
+	restore_snapshot(snova_path, name=snapshot)
+
+	journal = UpdateJournal.load(snova_path)
+	if journal:
+		journal.finish()
+
+	snova.reload(web=False, supervisor=restart_supervisor, systemd=restart_systemd)
+
+	conf.update({"maintenance_mode": 0, "pause_scheduler": 0})
+	update_config(conf, snova_path=snova_path)
+
+	log(
+		"Databases aren't rolled back. If sites were migrated, restore them from the"
+		" backups taken by the update, eg: snova --site {site} restore {backup}",
+		level=3,
+	)
+
+
+def get_update_stages(
+	snova,
+	apps=None,
+	backup=True,
+	pull=True,
+	requirements=True,
+	force_requirements=False,
+	patch=True,
+	build=True,
+	reset=False,
+	version_upgrade=None,
+	serial=False,
+	new_env=False,
+	skip_unaffected=False,
+	maintenance=None,
+	journal=None,
+	timings=None,
+):
+	"""Returns the stages of `snova update`. Backups overlap with fetching apps, which
+	leaves the apps' working trees as they are, while apps are only merged or reset to
+	the fetched commits once all sites are backed up. Python and Node packages are
+	installed concurrently and assets are built while sites migrate.
+
+	`maintenance`, if passed, is run as a stage that puts sites into maintenance mode,
+	which the stages changing the snova wait for. Fetching apps and, with `new_env`,
+	building the new env run before it, while sites are up.
+
+	With `new_env`, Python packages are installed into a new env, from the fetched
+	commits, that's swapped in before sites are migrated, the previous env is kept for
+	rolling back.
+
+	With `skip_unaffected`, migrations are skipped and assets only built for the apps
+	whose changes since the stage last completed call for it.
+
+	If a `snova.utils.journal.UpdateJournal` is passed, the stages, sites and apps it
+	has recorded as completed are skipped and new progress is recorded in it. The
+	durations of sites and apps are recorded in `timings`, if passed."""
+	from time import monotonic
+
+	from snova.app import pull_apps
+	from snova.utils.changes import get_affected_apps, print_affected_apps
+	from snova.utils.env import build_env, finish_env, prune_envs, swap_env
+	from snova.utils.prefetch import get_prefetched_commits, prefetch
+	from snova.utils.scheduler import Stage
+	from snova.utils.system import backup_all_sites
+
+	snova_path = snova.name
+	stages = []
+	env_paths = []
+
+	def get_pending(stage, units):
+		return journal.get_pending(stage, units) if journal else units
+
+	def on_done(stage, journaled=True):
+		def done(unit, duration):
+			if journal and journaled:
+				journal.mark_done(stage, unit)
+			if timings:
+				timings.record_unit(stage, unit, duration)
+
+		return done
+
+	def backup_sites():
+		print("Backing up sites...")
+		backup_all_sites(
+			snova_path=snova_path,
+			sites=get_pending("backup", snova.sites),
+			on_site_done=on_done("backup"),
+		)
+
+	def fetch_apps():
+		print("Fetching apps...")
+		pending_apps = get_pending("pull", apps or list(snova.apps))
+		if pending_apps:
+			# the fetched commits are checked out by pull_apps
+			prefetch(apps=pending_apps, snova_path=snova_path, requirements=False)
+
+	def update_apps_source():
+		print("Updating apps source...")
+		pending_apps = get_pending("pull", apps or list(snova.apps))
+		if pending_apps:
+			pull_apps(
+				apps=pending_apps, snova_path=snova_path, reset=reset, on_app_done=on_done("pull")
+			)
+
+	def setup_requirements(stage, python=True, node=True):
+		print("Setting up requirements...")
+		snova.setup.requirements(
+			batch=snova.conf.get("batch_requirements"),
+			skip_unchanged=not force_requirements,
+			python=python,
+			node=node,
+			# apps aren't journaled, the stage installs only what changed when resumed
+			on_app_done=on_done(stage, journaled=False),
+		)
+
+	def setup_env():
+		print("Building a new env...")
+		commits = None
+		if pull:
+			# built while sites are up, before apps are checked out at the fetched commits
+			pulled_apps = apps or list(snova.apps)
+			commits = {
+				app: commit
+				for app, commit in get_prefetched_commits(snova_path=snova_path).items()
+				if app in pulled_apps
+			}
+		env_paths.append(build_env(snova, commits=commits))
+		if journal:
+			journal.mark_done("python requirements", env_paths[-1])
+
+	def switch_env():
+		if not env_paths:
+			# built before the update was resumed
+			env_paths.extend(journal.get_units("python requirements"))
+		finish_env(env_paths[-1], snova)
+		swap_env(env_paths[-1], snova_path=snova_path)
+		prune_envs(snova_path=snova_path)
+		for app in snova.apps:
+			snova.apps.update_requirements_fingerprint(app, kinds=("python",))
+
+	def migrate_sites():
+		if skip_unaffected and not version_upgrade:
+			affected = get_affected_apps(snova, "patch")
+			print_affected_apps("patch", affected, snova.apps)
+			if not affected:
+				snova.apps.record_stage_commits("patch")
+				return
+
+		print("Patching sites...")
+		patch_sites(
+			snova_path=snova_path,
+			sites=get_pending("patch", snova.sites),
+			on_site_done=on_done("patch"),
+		)
+		snova.apps.record_stage_commits("patch")
+
+	def build():
+		build_apps = None
+
+		if skip_unaffected:
+			affected = get_affected_apps(snova, "build")
+			print_affected_apps("build", affected, snova.apps)
+			if not affected:
+				snova.apps.record_stage_commits("build")
+				return
+			if len(affected) < len(snova.apps):
+				build_apps = list(affected)
+
+		print("Building assets...")
+		start = monotonic()
+		snova.build(apps=build_apps)
+		snova.apps.record_stage_commits("build")
+
+		if timings:
+			# apps are built by a single run, whose duration is shared among them
+			built_apps = build_apps or list(snova.apps)
+			duration = (monotonic() - start) / len(built_apps)
+			for app in built_apps:
+				timings.record_unit("build", app, duration)
+
+	def upgrade():
+		post_upgrade(version_upgrade[1], version_upgrade[2], snova_path=snova_path)
+
+	# stages changing the snova wait for sites to be in maintenance mode
+	live = ["maintenance"]
+
+	if backup:
+		stages.append(Stage("backup", backup_sites, requires=live))
+
+	if pull:
+		stages.append(Stage("fetch", fetch_apps))
+		stages.append(Stage("pull", update_apps_source, requires=["fetch", "backup"] + live))
+
+	if requirements and new_env:
+		stages.append(Stage("python requirements", setup_env, requires=["fetch"]))
+		stages.append(
+			Stage(
+				"node requirements",
+				lambda: setup_requirements("node requirements", python=False),
+				requires=["pull"] + live,
+			)
+		)
+		stages.append(
+			Stage("swap env", switch_env, requires=["python requirements", "pull"] + live)
+		)
+	elif requirements and serial:
+		stages.append(
+			Stage(
+				"requirements", lambda: setup_requirements("requirements"), requires=["pull"] + live
+			)
+		)
+	elif requirements:
+		stages.append(
+			Stage(
+				"python requirements",
+				lambda: setup_requirements("python requirements", node=False),
+				requires=["pull"] + live,
+			)
+		)
+		stages.append(
+			Stage(
+				"node requirements",
+				lambda: setup_requirements("node requirements", python=False),
+				requires=["pull"] + live,
+			)
+		)
+
+	python_requirements = ["pull", "requirements", "python requirements", "swap env"]
+
+	if patch:
+		stages.append(
+			Stage("patch", migrate_sites, requires=["backup"] + python_requirements + live)
+		)
+
+	if build:
+		stages.append(
+			Stage("build", build, requires=python_requirements + ["node requirements"] + live)
+		)
+
+	if version_upgrade:
+		stages.append(Stage("post upgrade", upgrade, requires=["patch", "build"] + live))
+
+	if journal:
+		stages = [journal.track(stage) for stage in stages]
+
+	if maintenance:
+		# not journaled, as it's entered again when an update is resumed
+		requires = ["python requirements"] if requirements and new_env else []
+		# in the order stages run in with `serial`
+		stages = (
+			[stage for stage in stages if "maintenance" not in stage.requires]
+			+ [Stage("maintenance", maintenance, requires=requires)]
+			+ [stage for stage in stages if "maintenance" in stage.requires]
+		)
+
+	return stages
+
+
 def clone_apps_from(snova_path, clone_from, update_app=True):
 	from snova.app import install_app
 
@@ -543,18 +991,9 @@ def set_redis_socketio_host(host, snova_path="."):
 
 
 def update_common_site_config(ddict, snova_path="."):
-	filename = os.path.join(snova_path, "sites", "common_site_config.json")
-
-	if os.path.exists(filename):
-		with open(filename) as f:
-			content = json.load(f)
-
-	else:
-		content = {}
+	from snova.config.common_site_config import update_config
 
-	content.update(ddict)
-	with open(filename, "w") as f:
-		json.dump(content, f, indent=1, sort_keys=True)
+	update_config(ddict, snova_path=snova_path)
 
 
 def validate_app_installed_on_sites(app, snova_path="."):
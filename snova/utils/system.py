@@ -160,19 +160,108 @@ def start(no_dev=False, concurrency=None, procfile=None, no_prefix=False, procma
 	os.execv(program, command)
 
 
-def migrate_site(site, snova_path="."):
-	run_sparrow_cmd("--site", site, "migrate", snova_path=snova_path)
+def migrate_site(site, snova_path=".", **kwargs):
+	run_sparrow_cmd("--site", site, "migrate", snova_path=snova_path, **kwargs)
 
 
-def backup_site(site, snova_path="."):
-	run_sparrow_cmd("--site", site, "backup", snova_path=snova_path)
+def backup_site(site, snova_path=".", **kwargs):
+	run_sparrow_cmd("--site", site, "backup", snova_path=snova_path, **kwargs)
 
 
-def backup_all_sites(snova_path="."):
+def backup_all_sites(snova_path=".", sites=None, on_site_done=None):
+	"""Backs up all sites of the snova, or `sites`. `on_site_done(site, duration)` is
+	called for each site backed up.
+
+	Sites are backed up one at a time unless `backup_concurrency` is set in
+	common_site_config.json. `backup_concurrency_per_db_host` limits the backups running
+	against the same database server. `backup_niceness` and `backup_ionice_class` run
+	the backups with a lower CPU and I/O priority.
+	"""
+	import time
 	from snova.snova import Snova
+	from snova.config.site_config import get_site_db_host
+	from snova.exceptions import CommandFailedError
+	from snova.utils.scheduler import run_concurrently
+
+	snova = Snova(snova_path)
+	conf = snova.conf
+	concurrency = int(conf.get("backup_concurrency") or 1)
+	cmd_prefix = get_low_priority_cmd(conf.get("backup_niceness"), conf.get("backup_ionice_class"))
+	started = time.time()
+
+	def backup(site):
+		prefix = f"[{site}]" if concurrency > 1 else None
+		start = time.monotonic()
+		backup_site(site, snova_path=snova_path, prefix=prefix, cmd_prefix=cmd_prefix)
+		if on_site_done:
+			on_site_done(site, time.monotonic() - start)
+
+	results = run_concurrently(
+		backup,
+		snova.sites if sites is None else sites,
+		max_workers=concurrency,
+		key=lambda site: get_site_db_host(site, snova_path=snova_path),
+		max_per_key=int(conf.get("backup_concurrency_per_db_host") or concurrency),
+	)
+	print_backup_summary(results, snova_path=snova_path, since=started)
+
+	failed_sites = [site for site, (error, _) in results.items() if error]
+	if failed_sites:
+		raise CommandFailedError(f"Failed to back up sites: {', '.join(failed_sites)}")
+
+
+def get_low_priority_cmd(niceness=None, ionice_class=None):
+	"""Returns the arguments that run a command with the given niceness and I/O
+	scheduling class (see `man ionice`), if the tools are available"""
+	cmd = []
+
+	if niceness and which("nice"):
+		cmd.extend(["nice", "-n", str(niceness)])
+
+	if ionice_class and which("ionice"):
+		cmd.extend(["ionice", "-c", str(ionice_class)])
+
+	return cmd
+
+
+def print_backup_summary(results, snova_path=".", since=None):
+	"""Prints the time taken and the size of the backup files written for each site"""
+	import click
+
+	if not results:
+		return
+
+	width = max(len(site) for site in results)
+	click.secho(f"\n{'Site'.ljust(width)}  Status  {'Time':>8}  Size", bold=True)
+
+	for site, (error, duration) in results.items():
+		status = click.style("failed", fg="red") if error else click.style("ok    ", fg="green")
+		size = get_backup_size(site, snova_path=snova_path, since=since)
+		click.echo(f"{site.ljust(width)}  {status}  {duration:7.1f}s  {format_size(size)}")
+
+
+def get_backup_size(site, snova_path=".", since=None):
+	"""Returns the size of the site's backup files modified after the `since` timestamp"""
+	backups_path = os.path.join(snova_path, "sites", site, "private", "backups")
+	size = 0
+
+	for entry in os.scandir(backups_path) if os.path.isdir(backups_path) else []:
+		stat = entry.stat()
+		if entry.is_file() and (since is None or stat.st_mtime >= since):
+			size += stat.st_size
+
+	return size
+
+
+def format_size(size):
+	for unit in ("B", "KB", "MB", "GB"):
+		if size < 1024:
+			break
+		size /= 1024
+	else:
+		unit = "TB"
 
-	for site in Snova(snova_path).sites:
-		backup_site(site, snova_path=snova_path)
+	return f"{size} B" if unit == "B" else f"{size:.1f} {unit}"
 
 
 def fix_prod_setup_perms(snova_path=".", sparrow_user=None):
@@ -0,0 +1,172 @@
+# imports - standard imports
+import json
+import os
+import statistics
+import threading
+import time
+
+# imports - third party imports
+import click
+
+TIMINGS_FILE = "update_timings.json"
+# runs of `snova update` whose timings are kept
+MAX_RUNS = 20
+# stages whose units are apps, the units of other stages are sites
+APP_STAGES = ("pull", "requirements", "python requirements", "node requirements", "build")
+
+
+class UpdateTimings:
+	"""Collects the durations of the sites and apps processed by the stages of a
+	`snova update`, which are saved along with the stages' durations once it ends"""
+
+	lock = threading.Lock()
+
+	def __init__(self):
+		self.units = {}
+
+	def record_unit(self, stage, unit, duration):
+		with self.lock:
+			self.units.setdefault(stage, {})[unit] = round(duration, 2)
+
+	def save(self, scheduler, snova_path=".", restart=None, resumed=False):
+		"""Appends the run to the history in config/update_timings.json. Only stages that
+		completed are recorded"""
+		run = {
+			"finished_at": time.time(),
+			"resumed": resumed,
+			"duration": round(scheduler.duration or 0, 2),
+			"serial": scheduler.serial,
+			"stages": {
+				name: round(stage.duration, 2)
+				for name, stage in scheduler.stages.items()
+				if stage.status == "done"
+			},
+			"units": self.units,
+		}
+		if restart is not None:
+			run["stages"]["restart"] = round(restart, 2)
+
+		history = read_update_history(snova_path)[-(MAX_RUNS - 1) :] + [run]
+		path = get_timings_path(snova_path)
+		tmp_path = f"{path}.tmp"
+
+		with open(tmp_path, "w") as f:
+			json.dump(history, f, indent=1)
+		os.replace(tmp_path, path)
+
+
+def get_timings_path(snova_path="."):
+	return os.path.join(snova_path, "config", TIMINGS_FILE)
+
+
+def read_update_history(snova_path=".") -> list:
+	try:
+		with open(get_timings_path(snova_path)) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return []
+
+
+def estimate_stage(history, stage, units=None):
+	"""Returns the expected duration of `stage`, None if it never completed before.
+
+	That's the median of its past durations. For stages processing `units` (sites,
+	apps), it's scaled by how long the given units took compared to the units of past
+	runs, eg: when sites were added since.
+	"""
+	# stages skipped by resumed updates completed instantly
+	runs = [run for run in history if stage in run["stages"] and not run.get("resumed")]
+	if not runs:
+		return None
+
+	estimate = statistics.median(run["stages"][stage] for run in runs)
+	unit_runs = [run["units"][stage] for run in runs if run["units"].get(stage)]
+
+	if units is None or not unit_runs:
+		return estimate
+
+	unit_durations = {}
+	for unit_run in unit_runs:
+		for unit, duration in unit_run.items():
+			unit_durations.setdefault(unit, []).append(duration)
+
+	typical = statistics.median(d for durations in unit_durations.values() for d in durations)
+	expected = sum(
+		statistics.median(unit_durations[unit]) if unit in unit_durations else typical
+		for unit in units
+	)
+	past = statistics.median(sum(unit_run.values()) for unit_run in unit_runs)
+
+	return estimate * expected / past if past else estimate
+
+
+def estimate_total(stages, estimates, serial=False):
+	"""Returns the expected duration of running `stages`, i.e. their sum if run one
+	after the other, or the longest chain of stages that depend on each other"""
+	if serial:
+		return sum(estimate or 0 for estimate in estimates.values())
+
+	names = {stage.name for stage in stages}
+	finish = {}
+
+	for stage in stages:
+		# stages require stages added before them
+		start = max(
+			(finish[name] for name in stage.requires if name in names), default=0
+		)
+		finish[stage.name] = start + (estimates.get(stage.name) or 0)
+
+	return max(finish.values(), default=0) + (estimates.get("restart") or 0)
+
+
+def print_update_plan(stages, units=None, snova_path=".", serial=False):
+	"""Prints the stages `snova update` will run and their expected durations, based on
+	past updates of the snova"""
+	units = units or {}
+	history = read_update_history(snova_path)
+	estimates = {
+		stage.name: estimate_stage(history, stage.name, units.get(stage.name))
+		for stage in stages
+	}
+	estimates["restart"] = estimate_stage(history, "restart")
+	width = max(len(name) for name in estimates)
+
+	click.secho(f"\nUpdate plan, based on {len(history)} past updates", bold=True)
+	click.secho(f"{'Stage'.ljust(width)}  {'Estimate':>8}  Units", bold=True)
+
+	for name, estimate in estimates.items():
+		stage_units = units.get(name)
+		click.echo(
+			"{}  {:>8}  {}".format(
+				name.ljust(width),
+				format_duration(estimate),
+				describe_units(name, stage_units, history) if stage_units is not None else "",
+			).rstrip()
+		)
+
+	unknown = [name for name, estimate in estimates.items() if estimate is None]
+	total = estimate_total(stages, estimates, serial=serial)
+	click.echo(f"{'total'.ljust(width)}  {format_duration(total):>8}", nl=False)
+	click.echo(f"  (not including {', '.join(unknown)})" if unknown else "")
+
+
+def describe_units(stage, units, history):
+	kind = "apps" if stage in APP_STAGES else "sites"
+	known = {unit for run in history for unit in run["units"].get(stage, {})}
+	new_units = [unit for unit in units if unit not in known]
+	without_history = f", {len(new_units)} without history" if history and new_units else ""
+	return f"{len(units)} {kind}{without_history}"
+
+
+def format_duration(seconds):
+	if seconds is None:
+		return "unknown"
+
+	minutes, seconds = divmod(int(round(seconds)), 60)
+	hours, minutes = divmod(minutes, 60)
+
+	if hours:
+		return f"{hours}h {minutes:02}m"
+	if minutes:
+		return f"{minutes}m {seconds:02}s"
+	return f"{seconds}s"